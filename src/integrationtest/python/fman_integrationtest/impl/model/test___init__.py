@@ -1,6 +1,7 @@
 from contextlib import contextmanager
 from fbs_runtime.platform import is_linux
 from fman.impl.model import SortedFileSystemModel
+from fman.impl.model.snapshots import SnapshotStore
 from fman.impl.plugins.builtin import NullFileSystem, NullColumn
 from fman.impl.plugins.mother_fs import MotherFileSystem
 from fman.impl.util import filenotfounderror
@@ -8,7 +9,10 @@ from fman.impl.util.qt import connect_once, DisplayRole, DecorationRole
 from fman.impl.util.qt.thread import run_in_main_thread
 from fman.url import splitscheme
 from fman_unittest.impl.model import StubFileSystem
+from os.path import join
 from PyQt5.QtCore import Qt
+from shutil import rmtree
+from tempfile import mkdtemp
 from threading import Event
 from time import time, sleep
 
@@ -76,6 +80,71 @@ class SortedFileSystemModelAT: # Instantiated in fman_integrationtest.test_qt
 			lambda: self._get_data()[:2] == [('dir', ''), ('0', '87 B')],
 			'Model failed to reload'
 		)
+	def test_revisit_skips_reload_if_signature_unchanged(self):
+		self._files['']['signature'] = 1
+		self.test_set_location()
+		self._set_location('stub://dir')
+		self._files['0']['size'] = 87
+		self._set_location('stub://')
+		self._load_visible_rows()
+		self.assertNotEqual('87 B', self._get_data()[1][1])
+		self._files['']['signature'] = 2
+		self._set_location('stub://dir')
+		self._set_location('stub://')
+		self._load_visible_rows()
+		self._wait_until(
+			lambda: self._get_data()[:2] == [('dir', ''), ('0', '87 B')],
+			'Model failed to reload'
+		)
+	def test_revisit_shows_snapshot(self):
+		self.test_set_location()
+		columns = [
+			column.get_qualified_name() for column in self._model.get_columns()
+		]
+		self._wait_until(
+			lambda: self._snapshots.get('stub://', columns),
+			'Model did not take a snapshot'
+		)
+		self._set_location('stub://dir')
+		data_in_callback = []
+		loaded = Event()
+		def callback():
+			# No rows are loaded yet at this point:
+			data_in_callback.extend(self._get_data()[:2])
+			loaded.set()
+		self._model.set_location('stub://', callback=callback)
+		self._wait_for(loaded)
+		self.assertEqual([('dir', ''), ('0', '100 B')], data_in_callback)
+	def test_loads_icons_of_rows_off_screen(self):
+		self._set_location('stub://')
+		last_icon = lambda: self._get_data(DecorationRole)[-1][0]
+		self._wait_until(
+			lambda: last_icon() == self._file_icon,
+			'Model did not load the icons of all rows'
+		)
+	def test_reload_changed_only_lists_directory(self):
+		self.test_set_location()
+		self._files['new'] = {
+			'is_dir': False, 'size': 2, 'icon': self._file_icon
+		}
+		self._files['']['files'].append('new')
+		self._files['']['files'].remove('1')
+		# Only the directory was reported as changed. So this goes unnoticed:
+		self._files['0']['size'] = 87
+		self._model.sourceModel().reload_changed()
+		def listing_reloaded():
+			first_column = self._get_first_column()
+			return 'new' in first_column and '1' not in first_column
+		self._wait_until(listing_reloaded, 'Did not pick up the new listing')
+		self.assertEqual(('0', '100 B'), self._get_data()[1])
+	def test_reload_reloads_unchanged_files(self):
+		self.test_set_location()
+		self._files['1']['icon'] = self._folder_icon
+		self._model.reload()
+		self._wait_until(
+			lambda: self._get_data(DecorationRole)[2][0] == self._folder_icon,
+			'Explicit reload did not refresh a file whose stat is unchanged'
+		)
 	def test_sort(self):
 		self.test_set_location()
 		with self._wait_for_signal(self._model.sort_order_changed):
@@ -93,6 +162,20 @@ class SortedFileSystemModelAT: # Instantiated in fman_integrationtest.test_qt
 			],
 			self._get_data()[1:self._NUM_VISIBLE_ROWS]
 		)
+	def test_filter_widened_after_sort(self):
+		self.test_set_location()
+		accepted = {'stub://dir', 'stub://0'}
+		source_model = self._model.sourceModel()
+		source_model.add_filter(lambda url: url in accepted)
+		source_model.update_narrowed()
+		accepted.add('stub://1')
+		with self._wait_for_signal(self._model.sort_order_changed):
+			run_in_main_thread(self._model.sort)(1)
+		source_model.update_widened()
+		self._wait_until(
+			lambda: sorted(self._get_first_column()) == ['0', '1', 'dir'],
+			'Did not show the rows accepted by the widened filter'
+		)
 	def test_file_added(self):
 		self.test_set_location()
 		self._files['new'] = {
@@ -227,12 +310,15 @@ class SortedFileSystemModelAT: # Instantiated in fman_integrationtest.test_qt
 		self._register_column(self._name_column)
 		self._size_column = Size(self._fs)
 		self._register_column(self._size_column)
+		self._tmp_dir = mkdtemp()
+		self._snapshots = SnapshotStore(join(self._tmp_dir, 'Snapshots.bin'))
 		self._model = self.run_in_app(
-			SortedFileSystemModel, None, self._fs, 'null://'
+			SortedFileSystemModel, None, self._fs, 'null://', self._snapshots
 		)
 		self._timeout = None if _is_debugger_attached() else .2
 	def tearDown(self):
 		self._model.sourceModel().shutdown()
+		rmtree(self._tmp_dir)
 		super().tearDown()
 	def _register_column(self, instance):
 		self._fs.register_column(instance.get_qualified_name(), instance)
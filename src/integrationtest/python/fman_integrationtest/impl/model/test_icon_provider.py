@@ -0,0 +1,163 @@
+from fman.impl.model.icon_provider import IconProvider, \
+	GnomeFileIconProvider, _MAX_BATCH_AGE, _MIN_REQUESTS_PER_BATCH
+from fman.url import as_url
+from pathlib import Path
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon, QPixmap
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import os
+
+class IconProviderAT: # Instantiated in fman_integrationtest.test_qt
+	def test_files_of_same_type_share_icon(self):
+		icon_provider = self._create_icon_provider()
+		num_calls = self._qt_icon_provider.num_calls
+		icon_1 = self._get_icon(icon_provider, 'a.txt')
+		icon_2 = self._get_icon(icon_provider, 'b.TXT')
+		self.assertIs(icon_1, icon_2)
+		self.assertEqual(num_calls + 1, self._qt_icon_provider.num_calls)
+		self._get_icon(icon_provider, 'c.zip')
+		self.assertEqual(num_calls + 2, self._qt_icon_provider.num_calls)
+	def test_icons_are_saved_to_disk(self):
+		self._get_icon(self._create_icon_provider(), 'a.txt')
+		icon_provider = self._create_icon_provider()
+		num_calls = self._qt_icon_provider.num_calls
+		icon = self._get_icon(icon_provider, 'b.txt')
+		self.assertEqual(num_calls, self._qt_icon_provider.num_calls)
+		self.assertFalse(icon.isNull())
+	def _create_icon_provider(self):
+		return self.run_in_app(
+			IconProvider, self._qt_icon_provider, None, self._cache_dir
+		)
+	def _get_icon(self, icon_provider, file_name):
+		path = Path(self._tmp_dir, file_name)
+		path.touch()
+		return self.run_in_app(icon_provider.get_icon, as_url(str(path)))
+	def setUp(self):
+		super().setUp()
+		self._tmp_dir = mkdtemp()
+		self._cache_dir = mkdtemp()
+		self._qt_icon_provider = StubQtIconProvider()
+	def tearDown(self):
+		rmtree(self._tmp_dir)
+		rmtree(self._cache_dir)
+		super().tearDown()
+
+class GnomeFileIconProviderAT: # Instantiated in fman_integrationtest.test_qt
+	def test_queries_files_individually_below_threshold(self):
+		for i in range(_MIN_REQUESTS_PER_BATCH - 1):
+			self.assertEqual('icon-%d' % i, self._get_icon_name('%d.txt' % i))
+		self.assertEqual(0, self._gio.num_enumerations)
+		self.assertEqual(_MIN_REQUESTS_PER_BATCH - 1, self._gio.num_queries)
+	def test_batch(self):
+		for i in range(_MIN_REQUESTS_PER_BATCH + 2):
+			self.assertEqual('icon-%d' % i, self._get_icon_name('%d.txt' % i))
+		self.assertEqual(1, self._gio.num_enumerations)
+		self.assertEqual(_MIN_REQUESTS_PER_BATCH - 1, self._gio.num_queries)
+	def test_batch_expires(self):
+		self._obtain_batch()
+		batch = self._provider._batches[self._tmp_dir]
+		batch.created_at -= _MAX_BATCH_AGE + 1
+		num_queries = self._gio.num_queries
+		self._get_icon_name('9.txt')
+		self.assertEqual(num_queries + 1, self._gio.num_queries)
+	def test_deleted_file_is_not_served_from_batch(self):
+		self._obtain_batch()
+		os.remove(os.path.join(self._tmp_dir, '9.txt'))
+		with self.assertRaises(FileNotFoundError):
+			self._get_icon_name('9.txt')
+	def test_falls_back_to_query_info(self):
+		self._gio.enumeration_fails = True
+		for i in range(_MIN_REQUESTS_PER_BATCH + 2):
+			self.assertEqual('icon-%d' % i, self._get_icon_name('%d.txt' % i))
+		self.assertEqual(_MIN_REQUESTS_PER_BATCH + 2, self._gio.num_queries)
+	def _obtain_batch(self):
+		for i in range(_MIN_REQUESTS_PER_BATCH):
+			self._get_icon_name('%d.txt' % i)
+		self.assertEqual(1, self._gio.num_enumerations)
+	def _get_icon_name(self, file_name):
+		return self._provider._get_icon_name(
+			os.path.join(self._tmp_dir, file_name)
+		)
+	def setUp(self):
+		super().setUp()
+		self._tmp_dir = mkdtemp()
+		for i in range(10):
+			Path(self._tmp_dir, '%d.txt' % i).touch()
+		self._gio = StubGio()
+		self._provider = \
+			self.run_in_app(StubGnomeFileIconProvider, self._gio)
+	def tearDown(self):
+		rmtree(self._tmp_dir)
+		super().tearDown()
+
+class StubGnomeFileIconProvider(GnomeFileIconProvider):
+	def __init__(self, gio):
+		self._gio = gio
+		super().__init__()
+	def _init_pgi(self):
+		return None, self._gio, StubGLib
+
+class StubGLib:
+	class GError(Exception):
+		def __init__(self, message):
+			super().__init__(message)
+			self.message = message
+
+class StubGio:
+	class FileQueryInfoFlags:
+		NOFOLLOW_SYMLINKS = 1
+	def __init__(self):
+		self.num_queries = 0
+		self.num_enumerations = 0
+		self.enumeration_fails = False
+	def file_new_for_path(self, path):
+		return StubGioFile(self, path)
+
+class StubGioFile:
+	def __init__(self, gio, path):
+		self._gio = gio
+		self._path = path
+	def query_info(self, attributes, flags, cancellable):
+		self._gio.num_queries += 1
+		if not os.path.exists(self._path):
+			raise StubGLib.GError('No such file or directory')
+		return StubFileInfo(os.path.basename(self._path))
+	def enumerate_children(self, attributes, flags, cancellable):
+		if self._gio.enumeration_fails:
+			raise StubGLib.GError('Permission denied')
+		self._gio.num_enumerations += 1
+		return StubFileEnumerator(sorted(os.listdir(self._path)))
+
+class StubFileEnumerator:
+	def __init__(self, names):
+		self._names = iter(names)
+	def next_file(self, cancellable):
+		name = next(self._names, None)
+		return None if name is None else StubFileInfo(name)
+	def close(self, cancellable):
+		pass
+
+class StubFileInfo:
+	def __init__(self, name):
+		self._name = name
+	def get_name(self):
+		return self._name
+	def get_icon(self):
+		return StubGIcon('icon-' + os.path.splitext(self._name)[0])
+
+class StubGIcon:
+	def __init__(self, name):
+		self._name = name
+	def get_names(self):
+		return [self._name]
+
+class StubQtIconProvider:
+	def __init__(self):
+		self.num_calls = 0
+	def icon(self, file_info):
+		self.num_calls += 1
+		pixmap = QPixmap(16, 16)
+		pixmap.fill(Qt.red)
+		return QIcon(pixmap)
@@ -21,6 +21,8 @@ from fbs_runtime.platform import is_mac
 from fman.impl.util.qt.thread import run_in_thread
 from fman_integrationtest.impl.model.test___init__ import \
 	SortedFileSystemModelAT
+from fman_integrationtest.impl.model.test_icon_provider import \
+	IconProviderAT, GnomeFileIconProviderAT
 from fman_integrationtest.impl.util.qt.test_thread import RunInThreadAT
 from PyQt5.QtCore import pyqtSignal, Qt, qInstallMessageHandler
 from PyQt5.QtWidgets import QApplication
@@ -42,6 +44,12 @@ class SortedFileSystemModelIT(SortedFileSystemModelAT, QtIT):
 class RunInThreadIT(RunInThreadAT, QtIT):
 	pass
 
+class IconProviderIT(IconProviderAT, QtIT):
+	pass
+
+class GnomeFileIconProviderIT(GnomeFileIconProviderAT, QtIT):
+	pass
+
 def setUpModule():
 	if not _reason_to_skip():
 		_QtApp.start()
@@ -1,3 +1,4 @@
+from collections import namedtuple
 from fman import Task
 from fman.impl.fs_cache import Cache
 from fman.impl.util import Event
@@ -54,6 +55,9 @@ def iterdir(url):
 def query(url, fs_method_name):
 	return _get_mother_fs().query(url, fs_method_name)
 
+def query_many(urls, fs_method_names):
+	return _get_mother_fs().query_many(urls, fs_method_names)
+
 def resolve(url):
 	return _get_mother_fs().resolve(url)
 
@@ -71,13 +75,57 @@ class FileSystem:
 	scheme = ''
 
 	def __init__(self):
-		self.cache = Cache()
+		self.cache = Cache(get_policy=self.get_cache_policy)
 		self._file_added = Event()
 		self._file_removed = Event()
+		self._columns_changed = Event()
 		self._file_changed_callbacks = {}
 		self._file_changed_callbacks_lock = Lock()
 	def get_default_columns(self, path):
 		return 'core.Name',
+	def get_max_concurrency(self, path):
+		"""
+		The number of threads fman may use to concurrently load the files in
+		directory `path` (ie. to call #is_dir(...), #size_bytes(...) etc. for
+		them). Return a value > 1 if your implementation is thread-safe and
+		benefits from parallel requests, for instance because each request
+		incurs network latency.
+		"""
+		return 1
+	def stat_many(self, paths):
+		"""
+		Optional. Return a dict that maps (some of) the given paths to Stat
+		records. Implement this if your file system can answer the queries for
+		many files faster than through individual calls to #is_dir(...),
+		#size_bytes(...) and #modified_datetime(...). For instance, because it
+		can fetch them in a single network round-trip. fman queries paths that
+		are missing from the result individually.
+		"""
+		raise self._operation_not_implemented()
+	def get_cache_policy(self, path):
+		"""
+		Return the CachePolicy for the values fman caches for the files in
+		directory `path`, such as the results of @cached methods. The default
+		keeps them until a change is reported via #notify_file_changed(...)
+		etc. Return a different policy if your file system can't report (all)
+		changes.
+		"""
+		return _EVENT_DRIVEN
+	def dir_signature(self, path):
+		"""
+		Optional. Return a value that is cheap to compute and changes whenever
+		files are added to, removed from or renamed in directory `path`. For
+		instance, the directory's modification time. When the user returns to
+		a directory whose signature did not change, fman skips reloading it.
+		None means that the signature is not known.
+		"""
+		return None
+	def on_quit(self):
+		"""
+		Optional. Called when fman quits. Write data you keep in memory, such as
+		indexes, to disk here.
+		"""
+		pass
 	def name(self, path):
 		"""
 		Displayed by the Name column.
@@ -110,6 +158,12 @@ class FileSystem:
 	def notify_file_changed(self, path):
 		for callback in self._file_changed_callbacks.get(path, []):
 			callback(self.scheme + path)
+	def notify_columns_changed(self, path):
+		"""
+		The values displayed in the columns for the given file changed, but the
+		file itself did not. Reloads its row without clearing the cache.
+		"""
+		self._columns_changed.trigger(self.scheme + path)
 	def samefile(self, path1, path2):
 		return self.resolve(path1) == self.resolve(path2)
 	def makedirs(self, path, exist_ok=True):
@@ -180,6 +234,8 @@ class FileSystem:
 			except KeyError:
 				self._file_changed_callbacks[path] = [callback]
 				self.watch(path)
+				# Don't evict the files of a location that is displayed:
+				self.cache.pin(path)
 	def _remove_file_changed_callback(self, path, callback):
 		with self._file_changed_callbacks_lock:
 			try:
@@ -191,6 +247,58 @@ class FileSystem:
 			if not path_callbacks:
 				del self._file_changed_callbacks[path]
 				self.unwatch(path)
+				self.cache.unpin(path)
+
+Stat = namedtuple('Stat', ('is_dir', 'size_bytes', 'modified_datetime'))
+
+class CachePolicy:
+	"""
+	Determines how long the cached values of the files in a directory remain
+	valid. After `max_age` seconds, fman calls #get_version(...). If it returns
+	the same value as when the values were cached, fman keeps them. Otherwise,
+	it discards them and recomputes them on the next access.
+	"""
+
+	# None means "forever":
+	max_age = None
+
+	def get_version(self, dir_path):
+		"""
+		Return a value that changes when the contents of the given directory
+		change, or None if unknown.
+		"""
+		return None
+
+class EventDriven(CachePolicy):
+	"""
+	Keep values until the file system reports a change.
+	"""
+
+class TimeToLive(CachePolicy):
+	"""
+	Recompute values after they have been cached for the given number of
+	seconds.
+	"""
+	def __init__(self, seconds):
+		self.max_age = seconds
+
+class RevalidateByParent(CachePolicy):
+	"""
+	Every `interval` seconds, check whether the #dir_signature(...) of the
+	directory changed. If not, keep the values. This is much cheaper than
+	recomputing them. But note that changes to the contents of a file typically
+	don't change the signature of its directory.
+	"""
+	def __init__(self, fs, interval):
+		self.max_age = interval
+		self._fs = fs
+	def get_version(self, dir_path):
+		try:
+			return self._fs.dir_signature(dir_path)
+		except OSError:
+			return None
+
+_EVENT_DRIVEN = EventDriven()
 
 def cached(fs_method):
 	@wraps(fs_method)
@@ -205,6 +313,21 @@ class Column:
 		return cls.__module__ + '.' + cls.__name__
 	def get_str(self, url):
 		raise NotImplementedError()
+	def get_strs(self, urls):
+		"""
+		Return the strings of several files at once, in the order of `urls`.
+		fman calls this instead of #get_str(...) when it loads many files.
+		Override it if your column can render a batch of values faster than
+		the values individually. For files that don't exist (anymore), return
+		''.
+		"""
+		result = []
+		for url in urls:
+			try:
+				result.append(self.get_str(url))
+			except FileNotFoundError:
+				result.append('')
+		return result
 	def get_sort_value(self, url, is_ascending):
 		"""
 		This method should generally be independent of is_ascending.
@@ -11,6 +11,7 @@ from fman.impl.metrics import Metrics, ServerBackend, AsynchronousMetrics, \
 	LoggingBackend
 from fman.impl.model.icon_provider import GnomeFileIconProvider, \
 	GnomeNotAvailable, IconProvider
+from fman.impl.model.snapshots import SnapshotStore
 from fman.impl.nonexistent_shortcut_handler import NonexistentShortcutHandler
 from fman.impl.plugins import PluginSupport, CommandCallback, PluginFactory
 from fman.impl.plugins.builtin import BuiltinPlugin, NullFileSystem
@@ -90,6 +91,11 @@ class DevelopmentApplicationContext(ApplicationContext):
 		self.session_manager.on_close(self.main_window)
 	def on_quit(self):
 		self.config.on_quit()
+		try:
+			self.snapshot_store.flush()
+		except OSError:
+			pass
+		self.mother_fs.on_quit()
 		if self.metrics_logging_enabled:
 			log_dir = dirname(self._get_metrics_json_path())
 			log_file_path = join(log_dir, 'Metrics.log')
@@ -122,7 +128,8 @@ class DevelopmentApplicationContext(ApplicationContext):
 		if self._main_window is None:
 			self._main_window = MainWindow(
 				self.app, self.help_menu_actions, self.theme,
-				self.progress_bar_palette, self.mother_fs, NullFileSystem.scheme
+				self.progress_bar_palette, self.mother_fs, NullFileSystem.scheme,
+				self.snapshot_store
 			)
 			# Resolve the cyclic dependency main_window <-> controller
 			self._main_window.set_controller(self.controller)
@@ -191,6 +198,9 @@ class DevelopmentApplicationContext(ApplicationContext):
 		makedirs(icons_dir, exist_ok=True)
 		return IconProvider(qt_icon_provider, fs, icons_dir)
 	@cached_property
+	def snapshot_store(self):
+		return SnapshotStore(self._get_local_data_file('Cache', 'Snapshots.bin'))
+	@cached_property
 	def config(self):
 		return Config(PLATFORM)
 	@cached_property
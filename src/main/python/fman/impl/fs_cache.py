@@ -1,60 +1,390 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple, OrderedDict
 from threading import Lock
+from time import time
 
 class Cache:
-	def __init__(self):
+	"""
+	When the cache holds more than `max_entries` values, it evicts the least
+	recently used directories, with everything that is cached below them.
+	Pinned paths - typically the locations displayed by fman - and the values
+	of the files directly inside them are never evicted.
+
+	The values are stored in a tree of CacheItems that mirrors the file system.
+	This lets #clear(...) and evictions remove whole subtrees. Next to the tree,
+	a flat dict maps each path to its item. This makes lookups O(1).
+
+	`get_policy` is an optional function that returns the CachePolicy (see
+	fman.fs) for a given directory. It determines when the values of the files
+	in the directory need to be revalidated.
+	"""
+	def __init__(self, max_entries=None, get_policy=None):
+		if max_entries is None:
+			max_entries = DEFAULT_MAX_ENTRIES
+		self._get_policy = get_policy
 		self._root = CacheItem()
+		self._items = {}
+		self._max_entries = max_entries
+		# Guards the fields below and the structure of the tree:
+		self._lock = Lock()
+		# Maps the (path, attr) pairs whose values are being computed by
+		# #query(...) to [Lock, number of threads using the Lock]:
+		self._query_locks = {}
+		# The directories whose contents were accessed, least recently used
+		# first. See #_touch(...):
+		self._recently_used = OrderedDict()
+		self._last_touched = _NOTHING
+		self._pinned = defaultdict(int)
+		# Maps directory paths to _Validity objects. Read without self._lock on
+		# the fast paths. This is safe because single dict operations are
+		# atomic:
+		self._validity = {}
+		# The policies of the directories seen most recently. Unlike
+		# self._validity, they survive #clear(...). This saves calls to
+		# get_policy, which may perform I/O, when a directory is reloaded:
+		self._policies = OrderedDict()
+		self._num_entries = 0
+		self._num_hits = 0
+		self._num_misses = 0
+		self._num_evictions = 0
 	def put(self, path, attr, value):
-		self._root.update_child(path).put(attr, value)
+		self._init_validity(path, attr)
+		with self._lock:
+			self._touch(path)
+			self._put(path, self._get_or_create_item(path), attr, value)
 	def get(self, path, attr):
-		return self._root.get_child(path).get(attr)
+		self._revalidate_if_expired(path, attr)
+		with self._lock:
+			try:
+				result = self._items[path].attrs[attr]
+			except KeyError:
+				self._num_misses += 1
+				raise
+			self._num_hits += 1
+			self._touch(path)
+			return result
 	def query(self, path, attr, compute_value):
-		return self._root.update_child(path).query(attr, compute_value)
-	def clear(self, path):
-		if not path:
-			self._root = CacheItem()
-		else:
+		self._revalidate_if_expired(path, attr)
+		key = path, attr
+		with self._lock:
+			self._touch(path)
+			item = self._get_or_create_item(path)
 			try:
-				self._root.delete_child(path)
+				result = item.attrs[attr]
 			except KeyError:
 				pass
-
-class CacheItem:
-	def __init__(self):
-		self._children = {}
-		self._attrs = {}
-		self._attr_locks = defaultdict(Lock)
-	def put(self, attr, value):
-		self._attrs[attr] = value
-	def get(self, attr):
-		return self._attrs[attr]
-	def query(self, attr, compute_value):
-		# Because `defaultdict` and `Lock` are implemented in C, they do not
-		# release the GIL and the dict access is atomic:
-		with self._attr_locks[attr]:
+			else:
+				self._num_hits += 1
+				return result
+			# Create the Lock lazily. This saves memory because there are many
+			# values but only few are being computed at any given time:
 			try:
-				return self._attrs[attr]
+				query_lock = self._query_locks[key]
 			except KeyError:
-				result = self._attrs[attr] = compute_value()
+				query_lock = self._query_locks[key] = [Lock(), 0]
+			query_lock[1] += 1
+		try:
+			# Compute the value outside of self._lock because this may be
+			# slow. The query lock ensures that it is computed only once:
+			with query_lock[0]:
+				with self._lock:
+					try:
+						result = item.attrs[attr]
+					except KeyError:
+						self._num_misses += 1
+					else:
+						self._num_hits += 1
+						return result
+				self._init_validity(path, attr)
+				result = compute_value()
+				with self._lock:
+					self._put(path, item, attr, result)
 				return result
-	def get_child(self, path):
-		children = self._children
-		for part in path.split('/'):
-			child = children[part]
-			children = child._children
-		return child
-	def update_child(self, path):
-		children = self._children
-		for part in path.split('/'):
+		finally:
+			with self._lock:
+				query_lock[1] -= 1
+				if not query_lock[1]:
+					del self._query_locks[key]
+	def clear(self, path):
+		with self._lock:
+			if not path:
+				self._root = CacheItem()
+				self._items = {}
+				self._validity = {}
+				self._policies = OrderedDict()
+				self._recently_used = OrderedDict()
+				self._last_touched = _NOTHING
+				self._num_entries = 0
+				return
 			try:
-				child = children[part]
+				item = self._items[path]
 			except KeyError:
-				child = children[part] = CacheItem()
-			children = child._children
-		return child
-	def delete_child(self, path):
-		parts = path.split('/', 1)
-		if len(parts) == 1:
-			del self._children[parts[0]]
+				return
+			self._remove(path, item)
+	def discard(self, path, attr):
+		"""
+		Remove a single value. Unlike #clear(...), this keeps the other values
+		of `path` and those of the files below it.
+		"""
+		with self._lock:
+			try:
+				item = self._items[path]
+			except KeyError:
+				return
+			if item.attrs.pop(attr, _NOTHING) is not _NOTHING:
+				self._num_entries -= 1
+	def pin(self, path):
+		"""
+		Never evict the values of `path` and of the files directly inside it,
+		until #unpin(...) is called as many times as this method.
+		"""
+		with self._lock:
+			self._pinned[path] += 1
+	def unpin(self, path):
+		with self._lock:
+			self._pinned[path] -= 1
+			if not self._pinned[path]:
+				del self._pinned[path]
+			self._evict_if_necessary()
+	def set_max_entries(self, max_entries):
+		with self._lock:
+			self._max_entries = max_entries
+			self._evict_if_necessary()
+	def get_stats(self):
+		with self._lock:
+			return CacheStats(
+				self._num_entries, self._num_hits, self._num_misses,
+				self._num_evictions
+			)
+	def _init_validity(self, path, attr):
+		"""
+		Remember when the first value was cached for the directory that `path`
+		is in, and the directory's version at that time. Must be called before
+		the value is computed, so changes in the meantime aren't missed.
+		"""
+		# Must be called without self._lock held because it may perform I/O.
+		if self._get_policy is None:
+			return
+		dir_path = _get_dir_path(path, attr)
+		if dir_path in self._validity:
+			return
+		with self._lock:
+			policy = self._policies.get(dir_path)
+			if policy is not None:
+				self._policies.move_to_end(dir_path)
+		if policy is None:
+			policy = self._get_policy(dir_path or '')
+			with self._lock:
+				self._policies[dir_path] = policy
+				if len(self._policies) > _MAX_POLICIES:
+					self._policies.popitem(last=False)
+		version = None
+		if policy.max_age is not None:
+			version = policy.get_version(dir_path or '')
+		with self._lock:
+			self._validity.setdefault(dir_path, _Validity(policy, version))
+	def _revalidate_if_expired(self, path, attr):
+		# Must be called without self._lock held because it may perform I/O.
+		if self._get_policy is None:
+			return
+		dir_path = _get_dir_path(path, attr)
+		validity = self._validity.get(dir_path)
+		if validity is None or not validity.is_expired():
+			return
+		version = validity.policy.get_version(dir_path or '')
+		with self._lock:
+			if self._validity.get(dir_path) is not validity:
+				# The directory was cleared in the meantime.
+				return
+			if version is None or version != validity.version:
+				self._expire(dir_path)
+			validity.version = version
+			validity.validated_at = time()
+	def _expire(self, dir_path):
+		"""
+		Remove the directory's listing and the values of the files in it.
+		"""
+		# Must be called with self._lock held.
+		if dir_path is None:
+			item = self._root
+		else:
+			try:
+				item = self._items[dir_path]
+			except KeyError:
+				return
+		if item.attrs.pop(_LISTING_ATTR, _NOTHING) is not _NOTHING:
+			self._num_entries -= 1
+		for name, child in list((item.children or {}).items()):
+			if child.children or _LISTING_ATTR in child.attrs:
+				# Keep the child's listing. It is validated separately:
+				listing = child.attrs.pop(_LISTING_ATTR, _NOTHING)
+				self._num_entries -= len(child.attrs)
+				child.attrs.clear()
+				if listing is not _NOTHING:
+					child.attrs[_LISTING_ATTR] = listing
+			else:
+				self._remove(_join(dir_path, name), child)
+	def _get_or_create_item(self, path):
+		# Must be called with self._lock held.
+		try:
+			return self._items[path]
+		except KeyError:
+			pass
+		parent_path = _parent(path)
+		if parent_path is None:
+			parent = self._root
+		else:
+			parent = self._get_or_create_item(parent_path)
+		result = self._items[path] = CacheItem()
+		parent.add_child(_name(path, parent_path), result)
+		return result
+	def _put(self, path, item, attr, value):
+		# Must be called with self._lock held.
+		is_new = attr not in item.attrs
+		item.attrs[attr] = value
+		# The item may have been removed while its value was being computed:
+		if is_new and self._items.get(path) is item:
+			self._num_entries += 1
+			self._evict_if_necessary()
+	def _remove(self, path, item):
+		"""
+		Remove the item at the given path and its descendants. Return the
+		number of values they held.
+		"""
+		# Must be called with self._lock held.
+		parent_path = _parent(path)
+		if parent_path is None:
+			parent = self._root
+		else:
+			parent = self._items[parent_path]
+		del parent.children[_name(path, parent_path)]
+		result = 0
+		to_visit = [(path, item)]
+		while to_visit:
+			path, item = to_visit.pop()
+			del self._items[path]
+			self._validity.pop(path, None)
+			self._recently_used.pop(path, None)
+			result += len(item.attrs)
+			if item.children:
+				to_visit.extend(
+					(path + '/' + name, child)
+					for name, child in item.children.items()
+				)
+		self._num_entries -= result
+		if self._last_touched not in self._recently_used:
+			self._last_touched = _NOTHING
+		return result
+	def _touch(self, path):
+		# Must be called with self._lock held.
+		dir_path = _parent(path)
+		if dir_path == self._last_touched:
+			# Consecutive accesses are usually to files in the same directory.
+			return
+		self._last_touched = dir_path
+		# Also mark the ancestors as used. This ensures that a directory is
+		# never evicted before its subdirectories:
+		while True:
+			self._recently_used[dir_path] = None
+			self._recently_used.move_to_end(dir_path)
+			if dir_path is None:
+				break
+			dir_path = _parent(dir_path)
+	def _evict_if_necessary(self):
+		# Must be called with self._lock held.
+		kept = []
+		while self._num_entries > self._max_entries and self._recently_used:
+			dir_path = self._recently_used.popitem(last=False)[0]
+			if dir_path in self._pinned or self._evict(dir_path):
+				kept.append(dir_path)
+		# Keep the directories that contain pinned paths at the front of the
+		# queue, so they are evicted once the paths are unpinned:
+		for dir_path in reversed(kept):
+			self._recently_used[dir_path] = None
+			self._recently_used.move_to_end(dir_path, last=False)
+		if self._last_touched not in self._recently_used:
+			self._last_touched = _NOTHING
+	def _evict(self, dir_path):
+		"""
+		Return whether some contents were kept because they are pinned.
+		"""
+		if dir_path is None:
+			item = self._root
 		else:
-			self._children[parts[0]].delete_child(parts[1])
\ No newline at end of file
+			try:
+				item = self._items[dir_path]
+			except KeyError:
+				# The directory was cleared or evicted along with its parent.
+				return False
+		result = False
+		for name, child in list((item.children or {}).items()):
+			child_path = _join(dir_path, name)
+			if self._contains_pinned(child_path):
+				result = True
+			else:
+				self._num_evictions += self._remove(child_path, child)
+		return result
+	def _contains_pinned(self, path):
+		prefix = path + '/'
+		return any(
+			pinned == path or pinned.startswith(prefix)
+			for pinned in self._pinned
+		)
+
+# On the order of 100 bytes per entry:
+DEFAULT_MAX_ENTRIES = 500000
+
+_MAX_POLICIES = 10000
+
+CacheStats = namedtuple(
+	'CacheStats', ('num_entries', 'num_hits', 'num_misses', 'num_evictions')
+)
+
+_NOTHING = object()
+
+# The listing of a directory is cached on the directory's own item. But for the
+# purposes of validation, it belongs with the values of the files inside:
+_LISTING_ATTR = 'iterdir'
+
+def _get_dir_path(path, attr):
+	return path if attr == _LISTING_ATTR else _parent(path)
+
+def _join(dir_path, name):
+	return name if dir_path is None else dir_path + '/' + name
+
+def _parent(path):
+	"""
+	The path of the CacheItem that contains the item for `path`. None stands
+	for the root item.
+	"""
+	try:
+		return path[:path.rindex('/')]
+	except ValueError:
+		return None
+
+def _name(path, parent_path):
+	return path if parent_path is None else path[len(parent_path) + 1:]
+
+class _Validity:
+
+	__slots__ = ('policy', 'version', 'validated_at')
+
+	def __init__(self, policy, version):
+		self.policy = policy
+		self.version = version
+		self.validated_at = time()
+	def is_expired(self):
+		max_age = self.policy.max_age
+		return max_age is not None and time() - self.validated_at > max_age
+
+class CacheItem:
+
+	__slots__ = ('attrs', 'children')
+
+	def __init__(self):
+		self.attrs = {}
+		# Most items are files. Only create the dict when there are children:
+		self.children = None
+	def add_child(self, name, item):
+		if self.children is None:
+			self.children = {}
+		self.children[name] = item
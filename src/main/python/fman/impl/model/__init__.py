@@ -3,10 +3,11 @@ from fman.impl.model.drag_and_drop import DragAndDrop
 from fman.impl.model.diff import ComputeDiff
 from fman.impl.model.file_watcher import FileWatcher
 from fman.impl.model.table import TableModel, Cell, Row
+from fman.impl.model.worker import get_scheduler
 from fman.impl.util.qt.thread import run_in_main_thread
 from fman.impl.util.url import is_pardir
 from fman.url import dirname, splitscheme
-from PyQt5.QtCore import pyqtSignal, QSortFilterProxyModel, Qt
+from PyQt5.QtCore import pyqtSignal, QSortFilterProxyModel, Qt, QModelIndex
 
 import errno
 import sip
@@ -20,12 +21,14 @@ class SortedFileSystemModel(QSortFilterProxyModel):
 	sort_order_changed = pyqtSignal(int, int)
 	transaction_ended = pyqtSignal()
 
-	def __init__(self, parent, fs, null_location):
+	def __init__(self, parent, fs, null_location, snapshots=None):
 		super().__init__(parent)
 		self._fs = fs
 		self._null_location = null_location
+		self._snapshots = snapshots
 		self._filters = []
-		self._already_visited = set()
+		# Maps the URLs of visited locations to their #dir_signature(...):
+		self._already_visited = {}
 		self._num_rows_to_preload = 0
 		self.set_location(null_location)
 		self._fs.file_removed.add_callback(self._on_file_removed)
@@ -84,28 +87,40 @@ class SortedFileSystemModel(QSortFilterProxyModel):
 				sort_col_index = column_names.index(sort_column)
 			except ValueError:
 				pass
+		signature = self._get_dir_signature(url)
 		if url in self._already_visited:
-			orig_callback = callback
-			def callback():
-				orig_callback()
-				self.reload()
+			# The cache may be out of date because we stopped watching the
+			# location when we left it. Unless the signature tells us that
+			# nothing changed, reload:
+			signature_before = self._already_visited[url]
+			if signature is None or signature != signature_before:
+				orig_callback = callback
+				def callback():
+					orig_callback()
+					self.reload()
 		self._set_location_main(
-			url, columns, sort_col_index, ascending, callback
+			url, columns, sort_col_index, ascending, callback, signature
 		)
+	def _get_dir_signature(self, url):
+		try:
+			return self._fs.dir_signature(url)
+		except OSError:
+			return None
 	@run_in_main_thread
 	def _set_location_main(
-		self, url, columns, sort_col_index, ascending, callback
+		self, url, columns, sort_col_index, ascending, callback, signature
 	):
 		old_model = self.sourceModel()
 		if old_model:
 			self._disconnect_signals(old_model)
 		new_model = Model(
 			self._fs, url, columns, sort_col_index, ascending,
-			self._num_rows_to_preload, self._filters
+			self._num_rows_to_preload, self._filters, group=self,
+			snapshots=self._snapshots
 		)
 		self.setSourceModel(new_model)
 		self._connect_signals(new_model)
-		self._already_visited.add(url)
+		self._already_visited[url] = signature
 		self.location_changed.emit(url)
 		order = Qt.AscendingOrder if ascending else Qt.DescendingOrder
 		self.sort_order_changed.emit(sort_col_index, order)
@@ -122,6 +137,33 @@ class SortedFileSystemModel(QSortFilterProxyModel):
 	def row_is_loaded(self, i):
 		source_row = self.mapToSource(self.index(i, 0)).row()
 		return self.sourceModel().row_is_loaded(source_row)
+	def get_num_rows_pending(self):
+		return self.sourceModel().get_num_rows_pending()
+	def set_viewport(self, start, stop):
+		if start < stop:
+			self.sourceModel().set_viewport(
+				self._map_row_to_source(start),
+				self._map_row_to_source(stop - 1) + 1
+			)
+	def find_prefix(self, prefix):
+		"""
+		Return the index of the first visible row whose name starts with the
+		given prefix, ignoring case. The index is invalid if there is no such
+		row.
+		"""
+		source_model = self.sourceModel()
+		result = QModelIndex()
+		def is_visible(rownum):
+			nonlocal result
+			result = self.mapFromSource(source_model.index(rownum, 0))
+			return result.isValid()
+		source_model.find_prefix(prefix, is_visible)
+		return result
+	def focus(self):
+		"""
+		Give this model's background work precedence over that of other models.
+		"""
+		get_scheduler().focus(self)
 	def load_rows(self, rows, callback=None):
 		source_rows = [self._map_row_to_source(row) for row in rows]
 		self.sourceModel().load_rows(source_rows, callback)
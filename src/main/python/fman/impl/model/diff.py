@@ -1,3 +1,5 @@
+from bisect import bisect_left
+from fman.impl.model.fenwick import FenwickTree
 from fman.impl.util import ConstructorMixin, EqMixin, ReprMixin
 
 class ComputeDiff:
@@ -16,44 +18,118 @@ class ComputeDiff:
 			raise ValueError('Duplicate rows are not supported')
 		self._result = []
 	def __call__(self):
+		self._remove_rows()
+		self._insert_rows()
+		self._move_rows()
+		self._update_rows()
+		return join(self._result)
+	def _remove_rows(self):
 		# Using a set for the "contains" check below improves performance 40x:
 		new_keys = set(self._new_keys)
 		for i in range(len(self._old_keys) - 1, -1, -1):
 			if self._old_keys[i] not in new_keys:
-				self._remove_row(i)
+				self._result.append(DiffEntry(i, i + 1, -1, []))
+		# Rebuild the lists once instead of popping each row (O(n^2)):
+		rows, keys = [], []
+		for row, key in zip(self._old_rows, self._old_keys):
+			if key in new_keys:
+				rows.append(row)
+				keys.append(key)
+		self._old_rows, self._old_keys = rows, keys
+	def _insert_rows(self):
 		# Using a set for the "contains" check below improves performance 40x:
 		old_keys = set(self._old_keys)
+		rows, keys = [], []
+		old_rows_and_keys = iter(zip(self._old_rows, self._old_keys))
 		for i, new_key in enumerate(self._new_keys):
-			if new_key not in old_keys:
-				self._insert_row(i, self._new_rows[i])
-		for i, new_key in enumerate(self._new_keys):
-			if new_key != self._old_keys[i]:
-				old_row_index = self._old_keys.index(new_key, i)
-				if old_row_index != i:
-					self._move_row(old_row_index, i)
-			old_row = self._old_rows[i]
-			new_row = self._new_rows[i]
-			if old_row != new_row:
-				self._update_row(i, new_row)
-		if self._old_keys != self._new_keys:
-			raise AssertionError('%r != %r' % (self._old_keys, self._new_keys))
-		return join(self._result)
-	def _remove_row(self, i):
-		self._result.append(DiffEntry(i, i + 1, -1, []))
-		self._old_rows.pop(i)
-		self._old_keys.pop(i)
-	def _insert_row(self, i, row):
-		self._result.append(DiffEntry(-1, -1, i, [row]))
-		self._old_rows.insert(i, row)
-		self._old_keys.insert(i, self._key_fn(row))
-	def _move_row(self, src, dest):
-		self._result.append(DiffEntry(src, src + 1, dest, []))
-		self._old_rows.insert(dest, self._old_rows.pop(src))
-		self._old_keys.insert(dest, self._old_keys.pop(src))
-	def _update_row(self, i, row):
-		self._result.append(DiffEntry(i, i + 1, i, [row]))
-		self._old_rows[i] = row
-		assert self._key_fn(row) == self._old_keys[i]
+			if new_key in old_keys:
+				row, key = next(old_rows_and_keys)
+			else:
+				row, key = self._new_rows[i], new_key
+				self._result.append(DiffEntry(-1, -1, i, [row]))
+			rows.append(row)
+			keys.append(key)
+		self._old_rows, self._old_keys = rows, keys
+	def _move_rows(self):
+		"""
+		Keep the largest set of rows that are already in the right order and
+		move each other row directly after its predecessor in the new order.
+		This requires the fewest possible moves. A Fenwick tree lets us compute
+		the row numbers of each move in O(log n).
+		"""
+		old_keys = self._old_keys
+		new_indices = {key: i for i, key in enumerate(self._new_keys)}
+		in_order = _longest_increasing_subsequence(
+			[new_indices[key] for key in old_keys]
+		)
+		old_indices = {key: i for i, key in enumerate(old_keys)}
+		# The rows that are moved after a row in `in_order` end up in a "run"
+		# after it. Runs[0] contains the rows that are moved to the very top:
+		runs = [[] for _ in range(len(old_keys) + 1)]
+		run = runs[0]
+		to_move = []
+		for new_key in self._new_keys:
+			i = old_indices[new_key]
+			if i in in_order:
+				run = runs[i + 1]
+			else:
+				run.append(i)
+				to_move.append(i)
+		if not to_move:
+			return
+		# Each row has a "slot" before and after it is moved. The slots are
+		# ordered like the rows in the table:
+		slot_before, slot_after = [0] * len(old_keys), [0] * len(old_keys)
+		num_slots = 0
+		for i in range(-1, len(old_keys)):
+			if i >= 0:
+				slot_before[i] = num_slots
+				num_slots += 1
+			for j in runs[i + 1]:
+				slot_after[j] = num_slots
+				num_slots += 1
+		occupied = FenwickTree(num_slots)
+		for i in range(len(old_keys)):
+			occupied.add(slot_before[i], 1)
+		for i in to_move:
+			src = occupied.prefix_sum(slot_before[i])
+			occupied.add(slot_before[i], -1)
+			dest = occupied.prefix_sum(slot_after[i])
+			occupied.add(slot_after[i], 1)
+			self._result.append(DiffEntry(src, src + 1, dest, []))
+		rows_by_key = dict(zip(old_keys, self._old_rows))
+		self._old_keys = list(self._new_keys)
+		self._old_rows = [rows_by_key[key] for key in self._new_keys]
+	def _update_rows(self):
+		for i, new_row in enumerate(self._new_rows):
+			if self._old_rows[i] != new_row:
+				self._result.append(DiffEntry(i, i + 1, i, [new_row]))
+				assert self._key_fn(new_row) == self._old_keys[i]
+
+def _longest_increasing_subsequence(seq):
+	"""
+	Return the set of indices of a longest increasing subsequence of `seq`.
+	Of several such subsequences, the one that ends first is returned.
+	"""
+	tails = []
+	tail_indices = []
+	predecessors = []
+	end = -1
+	for i, value in enumerate(seq):
+		pos = bisect_left(tails, value)
+		predecessors.append(tail_indices[pos - 1] if pos else -1)
+		if pos == len(tails):
+			tails.append(value)
+			tail_indices.append(i)
+			end = i
+		else:
+			tails[pos] = value
+			tail_indices[pos] = i
+	result = set()
+	while end != -1:
+		result.add(end)
+		end = predecessors[end]
+	return result
 
 def join(diff_entries):
 	if not diff_entries:
@@ -0,0 +1,34 @@
+class FenwickTree:
+	"""
+	Maintains prefix sums of a list of numbers in O(log n) per operation.
+	"""
+	def __init__(self, size):
+		self._tree = [0] * (size + 1)
+	def add(self, i, delta):
+		i += 1
+		while i < len(self._tree):
+			self._tree[i] += delta
+			i += i & -i
+	def prefix_sum(self, end):
+		"""
+		Return the sum of the numbers at indices [0, end).
+		"""
+		result = 0
+		while end > 0:
+			result += self._tree[end]
+			end -= end & -end
+		return result
+	def search(self, value):
+		"""
+		Return (i, value - prefix_sum(i)) for the largest i such that
+		prefix_sum(i) <= value. Requires that all numbers be non-negative.
+		"""
+		i = 0
+		step = 1 << (len(self._tree) - 1).bit_length()
+		while step:
+			j = i + step
+			if j < len(self._tree) and self._tree[j] <= value:
+				i = j
+				value -= self._tree[j]
+			step >>= 1
+		return i, value
@@ -1,24 +1,41 @@
 from fman.url import dirname
-from threading import Lock
+from threading import current_thread, Lock, Timer
+from time import time
 
 class FileWatcher:
-	def __init__(self, fs, model):
+	def __init__(self, fs, model, reload_delay=.1, max_reload_delay=2):
 		self._fs = fs
 		self._model = model
 		self._lock = Lock()
+		self._min_reload_delay = reload_delay
+		self._max_reload_delay = max_reload_delay
+		# Guards the fields below:
+		self._reload_timer_lock = Lock()
+		self._reload_timer = None
+		self._reload_delay = reload_delay
+		self._first_change = self._last_change = None
+		self._last_reload = float('-inf')
 	def start(self):
 		with self._lock:
 			self._fs.file_added.add_callback(self._on_file_added)
 			self._fs.file_removed.add_callback(self._on_file_removed)
+			self._fs.columns_changed.add_callback(self._on_columns_changed)
 			self._fs.add_file_changed_callback(
 				self._model.get_location(), self._on_file_changed
 			)
 	def shutdown(self):
+		with self._reload_timer_lock:
+			if self._reload_timer:
+				self._reload_timer.cancel()
+				self._reload_timer = None
 		with self._lock:
 			try:
 				self._fs.remove_file_changed_callback(
 					self._model.get_location(), self._on_file_changed
 				)
+				self._fs.columns_changed.remove_callback(
+					self._on_columns_changed
+				)
 				self._fs.file_removed.remove_callback(self._on_file_removed)
 				self._fs.file_added.remove_callback(self._on_file_added)
 			except ValueError:
@@ -32,8 +49,49 @@ class FileWatcher:
 	def _on_file_changed(self, url):
 		if url == self._model.get_location():
 			# The common case
-			self._model.reload()
+			self._reload_soon()
 		elif self._is_in_root(url):
 			self._model.notify_file_changed(url)
+	def _on_columns_changed(self, url):
+		if self._is_in_root(url):
+			self._model.reload_columns(url)
+	def _reload_soon(self):
+		# Directories such as build output folders can change many times per
+		# second. Wait until the changes pause for the delay, then handle them
+		# all with one reload. While changes keep coming, increase the delay:
+		with self._reload_timer_lock:
+			now = time()
+			self._last_change = now
+			if self._reload_timer:
+				return
+			if now - self._last_reload < self._reload_delay:
+				self._reload_delay = \
+					min(2 * self._reload_delay, self._max_reload_delay)
+			else:
+				self._reload_delay = self._min_reload_delay
+			self._first_change = now
+			self._start_reload_timer(self._reload_delay)
+	def _reload(self):
+		with self._reload_timer_lock:
+			if current_thread() is not self._reload_timer:
+				# The timer was cancelled by #shutdown().
+				return
+			now = time()
+			# Don't postpone the reload indefinitely if changes never pause:
+			reload_at = min(
+				self._last_change + self._reload_delay,
+				self._first_change + self._max_reload_delay
+			)
+			if now < reload_at:
+				self._start_reload_timer(reload_at - now)
+				return
+			self._reload_timer = None
+			self._last_reload = now
+		self._model.reload_changed()
+	def _start_reload_timer(self, delay):
+		# Must be called with self._reload_timer_lock held.
+		self._reload_timer = Timer(delay, self._reload)
+		self._reload_timer.daemon = True
+		self._reload_timer.start()
 	def _is_in_root(self, url):
 		return dirname(url) == self._model.get_location()
\ No newline at end of file
@@ -1,12 +1,21 @@
-from fman.impl.util import filenotfounderror
+from collections import OrderedDict
+from fman import PLATFORM
+from fman.impl.util import filenotfounderror, writing_atomically
+from fman.impl.util.qt.thread import run_in_main_thread
 from fman.url import splitscheme
 from functools import lru_cache
+from hashlib import sha1
+from os.path import basename, splitext, split
 from pathlib import Path, PurePosixPath
-from PyQt5.QtCore import QFileInfo
+from PyQt5.QtCore import QFileInfo, QSize
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QFileIconProvider
+from stat import S_ISDIR, S_ISLNK
+from threading import Lock
+from time import time
 
 import logging
+import os
 import sys
 
 _LOG = logging.getLogger(__name__)
@@ -14,6 +23,9 @@ _LOG = logging.getLogger(__name__)
 class IconProvider:
 	def __init__(self, qt_icon_provider, fs, cache_dir):
 		self._qt_icon_provider = qt_icon_provider
+		# Models may load files from several threads at once. Qt's icon
+		# providers are not documented to be thread-safe. So serialize access:
+		self._qt_icon_provider_lock = Lock()
 		self._fs = fs
 		self._folder_icon = self._get_qt_icon(cache_dir)
 		self._cache_dir = cache_dir
@@ -21,14 +33,19 @@ class IconProvider:
 			f.suffix: self._get_qt_icon(f)
 			for f in Path(cache_dir).glob('file*')
 		}
+		# Local files with the same type key (see _get_type_key(...)) share one
+		# QIcon. Its pixmaps are saved in this directory so they don't have to
+		# be obtained from the OS again after a restart:
+		self._type_icons = {}
+		self._type_icons_dir = Path(cache_dir, 'Types')
 	def get_icon(self, url):
 		scheme, path = splitscheme(url)
 		if scheme == 'file://':
-			return self._get_qt_icon(path)
+			return self._get_local_icon(path)
 		url = self._fs.resolve(url)
 		scheme, path = splitscheme(url)
 		if scheme == 'file://':
-			return self._get_qt_icon(path)
+			return self._get_local_icon(path)
 		if self._fs.is_dir(url):
 			return self._folder_icon
 		suffix = PurePosixPath(path).suffix
@@ -40,10 +57,108 @@ class IconProvider:
 				f.write('fman')
 			self._cache[suffix] = self._get_qt_icon(surrogate)
 		return self._cache[suffix]
+	def _get_local_icon(self, path):
+		type_key = _get_type_key(path)
+		if type_key is None:
+			return self._get_qt_icon(path)
+		try:
+			return self._type_icons[type_key]
+		except KeyError:
+			pass
+		icon_dir = self._type_icons_dir / _hash(type_key)
+		result = _load_icon(icon_dir)
+		if result is None:
+			result = self._get_qt_icon(path)
+			try:
+				_save_icon(result, icon_dir)
+			except OSError:
+				_LOG.exception('Could not save icon to %s', icon_dir)
+		# Another thread may have been faster. Use its icon so all files of the
+		# same type share the same instance:
+		return self._type_icons.setdefault(type_key, result)
 	def _get_qt_icon(self, path):
 		if not isinstance(path, str):
 			path = str(path)
-		return self._qt_icon_provider.icon(QFileInfo(path))
+		with self._qt_icon_provider_lock:
+			return self._qt_icon_provider.icon(QFileInfo(path))
+
+def _get_type_key(path):
+	"""
+	Local files with the same type key have the same icon. Return None if the
+	file may have an icon of its own.
+	"""
+	stat = os.lstat(path)
+	is_symlink = S_ISLNK(stat.st_mode)
+	if is_symlink:
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None
+	if S_ISDIR(stat.st_mode):
+		# Directories can have custom icons. Eg. Desktop, Documents etc.
+		return None
+	suffix = splitext(basename(path))[1].lower()
+	if PLATFORM == 'Windows':
+		if suffix in _WINDOWS_OWN_ICON_SUFFIXES:
+			return None
+		is_executable = False
+	else:
+		if not suffix:
+			# The OS determines the type of such files from their contents.
+			return None
+		if suffix == '.desktop':
+			return None
+		is_executable = bool(stat.st_mode & 0o111)
+	return suffix, is_executable, is_symlink
+
+_WINDOWS_OWN_ICON_SUFFIXES = {
+	'.exe', '.lnk', '.ico', '.cur', '.ani', '.url', '.scr', '.cpl', '.msc'
+}
+
+def _hash(type_key):
+	return sha1(repr(type_key).encode('utf-8')).hexdigest()
+
+def _load_icon(icon_dir):
+	try:
+		is_fresh = time() - icon_dir.stat().st_mtime < _MAX_ICON_AGE
+	except OSError:
+		return None
+	if not is_fresh:
+		# The user may have changed the application associated with the type.
+		return None
+	result = QIcon()
+	for png in icon_dir.glob('*.png'):
+		# Pass the size. Otherwise, QIcon loads the file immediately:
+		width, height = map(int, png.stem.split('x'))
+		result.addFile(str(png), QSize(width, height))
+	return None if result.isNull() else result
+
+def _save_icon(icon, icon_dir):
+	icon_dir.mkdir(parents=True, exist_ok=True)
+	for image in _render_icon(icon):
+		file_name = '%dx%d.png' % (image.width(), image.height())
+		with writing_atomically(str(icon_dir / file_name)) as tmp_path:
+			if not image.save(tmp_path, 'PNG'):
+				raise OSError('Could not write ' + tmp_path)
+	# Update the mtime, which _load_icon(...) uses to determine the icon's age:
+	os.utime(str(icon_dir))
+
+@run_in_main_thread
+def _render_icon(icon):
+	"""
+	QPixmaps may only be used in the GUI thread. So convert the icon's pixmaps
+	to QImages there. These can be saved from any thread.
+	"""
+	result = []
+	for size in icon.availableSizes() or _DEFAULT_ICON_SIZES:
+		pixmap = icon.pixmap(size)
+		if not pixmap.isNull():
+			result.append(pixmap.toImage())
+	return result
+
+_MAX_ICON_AGE = 7 * 24 * 60 * 60
+
+_DEFAULT_ICON_SIZES = [QSize(16, 16), QSize(32, 32), QSize(64, 64)]
 
 class GnomeFileIconProvider(QFileIconProvider):
 	def __init__(self, *args, **kwargs):
@@ -59,6 +174,9 @@ class GnomeFileIconProvider(QFileIconProvider):
 			# 'FileQueryInfoFlags' but got 'FileQueryInfoFlags'".
 			self._NOFOLLOW_SYMLINKS = \
 				self.Gio.FileQueryInfoFlags.NOFOLLOW_SYMLINKS
+		# Maps directory paths to _IconNameBatch. Doesn't need a Lock because
+		# IconProvider serializes all calls to this class:
+		self._batches = OrderedDict()
 	def _init_pgi(self):
 		import pgi
 		pgi.install_as_gi()
@@ -86,20 +204,67 @@ class GnomeFileIconProvider(QFileIconProvider):
 		return result or super().icon(arg)
 	def _icon(self, file_path):
 		try:
-			file_info = self._query_gio_info(
-				file_path, 'standard::icon', self._NOFOLLOW_SYMLINKS, None
-			)
+			icon_name = self._get_icon_name(file_path)
 		except FileNotFoundError:
 			raise
 		except Exception:
 			_LOG.exception("Could not obtain icon for %s", file_path)
 		else:
-			if file_info:
-				icon = file_info.get_icon()
-				if icon:
-					icon_names = icon.get_names()
-					if icon_names:
-						return self._load_gtk_icon(icon_names[0])
+			if icon_name:
+				return self._load_gtk_icon(icon_name)
+	def _get_icon_name(self, file_path):
+		dir_path, file_name = split(file_path)
+		try:
+			return self._get_batch(dir_path).pop(file_name)
+		except KeyError:
+			file_info = self._query_gio_info(
+				file_path, 'standard::icon', self._NOFOLLOW_SYMLINKS, None
+			)
+			return _get_icon_name(file_info)
+	def _get_batch(self, dir_path):
+		"""
+		Return a dict file name -> icon name for the files in the given
+		directory, obtained in one pass. The dict is empty until there have
+		been enough requests for the directory to make the pass worthwhile.
+		"""
+		batch = self._batches.pop(dir_path, None)
+		try:
+			# Adding, removing or renaming files updates the mtime:
+			dir_mtime_ns = os.stat(dir_path).st_mtime_ns
+		except OSError:
+			return {}
+		if batch is None or batch.is_expired() or \
+			batch.dir_mtime_ns != dir_mtime_ns:
+			batch = _IconNameBatch(dir_mtime_ns)
+		self._batches[dir_path] = batch
+		if len(self._batches) > _MAX_NUM_BATCHES:
+			self._batches.popitem(last=False)
+		batch.num_requests += 1
+		if batch.icon_names is None and \
+			batch.num_requests >= _MIN_REQUESTS_PER_BATCH:
+			try:
+				batch.icon_names = self._enumerate_icon_names(dir_path)
+			except self.GLib.GError:
+				# For instance, no permission to list the directory. Query the
+				# files individually.
+				batch.icon_names = {}
+		return batch.icon_names or {}
+	def _enumerate_icon_names(self, dir_path):
+		enumerator = self.Gio.file_new_for_path(dir_path).enumerate_children(
+			'standard::name,standard::icon', self._NOFOLLOW_SYMLINKS, None
+		)
+		result = {}
+		try:
+			while True:
+				file_info = enumerator.next_file(None)
+				if file_info is None:
+					break
+				icon_name = _get_icon_name(file_info)
+				if icon_name:
+					result[file_info.get_name()] = icon_name
+		finally:
+			enumerator.close(None)
+		return result
 	def _query_gio_info(self, file_path, *args):
 		gio_file = self.Gio.file_new_for_path(file_path)
 		try:
@@ -117,5 +282,35 @@ class GnomeFileIconProvider(QFileIconProvider):
 			if icon:
 				return QIcon(icon.get_filename())
 
+def _get_icon_name(gio_file_info):
+	if gio_file_info:
+		icon = gio_file_info.get_icon()
+		if icon:
+			icon_names = icon.get_names()
+			if icon_names:
+				return icon_names[0]
+
+class _IconNameBatch:
+
+	__slots__ = ('icon_names', 'num_requests', 'created_at', 'dir_mtime_ns')
+
+	def __init__(self, dir_mtime_ns):
+		self.icon_names = None
+		self.num_requests = 0
+		self.created_at = time()
+		self.dir_mtime_ns = dir_mtime_ns
+	def is_expired(self):
+		# Files may have changed their type since the batch was obtained:
+		return time() - self.created_at > _MAX_BATCH_AGE
+
+# IconProvider shares icons between files of the same type. So we are often
+# asked about only a few files per directory. Listing a large directory for
+# those would cost more than it saves:
+_MIN_REQUESTS_PER_BATCH = 4
+
+_MAX_BATCH_AGE = 10
+
+_MAX_NUM_BATCHES = 8
+
 class GnomeNotAvailable(RuntimeError):
 	pass
\ No newline at end of file
@@ -1,3 +1,5 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from fman.impl.model.drag_and_drop import DragAndDrop
 from fman.impl.model.file_watcher import FileWatcher
 from fman.impl.model.record_files import RecordFiles
@@ -6,14 +8,21 @@ from fman.impl.model.table import Cell, Row
 from fman.impl.model.worker import Worker
 from fman.impl.util.qt import EditRole
 from fman.impl.util.qt.thread import run_in_main_thread, is_in_main_thread
-from fman.url import join, dirname
+from fman.url import join, dirname, basename
 from functools import wraps, lru_cache
+from itertools import chain
+from math import ceil
 from PyQt5.QtCore import pyqtSignal, Qt
 from PyQt5.QtGui import QIcon, QPixmap
-from threading import Event
+from threading import Lock
 from time import time
 
-def transaction(priority, synchronous=False):
+def transaction(priority, synchronous=False, key=None):
+	"""
+	If a key is given, calls to the decorated method are dropped while a
+	previous call is still queued. Use this only for methods whose arguments
+	don't matter, or that pick up their arguments when they run.
+	"""
 	def decorator(f):
 		@wraps(f)
 		def result(self, *args, **kwargs):
@@ -21,12 +30,9 @@ def transaction(priority, synchronous=False):
 				return
 			if synchronous:
 				assert not is_in_main_thread()
-				has_run = Event()
-				def task():
-					f(self, *args, **kwargs)
-					has_run.set()
-				self._worker.submit(priority, task)
-				has_run.wait()
+				self._worker.submit_and_wait(priority, f, self, *args, **kwargs)
+			elif key is not None:
+				self._worker.submit_once(key, priority, f, self, *args, **kwargs)
 			else:
 				self._worker.submit(priority, f, self, *args, **kwargs)
 		return result
@@ -36,9 +42,12 @@ class Model(SortFilterTableModel, DragAndDrop):
 
 	"""
 	The thread safety of this class works as follows: There is one (and only
-	one) worker thread that loads / computes row values in the background. Every
-	changing operation is performed by it. Because there is only one thread,
-	this prevents concurrent writes.
+	one) Worker that loads / computes row values in the background. Every
+	changing operation is performed by it. The Worker's tasks run in a thread
+	pool shared by all Models, but never concurrently. This prevents concurrent
+	writes. To hide the latency of slow file systems, the worker may fan out the
+	loading of individual files to another thread pool. But it waits for the
+	results and commits them itself.
 
 	When the worker loads / computes new data, it creates copies of the data in
 	memory. Once the entire new data is loaded, @run_in_main_thread is used to
@@ -55,7 +64,7 @@ class Model(SortFilterTableModel, DragAndDrop):
 
 	def __init__(
 		self, fs, location, columns, sort_column=0, ascending=True,
-		num_rows_to_preload=0, filters=None
+		num_rows_to_preload=0, filters=None, group=None, snapshots=None
 	):
 		column_headers = [column.display_name for column in columns]
 		super().__init__(column_headers, sort_column, ascending, filters)
@@ -63,25 +72,65 @@ class Model(SortFilterTableModel, DragAndDrop):
 		self._location = location
 		self._columns = columns
 		self._num_rows_to_preload = num_rows_to_preload
+		self._max_concurrency = 1
 		self._files = {}
+		# The URLs of the rows that are displayed but not yet loaded. Kept up to
+		# date by the overrides of #insert_rows(...) etc. below:
+		self._pending_urls = OrderedDict()
+		self._pending_urls_lock = Lock()
+		# The URLs of the loaded files whose icons still need to be loaded. Also
+		# guarded by _pending_urls_lock:
+		self._pending_icon_urls = OrderedDict()
+		# The range of rows the user is looking at. See #set_viewport(...):
+		self._viewport = None
+		# The rows requested via #load_rows(...) but not yet picked up by the
+		# worker:
+		self._rows_to_load = OrderedDict()
+		self._load_rows_callbacks = []
+		self._rows_to_load_lock = Lock()
 		self._file_watcher = FileWatcher(fs, self)
-		self._worker = Worker()
+		self._worker = Worker(group=group)
+		# An optional SnapshotStore:
+		self._snapshots = snapshots
+		# Whether the files changed since the last snapshot, and when it was
+		# saved (None for never):
+		self._snapshot_is_dirty = False
+		self._snapshot_saved_at = None
+		self._is_streaming = False
 		self._shutdown = False
 	def start(self, callback):
 		self._worker.start()
 		self._init(callback)
 	@transaction(priority=1)
-	def _init(self, callback):
+	def _init(self, callback, first_commit_after=.2, commit_interval=.5):
 		files = []
+		# Display the rows from the last visit while we list the directory:
+		snapshot = self._read_snapshot()
+		if snapshot:
+			self._begin_streaming()
+			self._record_files(list(snapshot.values()))
+		# If listing the directory takes long, display the files we have so far
+		# every once in a while:
+		next_commit = time() + first_commit_after
+		uncommitted = []
 		try:
 			file_names = iter(self._fs.iterdir(self._location))
 		except FileNotFoundError:
+			# For instance because the directory was deleted since the snapshot
+			# was taken:
+			self._end_streaming()
 			self.location_disappeared.emit(self._location)
 			return
+		self._max_concurrency = min(
+			self._fs.get_max_concurrency(self._location), _MAX_LOAD_THREADS
+		)
 		while not self._shutdown:
 			try:
 				file_name = next(file_names)
 			except FileNotFoundError:
+				# Don't leave the transaction of #_begin_streaming() open. It
+				# would stop the transaction_ended listeners from firing:
+				self._end_streaming()
 				self.location_disappeared.emit(self._location)
 				return
 			except (StopIteration, OSError):
@@ -89,12 +138,23 @@ class Model(SortFilterTableModel, DragAndDrop):
 			else:
 				url = join(self._location, file_name)
 				try:
-					file_ = self._init_file(url)
-				except OSError:
-					continue
+					file_ = snapshot.pop(url)
+				except KeyError:
+					try:
+						file_ = self._init_file(url)
+					except OSError:
+						continue
+					uncommitted.append(file_)
 				files.append(file_)
+				if uncommitted and time() >= next_commit:
+					if not self._is_streaming:
+						self._begin_streaming()
+					self._record_files(uncommitted)
+					uncommitted = []
+					next_commit = time() + commit_interval
 		else:
 			assert self._shutdown
+			self._end_streaming()
 			return
 		preloaded_files = self._sorted(self._filter(files))
 		for i in range(min(self._num_rows_to_preload, len(preloaded_files))):
@@ -128,12 +188,20 @@ class Model(SortFilterTableModel, DragAndDrop):
 		# types in arbitrary characters:
 		cells = self._load_cells(url, [0])
 		return File(url, _get_empty_icon(), False, cells, False)
-	def _load_cells(self, url, strs_to_load=None):
+	def _load_cells(self, url, strs_to_load=None, strs=None):
+		"""
+		`strs` are the strings of all columns, if they were already loaded.
+		"""
 		if strs_to_load is None:
 			strs_to_load = range(len(self._columns))
 		result = []
 		for i, column in enumerate(self._columns):
-			str_ = column.get_str(url) if i in strs_to_load else ''
+			if strs is not None:
+				str_ = strs[i]
+			elif i in strs_to_load:
+				str_ = column.get_str(url)
+			else:
+				str_ = ''
 			# Load the current sort value:
 			sort_val_asc = sort_val_desc = _NOT_LOADED
 			if i == self._sort_column:
@@ -144,12 +212,55 @@ class Model(SortFilterTableModel, DragAndDrop):
 					sort_val_desc = sort_value
 			result.append(Cell(str_, sort_val_asc, sort_val_desc))
 		return result
+	def _read_snapshot(self):
+		"""
+		Return a dict url -> File of the rows in the snapshot of the current
+		location. The Files are not loaded, so they are revalidated by
+		#_load_remaining_files().
+		"""
+		if self._snapshots is None:
+			return {}
+		rows = self._snapshots.get(self._location, self._get_column_names())
+		if rows is None:
+			return {}
+		result = {}
+		for file_name, is_dir, cells in rows:
+			url = join(self._location, file_name)
+			file_ = File(url, _get_empty_icon(), is_dir, cells, False)
+			sort_column, ascending = self._sort_column, self._sort_ascending
+			if not self._sort_value_is_loaded(file_, sort_column, ascending):
+				# The snapshot was taken while sorting by another column.
+				return {}
+			result[url] = file_
+		return result
+	def _save_snapshot_if_due(self):
+		# Pickling large directories takes a while. So when a directory changes
+		# often, don't save a snapshot after every change:
+		if self._snapshot_saved_at is None or \
+			time() - self._snapshot_saved_at >= _SNAPSHOT_INTERVAL:
+			self._save_snapshot()
+	def _save_snapshot(self):
+		if self._snapshots is None or not self._snapshot_is_dirty or \
+			not self._files:
+			return
+		self._snapshot_is_dirty = False
+		self._snapshot_saved_at = time()
+		rows = [
+			(basename(file_.url), file_.is_dir, file_.cells)
+			for file_ in self._files.values()
+		]
+		self._snapshots.put(self._location, self._get_column_names(), rows)
+	def _get_column_names(self):
+		return [column.get_qualified_name() for column in self._columns]
 	def _on_rows_inited(self, rows, preloaded_rows, callback):
-		if rows:
+		# Also when there are no rows, we need to remove those from the
+		# snapshot and end the transaction opened by #_begin_streaming():
+		if rows or self._is_streaming:
 			# Invoke the callback in the main thread. If it places the cursor,
 			# this avoids flickering effects. For further details, see the
 			# comment in #_on_rows_inited_main(...).
 			self._on_rows_inited_main(rows, preloaded_rows, callback)
+			self._queue_icons(preloaded_rows)
 		else:
 			callback()
 	@run_in_main_thread
@@ -173,42 +284,138 @@ class Model(SortFilterTableModel, DragAndDrop):
 		self.set_rows(preloaded_rows)
 		callback()
 		self._end_transaction()
+		self._end_streaming()
+	@run_in_main_thread
+	def _begin_streaming(self):
+		# Keep a transaction open while we display files before the directory
+		# has been fully listed. Like in #_on_rows_inited_main(...), this
+		# prevents the transaction_ended listener from placing the cursor
+		# before `callback` had a chance to do so.
+		self._begin_transaction()
+		self._is_streaming = True
+	@run_in_main_thread
+	def _end_streaming(self):
+		if self._is_streaming:
+			self._is_streaming = False
+			self._end_transaction()
 	def row_is_loaded(self, rownum):
 		return self._rows[rownum].is_loaded
 	def load_rows(self, rownums, callback=None):
 		assert is_in_main_thread()
-		urls = [self._rows[i].url for i in rownums]
-		self._load_files_async(urls, callback)
-	@transaction(priority=2)
-	def _load_files_async(self, urls, callback=None):
-		self._load_files(urls, callback)
+		with self._rows_to_load_lock:
+			for i in rownums:
+				self._rows_to_load[self._rows[i].url] = None
+			if callback is not None:
+				self._load_rows_callbacks.append(callback)
+		self._load_requested_rows()
+	@transaction(priority=2, key='load_rows')
+	def _load_requested_rows(self):
+		# Requests that arrived while this task was queued were merged into
+		# _rows_to_load. Load them all in one go:
+		with self._rows_to_load_lock:
+			urls = list(self._rows_to_load)
+			self._rows_to_load.clear()
+			callbacks = self._load_rows_callbacks
+			self._load_rows_callbacks = []
+		self._load_files(urls)
+		# The rows are on screen. So don't let their icons wait for the other
+		# rows:
+		with self._pending_urls_lock:
+			icon_urls = [url for url in urls if url in self._pending_icon_urls]
+			for url in icon_urls:
+				del self._pending_icon_urls[url]
+		self._load_icons(icon_urls)
+		if self._shutdown:
+			return
+		for callback in callbacks:
+			callback()
 	def _load_files(self, urls, callback=None):
 		files = []
 		disappeared = []
-		for url in urls:
+		for url, file_ in self._load_concurrently(urls):
 			if self._shutdown:
 				return
-			try:
-				files.append(self._load_file(url))
-			except FileNotFoundError:
+			if file_ is None:
 				disappeared.append(url)
+			else:
+				files.append(file_)
 		self._record_files(files, disappeared)
 		if callback is not None:
 			callback()
-	def _load_file(self, url):
+	def _load_concurrently(self, urls):
+		"""
+		Return (url, file_) for each of the given URLs, in order. file_ is None
+		if the URL does not exist (anymore). Queries the file system from at
+		most as many threads as it permits. The columns are then evaluated in
+		this thread, from the cached values: Unlike FileSystems, they are not
+		required to be thread-safe.
+		"""
+		# Query the stats of all files at once. This lets file systems that
+		# implement #stat_many(...) answer for a whole chunk in one go. The
+		# columns then get the values from the cache.
+		stats = self._query_stats(urls)
+		strs = self._load_strs([url for url in urls if url in stats])
+		result = []
+		for url in urls:
+			if self._shutdown:
+				break
+			try:
+				stat = stats[url]
+			except KeyError:
+				result.append((url, None))
+				continue
+			try:
+				result.append((url, self._load_file(url, stat, strs.get(url))))
+			except FileNotFoundError:
+				result.append((url, None))
+		return result
+	def _query_stats(self, urls):
+		num_chunks = min(self._max_concurrency, len(urls))
+		if num_chunks <= 1:
+			return self._fs.query_many(urls, _STAT_FIELDS)
+		chunk_size = ceil(len(urls) / num_chunks)
+		chunks = [
+			urls[i:i + chunk_size] for i in range(0, len(urls), chunk_size)
+		]
+		query = lambda chunk: self._fs.query_many(chunk, _STAT_FIELDS)
+		result = {}
+		for stats in _get_load_pool().map(query, chunks):
+			result.update(stats)
+		return result
+	def _load_strs(self, urls):
+		"""
+		Let each column render the strings of all the given files at once.
+		Returns a dict url -> strings of the columns.
+		"""
+		if not urls:
+			return {}
 		try:
-			is_dir = self._fs.is_dir(url)
+			strs_per_column = [column.get_strs(urls) for column in self._columns]
 		except FileNotFoundError:
-			raise
-		except OSError:
-			is_dir = False
-		icon = self._fs.icon(url) or _get_empty_icon()
-		cells = self._load_cells(url)
+			# Fall back to loading the strings file by file.
+			return {}
+		return dict(zip(urls, zip(*strs_per_column)))
+	def _load_file(self, url, stat=None, strs=None):
+		if stat is None:
+			try:
+				stat = self._fs.query_many([url], _STAT_FIELDS)[url]
+			except KeyError:
+				raise FileNotFoundError(url) from None
+		# is_dir is None if there was an OSError:
+		is_dir = bool(stat[0])
+		# The icon is loaded later, by #_load_icons(...). Until then, keep the
+		# previous one to avoid flickering:
+		try:
+			icon = self._files[url].icon
+		except KeyError:
+			icon = _get_empty_icon()
+		cells = self._load_cells(url, strs=strs)
 		return File(url, icon, is_dir, cells, True)
 	def _record_files(self, files, disappeared=None):
 		# Only burden the main thread if there are actual changes:
 		if files or disappeared:
 			self._record_files_main(files, disappeared)
+			self._queue_icons(files)
 	@run_in_main_thread
 	def _record_files_main(self, files, disappeared=None):
 		"""
@@ -217,6 +424,7 @@ class Model(SortFilterTableModel, DragAndDrop):
 		"""
 		if disappeared is None:
 			disappeared = []
+		self._snapshot_is_dirty = True
 		self._begin_transaction()
 		RecordFiles(
 			files, disappeared, self._files,
@@ -226,6 +434,8 @@ class Model(SortFilterTableModel, DragAndDrop):
 	@transaction(priority=3)
 	def sort(self, column, order=Qt.AscendingOrder):
 		ascending = order == Qt.AscendingOrder
+		if (column, ascending) == (self._sort_column, self._sort_ascending):
+			return
 		for i, row in enumerate(self._rows):
 			if not self._sort_value_is_loaded(row, column, ascending):
 				new_row = self._load_sort_value(row, column, ascending)
@@ -234,7 +444,13 @@ class Model(SortFilterTableModel, DragAndDrop):
 				# "visible" outside this class. So it's OK.
 				self._rows[i] = new_row
 				self._files[row.url] = new_row
-		run_in_main_thread(super().sort)(column, order)
+		# Snapshots are only used when sorted by the same column:
+		self._snapshot_is_dirty = True
+		# The rows are only changed by transactions, which don't overlap. So
+		# they stay the same while we sort them here. This leaves just the O(n)
+		# work of applying the new order to the main thread:
+		sort_result = self._compute_sort(column, ascending)
+		run_in_main_thread(self._apply_sort)(column, order, *sort_result)
 	def _sort_value_is_loaded(self, row, column, ascending):
 		try:
 			self.get_sort_value(row, column, ascending)
@@ -258,20 +474,50 @@ class Model(SortFilterTableModel, DragAndDrop):
 				col_val_asc = cell.sort_value_asc
 				col_val_desc = cell.sort_value_desc
 			cells.append(Cell(cell.str, col_val_asc, col_val_desc))
-		return File(row.url, row.icon, row.is_dir, cells, row.is_loaded)
+		return File(
+			row.url, row.icon, row.is_dir, cells, row.is_loaded
+		)
 	@transaction(priority=4)
 	def add_filter(self, filter_):
 		super().add_filter(filter_)
 	@transaction(priority=4)
 	def remove_filter(self, filter_):
 		super().remove_filter(filter_)
+		# Relaxing the filter may have displayed rows that aren't loaded yet:
+		self._load_pending_files()
 	@run_in_main_thread # Because #update() is called by eg. #add_filter(...)
 	def update(self):
 		super().update()
-	@transaction(priority=5)
+	@transaction(priority=4, key='update_widened')
+	def update_widened(self):
+		# Rows may have to be shown again. Do this in the worker like all other
+		# changes to the rows, so it can't interleave with eg. #sort(...):
+		self.update()
+	@transaction(priority=4, key='update_narrowed')
+	def update_narrowed(self):
+		# Test the filters against all rows here, in the worker. This leaves
+		# only the removal of the rejected rows to the main thread.
+		self._remove_rejected(self._find_rejected())
+	@run_in_main_thread
+	def _remove_rejected(self, keys):
+		super()._remove_rejected(keys)
+	@transaction(priority=5, key='reload')
 	def reload(self):
 		self._fs.clear_cache(self._location)
-		files = []
+		self._reload(reload_all=True)
+	@transaction(priority=5, key='reload_changed')
+	def reload_changed(self):
+		"""
+		Like #reload(), but only lists the directory again. Loads the files
+		that were added and drops those that were removed. The other files keep
+		their cached values. Used when the file system reports a change of the
+		directory. Changes of individual files are reported separately, see
+		#notify_file_changed(...).
+		"""
+		self._fs.clear_listing(self._location)
+		self._reload(reload_all=False)
+	def _reload(self, reload_all):
+		urls = []
 		try:
 			file_names = iter(self._fs.iterdir(self._location))
 		except FileNotFoundError:
@@ -286,24 +532,38 @@ class Model(SortFilterTableModel, DragAndDrop):
 			except (StopIteration, OSError):
 				break
 			else:
-				url = join(self._location, file_name)
-				try:
-					try:
-						file_before = self._files[url]
-					except KeyError:
-						file_ = self._init_file(url)
-					else:
-						if file_before.is_loaded:
-							file_ = self._load_file(url)
-						else:
-							file_ = self._init_file(url)
-				except FileNotFoundError:
-					continue
-				files.append(file_)
+				urls.append(join(self._location, file_name))
 		else:
 			assert self._shutdown
 			return
+		if not reload_all:
+			# Forget the values of the files that were removed:
+			for url in self._files.keys() - set(urls):
+				self._fs.clear_cache(url)
+		files = []
+		urls_to_reload = []
+		for url in urls:
+			try:
+				file_before = self._files[url]
+			except KeyError:
+				try:
+					files.append(self._init_file(url))
+				except FileNotFoundError:
+					pass
+				continue
+			if file_before.is_loaded and reload_all:
+				urls_to_reload.append(url)
+			else:
+				files.append(file_before)
+		reloaded_files = []
+		for url, file_ in self._load_concurrently(urls_to_reload):
+			if self._shutdown:
+				return
+			if file_ is not None:
+				reloaded_files.append(file_)
+		files.extend(reloaded_files)
 		self._on_files_reloaded(files)
+		self._queue_icons(reloaded_files)
 		# We may have found new files that now still need to be loaded:
 		self._load_remaining_files()
 	@run_in_main_thread
@@ -311,6 +571,7 @@ class Model(SortFilterTableModel, DragAndDrop):
 		self._files = {
 			row.url: row for row in rows
 		}
+		self._snapshot_is_dirty = True
 		self.update()
 	def get_columns(self):
 		return self._columns
@@ -348,6 +609,12 @@ class Model(SortFilterTableModel, DragAndDrop):
 		assert dirname(url) == self._location
 		self._fs.clear_cache(url)
 		self._load_files([url])
+	@transaction(priority=6)
+	def reload_columns(self, url):
+		# Unlike #notify_file_changed(...), keep the cached values. Only the
+		# values that aren't cached, such as folder sizes, are recomputed:
+		if url in self._files:
+			self._load_files([url])
 	@transaction(priority=6, synchronous=True)
 	def notify_file_renamed(self, old_url, new_url):
 		assert dirname(old_url) == dirname(new_url) == self._location
@@ -372,40 +639,215 @@ class Model(SortFilterTableModel, DragAndDrop):
 		assert dirname(url) == self._location
 		self._fs.clear_cache(url)
 		self._record_files([], [url])
-	@transaction(priority=7)
+	@transaction(priority=7, key='load_remaining_files')
 	def _load_remaining_files(self, batch_timeout=.2):
 		end_time = time() + batch_timeout
 		files = []
 		disappeared = []
 		all_loaded = False
-		for row in self._rows:
+		# Load a few files per thread between checking the timeout:
+		chunk_size = 4 * self._max_concurrency
+		while time() <= end_time:
+			urls = self._pop_pending_urls(chunk_size)
+			if not urls:
+				all_loaded = True
+				break
+			for url, file_ in self._load_concurrently(urls):
+				if self._shutdown:
+					return
+				if file_ is None:
+					disappeared.append(url)
+				else:
+					files.append(file_)
+		self._record_files(files, disappeared)
+		if all_loaded:
+			self._save_snapshot_if_due()
+		else:
+			self._load_remaining_files()
+	def _queue_icons(self, files):
+		urls = [file_.url for file_ in files if file_.is_loaded]
+		if urls:
+			with self._pending_urls_lock:
+				for url in urls:
+					self._pending_icon_urls[url] = None
+			self._load_remaining_icons()
+	@transaction(priority=8, key='load_remaining_icons')
+	def _load_remaining_icons(self, batch_timeout=.2):
+		"""
+		Icons are loaded after the text of the rows because they are less
+		important to the user and can be slow to obtain.
+		"""
+		end_time = time() + batch_timeout
+		chunk_size = 4 * self._max_concurrency
+		while time() <= end_time:
+			urls = self._pop_urls(self._pending_icon_urls, chunk_size)
+			if not urls:
+				return
+			self._load_icons(urls)
 			if self._shutdown:
 				return
-			if time() > end_time:
-				break
-			if row.is_loaded:
+		self._load_remaining_icons()
+	def _load_icons(self, urls):
+		files = []
+		for url in urls:
+			if self._shutdown:
+				return
+			try:
+				file_ = self._files[url]
+			except KeyError:
 				continue
 			try:
-				files.append(self._load_file(row.url))
-			except FileNotFoundError:
-				disappeared.append(row.url)
-		else:
-			all_loaded = True
-		self._record_files(files, disappeared)
-		if not all_loaded:
+				icon = self._fs.icon(url)
+			except OSError:
+				# The file disappeared. The FileWatcher will tell us.
+				continue
+			files.append(File(
+				url, icon or _get_empty_icon(), file_.is_dir, file_.cells,
+				file_.is_loaded
+			))
+		if files:
+			self._record_icons(files)
+	@run_in_main_thread
+	def _record_icons(self, files):
+		self._begin_transaction()
+		for file_ in files:
+			self._files[file_.url] = file_
+			try:
+				rownum = self._rows.find(file_.url)
+			except KeyError:
+				# The file is filtered.
+				continue
+			self.update_rows([file_], rownum)
+		self._end_transaction()
+	def _load_pending_files(self):
+		if self.get_num_rows_pending():
 			self._load_remaining_files()
+	def get_num_rows_pending(self):
+		"""
+		The number of displayed rows that are not yet loaded.
+		"""
+		return len(self._pending_urls)
+	def set_viewport(self, start, stop):
+		"""
+		Tell the model which rows are on screen. It then loads the pending rows
+		on and near the screen before the others.
+		"""
+		self._viewport = start, stop
+	def _pop_pending_urls(self, num):
+		return self._pop_urls(self._pending_urls, num)
+	def _pop_urls(self, pending, num):
+		"""
+		Remove up to `num` URLs from the given OrderedDict and return them.
+		Prefers the URLs of the rows near the viewport.
+		"""
+		with self._pending_urls_lock:
+			result = self._pop_urls_near_viewport(pending, num)
+			num = min(num - len(result), len(pending))
+			pop_first = lambda: pending.popitem(last=False)[0]
+			result.extend(pop_first() for _ in range(num))
+			return result
+	def _pop_urls_near_viewport(self, pending, num):
+		result = []
+		if self._viewport is None or not pending:
+			return result
+		start, stop = self._viewport
+		# Only look at a few screens' worth of rows. Beyond that, the order in
+		# which the rows are loaded doesn't matter as much:
+		margin = _VIEWPORT_MARGIN * max(stop - start, 1)
+		min_row = max(start - margin, 0)
+		max_row = min(stop + margin, len(self._rows))
+		for rownum in _by_distance(start, stop, min_row, max_row):
+			try:
+				url = self._rows[rownum].url
+			except IndexError:
+				# The rows changed in the main thread. Let the caller fall back
+				# to the default order:
+				break
+			if url in pending:
+				del pending[url]
+				result.append(url)
+				if len(result) == num:
+					break
+		return result
+	def insert_rows(self, rows, first_rownum=-1):
+		super().insert_rows(rows, first_rownum)
+		self._update_pending_urls([], rows)
+	def update_rows(self, rows, first_rownum):
+		end = min(first_rownum + len(rows), len(self._rows))
+		old_urls = [self._rows[i].url for i in range(first_rownum, end)]
+		super().update_rows(rows, first_rownum)
+		self._update_pending_urls(old_urls, rows)
+	def remove_rows(self, start, end=-1):
+		if end == -1:
+			end = start + 1
+		urls = [self._rows[i].url for i in range(start, end)]
+		super().remove_rows(start, end)
+		self._update_pending_urls(urls, [])
+	def _update_pending_urls(self, removed_urls, added_rows):
+		with self._pending_urls_lock:
+			for url in removed_urls:
+				self._pending_urls.pop(url, None)
+			for row in added_rows:
+				if not row.is_loaded:
+					self._pending_urls[row.url] = None
 	def shutdown(self):
 		self._shutdown = True
 		# Similarly to why we don't want to call FileWatcher#start() from the
 		# main thread, we also don't want to call #shutdown() from it to avoid
-		# potential deadlocks. So do it asynchronously:
-		self._shutdown_async()
-	@transaction(priority=1)
+		# potential deadlocks. So do it asynchronously. Tasks that are still
+		# queued are no longer needed for the location we are leaving:
+		self._worker.cancel_pending()
+		self._worker.submit(1, self._shutdown_async)
 	def _shutdown_async(self):
+		self._save_snapshot()
 		self._file_watcher.shutdown()
 		self._worker.shutdown()
 
-_NOT_LOADED = object()
+class _NotLoaded:
+	def __reduce__(self):
+		# Keep the identity of _NOT_LOADED when pickled by SnapshotStore:
+		return '_NOT_LOADED'
+
+_NOT_LOADED = _NotLoaded()
+
+_STAT_FIELDS = ('is_dir', 'size_bytes', 'modified_datetime')
+
+# In seconds:
+_SNAPSHOT_INTERVAL = 60
+
+_MAX_LOAD_THREADS = 16
+
+_VIEWPORT_MARGIN = 2
+
+def _by_distance(start, stop, min_row, max_row):
+	"""
+	Yield the row numbers in [min_row, max_row). First those in [start, stop),
+	then the others in the order of their distance from that range.
+	"""
+	yield from range(max(start, min_row), min(stop, max_row))
+	for distance in range(max(stop - min_row, max_row - start)):
+		below = stop + distance
+		if min_row <= below < max_row:
+			yield below
+		above = start - 1 - distance
+		if min_row <= above < max_row:
+			yield above
+
+_LOAD_POOL = None
+_LOAD_POOL_LOCK = Lock()
+
+def _get_load_pool():
+	"""
+	The pool is shared by all models. This bounds the total number of threads,
+	no matter how many panes / locations are loading at the same time.
+	"""
+	global _LOAD_POOL
+	with _LOAD_POOL_LOCK:
+		if _LOAD_POOL is None:
+			_LOAD_POOL = ThreadPoolExecutor(
+				_MAX_LOAD_THREADS, thread_name_prefix='LoadFiles'
+			)
+		return _LOAD_POOL
 
 class File(Row):
 	def __init__(self, url, icon, is_dir, cells, is_loaded):
@@ -0,0 +1,66 @@
+from bisect import bisect_left, insort
+from itertools import islice
+
+class PrefixIndex:
+	"""
+	Keeps the (lower-cased) strings of rows in sorted order. This lets us find
+	the rows whose string starts with a given prefix in O(log n + k), where k
+	is the number of matches.
+	"""
+	def __init__(self):
+		self._entries = []
+	def __len__(self):
+		return len(self._entries)
+	def add(self, items):
+		"""
+		`items` is an iterable of (str, key) pairs.
+		"""
+		items = [(str_.lower(), key) for str_, key in items]
+		if len(items) > _MAX_INDIVIDUAL_UPDATES:
+			# Timsort is fast when most of the list is sorted already:
+			self._entries.extend(items)
+			self._entries.sort()
+		else:
+			for item in items:
+				insort(self._entries, item)
+	def remove(self, items):
+		"""
+		`items` is an iterable of (str, key) pairs that were previously added.
+		"""
+		items = [(str_.lower(), key) for str_, key in items]
+		if len(items) > _MAX_INDIVIDUAL_UPDATES:
+			items = set(items)
+			self._entries = [e for e in self._entries if e not in items]
+		else:
+			for item in items:
+				i = bisect_left(self._entries, item)
+				if i < len(self._entries) and self._entries[i] == item:
+					del self._entries[i]
+	def clear(self):
+		self._entries = []
+	def count(self, prefix):
+		"""
+		Return the number of rows whose string starts with `prefix`, ignoring
+		case, in O(log n).
+		"""
+		prefix = prefix.lower()
+		start = bisect_left(self._entries, (prefix,))
+		# Strings that start with the prefix sort before prefix + _MAX_CHAR:
+		end = bisect_left(self._entries, (prefix + _MAX_CHAR,), start)
+		return end - start
+	def find(self, prefix):
+		"""
+		Return the keys of all rows whose string starts with `prefix`, ignoring
+		case.
+		"""
+		prefix = prefix.lower()
+		result = []
+		start = bisect_left(self._entries, (prefix,))
+		for str_, key in islice(self._entries, start, None):
+			if not str_.startswith(prefix):
+				break
+			result.append(key)
+		return result
+
+_MAX_INDIVIDUAL_UPDATES = 64
+_MAX_CHAR = chr(0x10ffff)
@@ -1,6 +1,7 @@
-from bisect import bisect_left
+from bisect import bisect_left, bisect_right
 from fman.impl.model.diff import DiffEntry
 from fman.impl.model.diff import join as join_diff
+from random import random
 
 class RecordFiles:
 	"""
@@ -161,21 +162,23 @@ class Lvl1SortValues:
 	def __init__(self, m_rows, m_sortval, lvl2_rownums):
 		self._m_rows = m_rows
 		self._m_sortval = m_sortval
-		self._lvl2_rownums = set(lvl2_rownums)
+		lvl2_rownums = sorted(set(lvl2_rownums))
+		self._num_lvl2_rownums = len(lvl2_rownums)
+		# The i-th level 1 row has original index i + the number of level 2
+		# rows before it. The latter is the number of j with
+		# lvl2_rownums[j] - j <= i. This lets us find it via bisection:
+		self._lvl2_offsets = [
+			rownum - j for j, rownum in enumerate(lvl2_rownums)
+		]
 	def get_lvl1_rownum_for(self, sortval):
 		return bisect_left(self, sortval)
 	def __len__(self):
-		return len(self._m_rows) - len(self._lvl2_rownums)
+		return len(self._m_rows) - self._num_lvl2_rownums
 	def __getitem__(self, item):
 		i = self._get_original_index(item)
 		return self._m_sortval(self._m_rows[i])
 	def _get_original_index(self, i):
-		result = -1
-		for _ in range(i + 1):
-			result += 1
-			while result in self._lvl2_rownums:
-				result += 1
-		return result
+		return i + bisect_right(self._lvl2_offsets, i)
 
 def get_moves_for_transforming(curr, goal):
 	"""
@@ -214,10 +217,8 @@ def get_moves_for_transforming(curr, goal):
 
 class GetMovesForTransforming:
 	def __init__(self, curr, goal):
-		self._curr = sorted(curr)
+		self._curr = _SparseList(sorted(curr))
 		self._goal = sorted(goal)
-		self._curr_indices = [index for index, _ in self._curr]
-		self._curr_map = {key: index for index, key in self._curr}
 		self._goal_map = {key: index for index, key in self._goal}
 		self._result = []
 	def __call__(self):
@@ -226,7 +227,7 @@ class GetMovesForTransforming:
 			if g_i >= 0:
 				g_index, g_key = self._goal[g_i]
 				if c_i < 0 or g_index >= self._curr[c_i][0]:
-					src = self._curr_map[g_key]
+					src = self._curr.index_of(g_key)
 					self._move(src, g_index)
 					g_i -= 1
 					continue
@@ -240,25 +241,154 @@ class GetMovesForTransforming:
 		if src == dst:
 			return
 		self._result.append((src, dst))
-		curr_index, key = self._pop(src)
-		self._insert(dst, key)
-	def _pop(self, src):
-		s = bisect_left(self._curr_indices, src)
-		result = self._curr.pop(s)
-		self._curr_indices.pop(s)
-		self._curr_map.pop(result[1])
-		for i, (index, key) in enumerate(self._curr[s:], s):
-			self._curr[i] = (index - 1, key)
-			self._curr_indices[i] = index - 1
-			self._curr_map[key] = index - 1
+		key = self._curr.pop(src)
+		self._curr.insert(dst, key)
+
+class _SparseList:
+	"""
+	A list of (index, key) pairs sorted by index. Popping / inserting an entry
+	shifts the indices of all later entries by -1 / +1. Think of the entries as
+	the non-empty rows of a table: Each one stores the number of empty rows
+	("gap") before it. This lets us store them in a treap, which makes all
+	operations O(log n) instead of having to re-index every later entry.
+	"""
+	def __init__(self, entries):
+		self._root = None
+		self._nodes = {}
+		prev_index = -1
+		for index, key in entries:
+			node = self._nodes[key] = _TreapNode(key, index - prev_index - 1)
+			self._root = _merge(self._root, node)
+			prev_index = index
+	def __len__(self):
+		return _size(self._root)
+	def __getitem__(self, rank):
+		node = self._root
+		weight = 0
+		while True:
+			left_size = _size(node.left)
+			if rank < left_size:
+				node = node.left
+			elif rank == left_size:
+				return weight + _weight(node.left) + node.gap, node.key
+			else:
+				rank -= left_size + 1
+				weight += _weight(node.left) + 1 + node.gap
+				node = node.right
+	def index_of(self, key):
+		node = self._nodes[key]
+		result = _weight(node.left) + node.gap
+		while node.parent is not None:
+			parent = node.parent
+			if node is parent.right:
+				result += _weight(parent.left) + 1 + parent.gap
+			node = parent
 		return result
-	def _insert(self, dst, key):
-		insert_point = bisect_left(self._curr_indices, dst)
-		self._curr.insert(insert_point, (dst, key))
-		self._curr_indices.insert(insert_point, dst)
-		self._curr_map[key] = dst
-		i_start = insert_point + 1
-		for i, (index, k) in enumerate(self._curr[i_start:], i_start):
-			self._curr[i] = (index + 1, k)
-			self._curr_indices[i] = index + 1
-			self._curr_map[k] = index + 1
\ No newline at end of file
+	def pop(self, index):
+		rank, node, node_index = self._find(index)
+		assert node_index == index
+		if rank + 1 < len(self):
+			# The empty rows before `node` now precede the next entry:
+			self._add_to_gap(self._find(index + 1)[1], node.gap)
+		before, rest = _split(self._root, rank)
+		_, after = _split(rest, 1)
+		self._set_root(_merge(before, after))
+		del self._nodes[node.key]
+		return node.key
+	def insert(self, index, key):
+		rank, next_node, next_index = self._find(index)
+		if next_node is None:
+			gap = index - _weight(self._root)
+		else:
+			# Split the empty rows before `next_node`:
+			gap = index - (next_index - next_node.gap)
+			self._add_to_gap(next_node, next_index - index - next_node.gap)
+		node = self._nodes[key] = _TreapNode(key, gap)
+		before, after = _split(self._root, rank)
+		self._set_root(_merge(_merge(before, node), after))
+	def _find(self, index):
+		"""
+		Return (rank, node, index) of the first entry whose index is >= the
+		given one. If there is no such entry, return (len(self), None, None).
+		"""
+		result = len(self), None, None
+		node = self._root
+		rank = weight = 0
+		while node is not None:
+			node_index = weight + _weight(node.left) + node.gap
+			if node_index >= index:
+				result = rank + _size(node.left), node, node_index
+				node = node.left
+			else:
+				rank += _size(node.left) + 1
+				weight += _weight(node.left) + 1 + node.gap
+				node = node.right
+		return result
+	def _add_to_gap(self, node, delta):
+		node.gap += delta
+		while node is not None:
+			node.weight += delta
+			node = node.parent
+	def _set_root(self, root):
+		self._root = root
+		if root is not None:
+			root.parent = None
+
+class _TreapNode:
+
+	__slots__ = (
+		'key', 'gap', 'priority', 'left', 'right', 'parent', 'size', 'weight'
+	)
+
+	def __init__(self, key, gap):
+		self.key = key
+		self.gap = gap
+		self.priority = random()
+		self.left = self.right = self.parent = None
+		self.size = 1
+		self.weight = 1 + gap
+	def set_children(self, left, right):
+		self.left = left
+		self.right = right
+		self.size = 1 + _size(left) + _size(right)
+		self.weight = 1 + self.gap + _weight(left) + _weight(right)
+		if left is not None:
+			left.parent = self
+		if right is not None:
+			right.parent = self
+
+def _size(node):
+	return 0 if node is None else node.size
+
+def _weight(node):
+	return 0 if node is None else node.weight
+
+def _merge(left, right):
+	if left is None:
+		return right
+	if right is None:
+		return left
+	if left.priority > right.priority:
+		left.set_children(left.left, _merge(left.right, right))
+		return left
+	right.set_children(_merge(left, right.left), right.right)
+	return right
+
+def _split(node, rank):
+	"""
+	Split the treap `node` into one with the first `rank` nodes and the rest.
+	"""
+	if node is None:
+		return None, None
+	left_size = _size(node.left)
+	if rank <= left_size:
+		left, right = _split(node.left, rank)
+		node.set_children(right, node.right)
+		if left is not None:
+			left.parent = None
+		return left, node
+	left, right = _split(node.right, rank - left_size - 1)
+	node.set_children(node.left, left)
+	if right is not None:
+		right.parent = None
+	return node, right
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from fman.impl.util import read_pickle, write_pickle
+from threading import Lock
+
+import pickle
+
+class SnapshotStore:
+	"""
+	Remembers the rows of recently visited locations. When a location is opened
+	again - in particular after a restart of fman - its rows can then be shown
+	immediately, while the location is listed again in the background.
+
+	Snapshots are kept pickled in memory and written to a single file by
+	#flush(). When their total size exceeds `max_bytes`, the least recently
+	used ones are evicted.
+	"""
+	def __init__(self, path, max_bytes=16 * 1024 * 1024):
+		self._path = path
+		self._max_bytes = max_bytes
+		# Maps URLs to pickled snapshots. Read from disk when first needed:
+		self._snapshots = None
+		self._num_bytes = 0
+		self._is_dirty = False
+		self._lock = Lock()
+	def get(self, url, columns):
+		"""
+		Return the rows last #put(...) for the given URL, or None. `columns`
+		must be equal to the value given to #put(...). This ensures that the
+		cells of the rows are still meaningful.
+		"""
+		with self._lock:
+			snapshots = self._get_snapshots()
+			try:
+				data = snapshots[url]
+			except KeyError:
+				return None
+			snapshots.move_to_end(url)
+		try:
+			columns_before, rows = pickle.loads(data)
+		except Exception:
+			# For instance because a plugin that defines a sort value's class
+			# is no longer installed.
+			return None
+		return rows if columns_before == columns else None
+	def put(self, url, columns, rows):
+		try:
+			data = pickle.dumps((columns, rows), pickle.HIGHEST_PROTOCOL)
+		except (pickle.PicklingError, AttributeError, TypeError):
+			# A plugin's column may return sort values that can't be pickled.
+			return
+		with self._lock:
+			snapshots = self._get_snapshots()
+			self._num_bytes -= len(snapshots.pop(url, b''))
+			self._is_dirty = True
+			if len(data) > self._max_bytes:
+				return
+			snapshots[url] = data
+			self._num_bytes += len(data)
+			while self._num_bytes > self._max_bytes:
+				_, evicted = snapshots.popitem(last=False)
+				self._num_bytes -= len(evicted)
+	def flush(self):
+		with self._lock:
+			if not self._is_dirty:
+				return
+			items = list(self._snapshots.items())
+			self._is_dirty = False
+		write_pickle(self._path, items, _FORMAT_VERSION)
+	def _get_snapshots(self):
+		if self._snapshots is None:
+			self._snapshots = OrderedDict(
+				read_pickle(self._path, _FORMAT_VERSION, [])
+			)
+			self._num_bytes = sum(map(len, self._snapshots.values()))
+		return self._snapshots
+
+_FORMAT_VERSION = 1
@@ -27,9 +27,47 @@ class SortFilterTableModel(TableModel):
 		Call this after any change in the output of #get_rows().
 		"""
 		self.set_rows(self._sorted(self._filter(self.get_rows())))
+	def update_narrowed(self):
+		"""
+		Like #update(), but faster. Only valid if #get_rows() did not change
+		and the filters now accept a subset of the rows they accepted before.
+		Then it suffices to remove the displayed rows that are now rejected.
+		"""
+		self._remove_rejected(self._find_rejected())
+	def _find_rejected(self):
+		return [row.key for row in self._rows if not self._accepts(row)]
+	def _remove_rejected(self, keys):
+		# The rows may have changed since #_find_rejected(). So check again:
+		rownums = []
+		for key in keys:
+			try:
+				rownum = self._rows.find(key)
+			except KeyError:
+				continue
+			if not self._accepts(self._rows[rownum]):
+				rownums.append(rownum)
+		if not rownums:
+			return
+		self._begin_transaction()
+		# Remove contiguous ranges of rows, from the bottom up so the row
+		# numbers of the ranges above stay valid:
+		rownums.sort(reverse=True)
+		end = start = rownums[0] + 1
+		for rownum in rownums:
+			if rownum == start - 1:
+				start = rownum
+			else:
+				self.remove_rows(start, end)
+				end, start = rownum + 1, rownum
+		self.remove_rows(start, end)
+		self._transaction_made_changes = True
+		self._end_transaction()
 	def _sorted(self, rows):
+		return self._sorted_by(rows, self._sort_column, self._sort_ascending)
+	def _sorted_by(self, rows, column, ascending):
 		return sorted(
-			rows, key=self._get_sortval, reverse=not self._sort_ascending
+			rows, key=lambda row: self.get_sort_value(row, column, ascending),
+			reverse=not ascending
 		)
 	def _get_sortval(self, row):
 		return self.get_sort_value(row, self._sort_column, self._sort_ascending)
@@ -41,24 +79,36 @@ class SortFilterTableModel(TableModel):
 		ascending = order == Qt.AscendingOrder
 		if (column, ascending) == (self._sort_column, self._sort_ascending):
 			return
+		self._apply_sort(column, order, *self._compute_sort(column, ascending))
+	def _compute_sort(self, column, ascending):
+		"""
+		Return the rows sorted by the given column, and a dict that maps each
+		row's key to its new row number. Does not modify this model. So it can
+		be called from another thread, as long as the rows don't change.
+		"""
+		new_rows = self._sorted_by(self._rows, column, ascending)
+		new_rownums = {row.key: i for i, row in enumerate(new_rows)}
+		return new_rows, new_rownums
+	def _apply_sort(self, column, order, new_rows, new_rownums):
+		"""
+		Replace the rows by the result of #_compute_sort(...). Takes O(n).
+		"""
 		self.layoutAboutToBeChanged.emit([], self.VerticalSortHint)
 		self._sort_column = column
-		self._sort_ascending = ascending
-		new_rows = self._sorted(self._rows)
+		self._sort_ascending = order == Qt.AscendingOrder
 		for index in self.persistentIndexList():
-			old_row = self._rows[index.row()]
-			for i, row in enumerate(new_rows):
-				if row.key == old_row.key:
-					self.changePersistentIndex(
-						index, self.index(i, index.column())
-					)
-					break
+			key = self._rows[index.row()].key
+			self.changePersistentIndex(
+				index, self.index(new_rownums[key], index.column())
+			)
 		self._rows.reset_to(new_rows)
 		self.layoutChanged.emit([], self.VerticalSortHint)
 		self.sort_order_changed.emit(column, order)
 	def add_filter(self, filter_):
 		self._filters.append(filter_)
-		self.update()
+		# An additional filter can only reject more rows. Don't call
+		# #update_narrowed() for this: Subclasses may run it asynchronously.
+		self._remove_rejected(self._find_rejected())
 	def remove_filter(self, filter_):
 		self._filters.remove(filter_)
 		self.update()
\ No newline at end of file
@@ -1,9 +1,13 @@
 from collections import namedtuple
 from fman.impl.model.diff import ComputeDiff
+from fman.impl.model.fenwick import FenwickTree
+from fman.impl.model.prefix_index import PrefixIndex
 from fman.impl.util import Event
 from fman.impl.util.qt import DisplayRole, EditRole, DecorationRole, \
 	ToolTipRole, ItemIsDropEnabled, ItemIsSelectable, ItemIsEnabled, \
 	ItemIsEditable, ItemIsDragEnabled
+from heapq import heapify, heappop
+from itertools import chain, islice
 from PyQt5.QtCore import QModelIndex, QVariant, Qt
 from threading import RLock
 
@@ -18,6 +22,8 @@ class TableModel:
 		self.transaction_ended = Event()
 		self._column_headers = column_headers
 		self._rows = Rows()
+		# Lets type-ahead find rows by the prefix of their first column:
+		self._prefix_index = PrefixIndex()
 		self._transaction_level = 0
 		self._transaction_made_changes = False
 	def rowCount(self, parent=QModelIndex()):
@@ -84,6 +90,7 @@ class TableModel:
 			QModelIndex(), first_rownum, first_rownum + len(rows) - 1
 		)
 		self._rows.insert(rows, first_rownum)
+		self._prefix_index.add(map(_get_prefix_item, rows))
 		self.endInsertRows()
 	def move_rows(self, cut_start, cut_end, insert_start):
 		dst_row = _get_move_destination(cut_start, cut_end, insert_start)
@@ -93,7 +100,20 @@ class TableModel:
 		self._rows.move(cut_start, cut_end, insert_start)
 		self.endMoveRows()
 	def update_rows(self, rows, first_rownum):
+		end = min(first_rownum + len(rows), len(self._rows))
+		old_items = [
+			_get_prefix_item(self._rows[i]) for i in range(first_rownum, end)
+		]
 		self._rows.update(rows, first_rownum)
+		# Typically, only the other columns change. Don't touch the index then:
+		new_items = list(map(_get_prefix_item, rows))
+		self._prefix_index.remove(
+			old for old, new in zip(old_items, new_items) if old != new
+		)
+		self._prefix_index.add(
+			new for i, new in enumerate(new_items)
+			if i >= len(old_items) or old_items[i] != new
+		)
 		top_left = self.index(first_rownum, 0)
 		bottom_right = \
 			self.index(first_rownum + len(rows) - 1, self.columnCount() - 1)
@@ -102,8 +122,32 @@ class TableModel:
 		if end == -1:
 			end = start + 1
 		self.beginRemoveRows(QModelIndex(), start, end - 1)
+		old_rows = [self._rows[i] for i in range(start, end)]
 		self._rows.remove(start, end)
+		self._prefix_index.remove(map(_get_prefix_item, old_rows))
 		self.endRemoveRows()
+	def find_prefix(self, prefix, accept=None):
+		"""
+		Return the number of the first row whose first column starts with the
+		given prefix, ignoring case, and for which `accept(rownum)` is true.
+		Return -1 if there is no such row.
+		"""
+		num_matches = self._prefix_index.count(prefix)
+		if not num_matches:
+			return -1
+		# When many rows match, for instance for a prefix of one letter, the
+		# first match is likely near the top. Look for it there first. This
+		# avoids ordering all matches:
+		num_rows = len(self._rows)
+		max_scan = min(num_rows, num_rows // num_matches * _SCAN_FACTOR)
+		if max_scan < num_matches:
+			prefix_lower = prefix.lower()
+			for rownum, row in enumerate(islice(self._rows, max_scan)):
+				if row.cells[0].str.lower().startswith(prefix_lower) and \
+					(accept is None or accept(rownum)):
+					return rownum
+		keys = self._prefix_index.find(prefix)
+		return self._rows.find_first(keys, accept)
 	def _index_is_valid(self, index):
 		if not index.isValid() or index.model() != self:
 			return False
@@ -117,6 +161,13 @@ class TableModel:
 			self._transaction_made_changes = False
 			self.transaction_ended.trigger()
 
+# How many rows per expected match #find_prefix(...) scans before it orders
+# all matches instead:
+_SCAN_FACTOR = 8
+
+def _get_prefix_item(row):
+	return row.cells[0].str, row.key
+
 def _get_move_destination(cut_start, cut_end, insert_start):
 	if cut_start == insert_start:
 		raise ValueError('Not a move operation (%d, %d)' % (cut_start, cut_end))
@@ -124,41 +175,61 @@ def _get_move_destination(cut_start, cut_end, insert_start):
 	return insert_start + (num_rows if cut_start < insert_start else 0)
 
 class Rows:
+	"""
+	Stores the rows in blocks of at most _MAX_BLOCK_SIZE rows. A Fenwick tree
+	over the block sizes maps row numbers to blocks and back in O(log n). This
+	keeps inserting, removing and finding rows cheap even when there are
+	hundreds of thousands of them.
+
+	Blocks are never modified in place. Instead, changes replace a block's list
+	of rows. This lets #__iter__() return a consistent snapshot.
+	"""
 	def __init__(self):
-		self._rows = []
-		self._keys = {}
 		self._lock = RLock()
+		self._reset([])
 	def __len__(self):
-		return len(self._rows)
-	def __getitem__(self, item):
-		return self._rows[item]
+		return self._len
+	def __getitem__(self, i):
+		with self._lock:
+			if i < 0:
+				i += self._len
+			if not 0 <= i < self._len:
+				raise IndexError('Row index out of range: %d' % i)
+			block, offset = self._locate(i)
+			return block.rows[offset]
 	def __setitem__(self, i, row):
 		with self._lock:
-			old_row = self._rows[i]
-			del self._keys[old_row.key]
-			self._rows[i] = row
-			self._keys[row.key] = i
+			block, offset = self._locate(i)
+			rows = list(block.rows)
+			rows[offset] = row
+			self._set_block_rows(block, rows)
 			self._check_integrity()
 	def __iter__(self):
-		return iter(self._rows)
+		with self._lock:
+			blocks = [block.rows for block in self._blocks]
+		return chain.from_iterable(blocks)
 	def reset_to(self, new_rows):
-		new_keys = {row.key: i for i, row in enumerate(new_rows)}
 		with self._lock:
-			self._rows = new_rows
-			self._keys = new_keys
+			self._reset(new_rows)
 			self._check_integrity()
 	def insert(self, rows, first_rownum):
-		new_keys = {row.key: first_rownum + i for i, row in enumerate(rows)}
 		with self._lock:
 			# Perform this check here, once we have the lock:
-			if first_rownum < 0 or first_rownum > len(self._rows) + 1:
+			if first_rownum < 0 or first_rownum > self._len + 1:
 				raise ValueError('Invalid first_rownum: %d' % first_rownum)
-			num_rows = len(rows)
-			for row in self._rows[first_rownum:]:
-				self._keys[row.key] += num_rows
-			self._rows = \
-				self._rows[:first_rownum] + rows + self._rows[first_rownum:]
-			self._keys.update(new_keys)
+			if not rows:
+				return
+			if not self._blocks:
+				self._reset(rows)
+			else:
+				if first_rownum >= self._len:
+					block = self._blocks[-1]
+					offset = len(block.rows)
+				else:
+					block, offset = self._locate(first_rownum)
+				self._set_block_rows(
+					block, block.rows[:offset] + list(rows) + block.rows[offset:]
+				)
 			self._check_integrity()
 	def move(self, cut_start, cut_end, insert_start):
 		with self._lock:
@@ -166,43 +237,173 @@ class Rows:
 			self.insert(rows, insert_start)
 			self._check_integrity()
 	def update(self, rows, first_rownum):
-		keys = {row.key: first_rownum + i for i, row in enumerate(rows)}
 		with self._lock:
-			for row in self._rows[first_rownum: first_rownum + len(rows)]:
-				del self._keys[row.key]
-			self._rows[first_rownum: first_rownum + len(rows)] = rows
-			self._keys.update(keys)
+			i = first_rownum
+			while i < min(first_rownum + len(rows), self._len):
+				block, offset = self._locate(i)
+				new_rows = list(block.rows)
+				num = min(len(new_rows) - offset, first_rownum + len(rows) - i)
+				new_rows[offset:offset + num] = \
+					rows[i - first_rownum:i - first_rownum + num]
+				self._set_block_rows(block, new_rows)
+				i += num
+			if i < first_rownum + len(rows):
+				# Like list slice assignment, append rows beyond the end:
+				self.insert(rows[i - first_rownum:], self._len)
 			self._check_integrity()
 	def remove(self, start, end):
-		num = end - start
 		with self._lock:
-			for row in self._rows[end:]:
-				self._keys[row.key] -= num
-			for row in self._rows[start:end]:
-				del self._keys[row.key]
-			del self._rows[start:end]
+			self._cut(start, end)
 			self._check_integrity()
 	def find(self, key):
-		return self._keys[key]
+		with self._lock:
+			block = self._blocks_by_key[key]
+			return self._block_sizes.prefix_sum(block.index) + \
+				   block.offsets[key]
+	def find_first(self, keys, accept=None):
+		"""
+		Return the smallest number of the rows with the given keys for which
+		`accept(rownum)` is true, or -1. Ordering the rows only takes a dict
+		lookup per key. Row numbers are computed in O(log n), but only for the
+		rows that are passed to `accept`.
+		"""
+		with self._lock:
+			positions = []
+			for key in keys:
+				block = self._blocks_by_key[key]
+				positions.append((block.index, block.offsets[key]))
+			heapify(positions)
+			while positions:
+				block_index, offset = heappop(positions)
+				rownum = self._block_sizes.prefix_sum(block_index) + offset
+				if accept is None or accept(rownum):
+					return rownum
+			return -1
 	def _cut(self, cut_start, cut_end):
 		with self._lock:
-			num_rows = len(self._rows)
-			if cut_start < 0 or cut_start >= num_rows:
+			if cut_start < 0 or cut_start >= self._len:
 				raise ValueError('Invalid cut_start: %d' % cut_start)
-			if cut_end < 0 or cut_end > num_rows or cut_end <= cut_start:
+			if cut_end < 0 or cut_end > self._len or cut_end <= cut_start:
 				raise ValueError('Invalid cut_end: %d' % cut_end)
-			delta = cut_end - cut_start
-			result = self._rows[cut_start:cut_end]
-			for row in result:
-				del self._keys[row.key]
-			for row in self._rows[cut_end:]:
-				self._keys[row.key] -= delta
-			self._rows = self._rows[:cut_start] + self._rows[cut_end:]
+			num_rows = cut_end - cut_start
+			block, offset = self._locate(cut_start)
+			if offset + num_rows <= len(block.rows):
+				# The common case: Only one block is affected.
+				result = block.rows[offset:offset + num_rows]
+				remaining = block.rows[:offset] + block.rows[offset + num_rows:]
+				if len(remaining) >= _MIN_BLOCK_SIZE or len(self._blocks) == 1:
+					self._set_block_rows(block, remaining)
+					return result
+			# Replace all affected blocks by new ones in one go. This rebuilds
+			# the block structure only once, and so keeps cutting large ranges
+			# linear:
+			start = end = block.index
+			result = []
+			remaining = block.rows[:offset]
+			num_remaining = num_rows
+			while num_remaining:
+				block = self._blocks[end]
+				end += 1
+				num = min(len(block.rows) - offset, num_remaining)
+				result.extend(block.rows[offset:offset + num])
+				num_remaining -= num
+				if not num_remaining:
+					remaining += block.rows[offset + num:]
+				offset = 0
+			# Merge the remaining rows with undersized neighbours. Otherwise,
+			# blocks would only ever get smaller, and reads would have to walk
+			# many tiny blocks:
+			if len(remaining) < _MIN_BLOCK_SIZE and start > 0:
+				start -= 1
+				remaining = self._blocks[start].rows + remaining
+			if len(remaining) < _MIN_BLOCK_SIZE and end < len(self._blocks):
+				remaining += self._blocks[end].rows
+				end += 1
+			for block in self._blocks[start:end]:
+				for row in block.rows:
+					del self._blocks_by_key[row.key]
+			new_blocks = _split_into_blocks(remaining)
+			for new_block in new_blocks:
+				self._index_rows(new_block)
+			self._blocks[start:end] = new_blocks
+			self._update_block_structure()
 			return result
+	def _locate(self, i):
+		"""
+		Return (block, offset) of the row with the given index.
+		"""
+		# Rows are often accessed sequentially. For instance when Qt paints
+		# them. Speed this case up by first checking the last block we found:
+		last_block, last_start = self._last_located
+		if last_block is not None and \
+			0 <= i - last_start < len(last_block.rows):
+			return last_block, i - last_start
+		block_index, offset = self._block_sizes.search(i)
+		block = self._blocks[block_index]
+		self._last_located = block, i - offset
+		return block, offset
+	def _set_block_rows(self, block, rows):
+		self._last_located = None, 0
+		for row in block.rows:
+			del self._blocks_by_key[row.key]
+		if not rows or len(rows) > _MAX_BLOCK_SIZE:
+			new_blocks = _split_into_blocks(rows)
+			for new_block in new_blocks:
+				self._index_rows(new_block)
+			i = block.index
+			self._blocks[i:i + 1] = new_blocks
+			self._update_block_structure()
+		else:
+			delta = len(rows) - len(block.rows)
+			block.set_rows(rows)
+			self._index_rows(block)
+			self._block_sizes.add(block.index, delta)
+			self._len += delta
+	def _reset(self, rows):
+		self._blocks = _split_into_blocks(rows)
+		self._blocks_by_key = {}
+		for block in self._blocks:
+			self._index_rows(block)
+		self._update_block_structure()
+	def _update_block_structure(self):
+		self._block_sizes = FenwickTree(len(self._blocks))
+		self._len = 0
+		for i, block in enumerate(self._blocks):
+			block.index = i
+			self._block_sizes.add(i, len(block.rows))
+			self._len += len(block.rows)
+		self._last_located = None, 0
+	def _index_rows(self, block):
+		for row in block.rows:
+			self._blocks_by_key[row.key] = block
 	def _check_integrity(self):
-		assert len(self._rows) == len(self._keys), \
+		assert self._len == len(self._blocks_by_key), \
 			'Integrity error, likely caused by duplicate rows'
 
+_MAX_BLOCK_SIZE = 512
+_MIN_BLOCK_SIZE = _MAX_BLOCK_SIZE // 8
+
+class _Block:
+
+	__slots__ = ('rows', 'offsets', 'index')
+
+	def __init__(self, rows):
+		self.index = -1
+		self.set_rows(rows)
+	def set_rows(self, rows):
+		self.rows = rows
+		self.offsets = {row.key: i for i, row in enumerate(rows)}
+
+def _split_into_blocks(rows):
+	# Use blocks that are only half full so later inserts don't immediately
+	# cause another split:
+	num_blocks = -(-len(rows) // (_MAX_BLOCK_SIZE // 2))
+	if not num_blocks:
+		return []
+	# Distribute the rows evenly, so there is no undersized last block:
+	bounds = [len(rows) * i // num_blocks for i in range(num_blocks + 1)]
+	return [_Block(rows[start:end]) for start, end in zip(bounds, bounds[1:])]
+
 class Row:
 	def __init__(self, key, icon, drop_enabled, cells):
 		self.key = key
@@ -1,62 +1,287 @@
+from collections import namedtuple
 from functools import total_ordering
-from queue import PriorityQueue
-from threading import Thread, Lock
+from heapq import heappush, heappop
+from itertools import count
+from threading import Thread, Condition, Event, Lock, current_thread
+from time import monotonic
 
 import sys
 
+class Scheduler:
+	"""
+	Runs the tasks of many Workers on a bounded number of threads. The tasks of
+	one Worker never run concurrently and run in the order of their priority.
+	Between Workers, the one whose next task has the lowest priority goes
+	first. Ties are broken in favor of the focused group, then round-robin.
+
+	A task may block for a long time, for instance when it lists a directory on
+	an unreachable network drive. It can't be cancelled. So when all threads
+	have been busy for `stall_timeout` seconds while other Workers are waiting,
+	an extra thread is started. Extra threads exit once there is no more work.
+	"""
+	def __init__(self, max_threads, stall_timeout=1):
+		self._max_threads = max_threads
+		self._stall_timeout = stall_timeout
+		self._threads = []
+		# Maps the threads that are running a task to when they started it:
+		self._busy_since = {}
+		self._is_watching = False
+		self._num_idle_threads = 0
+		self._condition = Condition()
+		self._ready = set()
+		self._turn = count()
+		self._focused_group = None
+	def focus(self, group):
+		"""
+		Let the Workers of the given group go first when priorities are equal.
+		"""
+		with self._condition:
+			self._focused_group = group
+	def get_num_threads(self):
+		with self._condition:
+			return len(self._threads)
+	def _make_ready(self, worker):
+		# Must be called with self._condition held.
+		if worker in self._ready:
+			return
+		self._ready.add(worker)
+		if self._num_idle_threads:
+			self._condition.notify_all()
+		elif len(self._threads) < self._max_threads:
+			self._start_thread()
+		elif not self._is_watching:
+			self._is_watching = True
+			Thread(target=self._watch_for_stalls, daemon=True).start()
+	def _unready(self, worker):
+		# Must be called with self._condition held.
+		self._ready.discard(worker)
+	def _start_thread(self):
+		# Must be called with self._condition held.
+		thread = Thread(target=self._run, daemon=True)
+		self._threads.append(thread)
+		thread.start()
+	def _watch_for_stalls(self):
+		with self._condition:
+			while self._ready and not self._num_idle_threads:
+				self._condition.wait(self._stall_timeout)
+				if self._ready and not self._num_idle_threads and \
+					self._all_threads_stalled():
+					self._start_thread()
+			self._is_watching = False
+	def _all_threads_stalled(self):
+		# Must be called with self._condition held.
+		if len(self._busy_since) < len(self._threads):
+			# A thread is about to pick up work.
+			return False
+		busy_since = max(self._busy_since.values(), default=monotonic())
+		return monotonic() - busy_since >= self._stall_timeout
+	def _run(self):
+		thread = current_thread()
+		while True:
+			with self._condition:
+				while not self._ready:
+					if len(self._threads) > self._max_threads:
+						# An extra thread that is no longer needed.
+						self._threads.remove(thread)
+						return
+					self._num_idle_threads += 1
+					self._condition.wait()
+					self._num_idle_threads -= 1
+				worker = min(self._ready, key=self._get_sort_key)
+				self._ready.remove(worker)
+				worker._last_turn = next(self._turn)
+				item = worker._begin_task()
+				self._busy_since[thread] = monotonic()
+			item.run()
+			with self._condition:
+				del self._busy_since[thread]
+				worker._end_task()
+	def _get_sort_key(self, worker):
+		is_focused = worker.group is not None and \
+					 worker.group is self._focused_group
+		return worker._peek_priority(), not is_focused, worker._last_turn
+
+_MAX_THREADS = 4
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = Lock()
+
+def get_scheduler():
+	global _SCHEDULER
+	with _SCHEDULER_LOCK:
+		if _SCHEDULER is None:
+			_SCHEDULER = Scheduler(_MAX_THREADS)
+		return _SCHEDULER
+
 class Worker:
-	def __init__(self):
-		self._thread = Thread(target=self._run, daemon=True)
-		self._queue = PriorityQueue()
+	"""
+	A queue of tasks that run one at a time, in the threads of a Scheduler.
+	"""
+	def __init__(self, scheduler=None, group=None):
+		if scheduler is None:
+			scheduler = get_scheduler()
+		self.group = group
+		self._scheduler = scheduler
+		# Guards the fields below. Shared with the Scheduler:
+		self._condition = scheduler._condition
+		self._queue = []
+		self._started = False
 		self._shutdown = False
-		self._shutdown_lock = Lock()
+		self._running_thread = None
+		with self._condition:
+			self._last_turn = next(scheduler._turn)
+		# Breaks ties between items of the same priority, so they run FIFO:
+		self._sequence = count()
+		self._items_by_key = {}
+		self._num_run = 0
+		self._num_coalesced = 0
+		self._num_cancelled = 0
 	def start(self):
-		self._thread.start()
+		with self._condition:
+			self._started = True
+			self._update_ready()
 	def submit(self, priority, fn, *args, **kwargs):
 		"""
-		Lower priority means "run sooner".
+		Lower priority means "run sooner". Tasks of the same priority run in the
+		order in which they were submitted.
+		"""
+		self._submit(priority, fn, args, kwargs)
+	def submit_once(self, key, priority, fn, *args, **kwargs):
+		"""
+		Like #submit(...), but does nothing if a task with the same key is
+		still queued. Once a task has started running, it no longer counts as
+		queued. Returns whether the task was submitted.
+		"""
+		return self._submit(priority, fn, args, kwargs, key) is not None
+	def submit_and_wait(self, priority, fn, *args, **kwargs):
+		"""
+		Like #submit(...), but blocks until the task has run. Tasks submitted
+		this way are not cancelled by #cancel_pending().
 		"""
+		assert not self._is_in_task()
+		item = self._submit(priority, fn, args, kwargs, waitable=True)
+		if item:
+			item.wait()
+	def cancel_pending(self):
+		"""
+		Drop all tasks that are queued but not yet running. Tasks submitted via
+		#submit_and_wait(...) are kept because a thread is waiting for them.
+		"""
+		with self._condition:
+			kept = []
+			for item in self._queue:
+				if item.is_waitable():
+					kept.append(item)
+				else:
+					self._on_dequeued(item)
+					self._num_cancelled += 1
+			# A subsequence of a heap is not necessarily a heap:
+			self._queue = sorted(kept)
+			self._update_ready()
+	def get_stats(self):
+		with self._condition:
+			return Stats(
+				len(self._queue), self._num_run, self._num_coalesced,
+				self._num_cancelled
+			)
+	def shutdown(self):
+		"""
+		Drop all queued tasks and wait for the running one (if any) to finish.
+		"""
+		with self._condition:
+			self._shutdown = True
+			for item in self._queue:
+				self._on_dequeued(item)
+				# Don't leave threads waiting for tasks that will never run:
+				item.release()
+			self._queue = []
+			self._update_ready()
+			# Allow tasks running in the worker to shut it down:
+			if not self._is_in_task():
+				while self._running_thread is not None:
+					self._condition.wait()
+	def _submit(self, priority, fn, args, kwargs, key=None, waitable=False):
 		if priority < 1:
 			raise ValueError('priority must be >= 1')
-		with self._shutdown_lock:
+		with self._condition:
 			if self._shutdown:
-				return
-			self._queue.put(WorkItem(priority, fn, *args, *kwargs))
-	def shutdown(self):
-		with self._shutdown_lock:
-			self._shutdown = True
-			self._queue.put(WorkItem(0, lambda: None))
-		self._thread.join()
-	def _run(self):
-		while True:
-			task = self._queue.get()
-			if task.is_shutdown():
-				break
-			task.run()
-			self._queue.task_done()
+				return None
+			if key is not None and key in self._items_by_key:
+				self._num_coalesced += 1
+				return None
+			item = WorkItem(
+				priority, next(self._sequence), fn, args, kwargs, key, waitable
+			)
+			if key is not None:
+				self._items_by_key[key] = item
+			heappush(self._queue, item)
+			self._update_ready()
+			return item
+	def _is_in_task(self):
+		return self._running_thread is current_thread()
+	def _update_ready(self):
+		# Must be called with self._condition held.
+		if self._started and self._queue and self._running_thread is None:
+			self._scheduler._make_ready(self)
+		else:
+			self._scheduler._unready(self)
+	def _peek_priority(self):
+		return self._queue[0].priority
+	def _begin_task(self):
+		item = heappop(self._queue)
+		self._on_dequeued(item)
+		self._running_thread = current_thread()
+		return item
+	def _end_task(self):
+		self._running_thread = None
+		self._num_run += 1
+		self._update_ready()
+		# Wake up #shutdown(), if it is waiting:
+		self._condition.notify_all()
+	def _on_dequeued(self, item):
+		if item.key is not None:
+			del self._items_by_key[item.key]
+
+Stats = namedtuple(
+	'Stats', ('num_pending', 'num_run', 'num_coalesced', 'num_cancelled')
+)
 
 @total_ordering
 class WorkItem:
-	def __init__(self, priority, fn, *args, **kwargs):
+	def __init__(
+		self, priority, sequence, fn, args=(), kwargs=None, key=None,
+		waitable=False
+	):
 		self._fn = fn
 		self._args = args
-		self._kwargs = kwargs
-		self._priority = priority
+		self._kwargs = kwargs or {}
+		self.priority = priority
+		self._sequence = sequence
+		self.key = key
+		self._has_run = Event() if waitable else None
 	def run(self):
 		try:
 			self._fn(*self._args, **self._kwargs)
 		except BaseException as e:
 			sys.excepthook(type(e), e, e.__traceback__)
-	def is_shutdown(self):
-		return not self._priority
+		finally:
+			self.release()
+	def wait(self):
+		self._has_run.wait()
+	def release(self):
+		if self._has_run is not None:
+			self._has_run.set()
+	def is_waitable(self):
+		return self._has_run is not None
 	def __lt__(self, other):
 		try:
-			return self._priority < other._priority
+			return (self.priority, self._sequence) < \
+				   (other.priority, other._sequence)
 		except AttributeError:
 			return NotImplemented
 	def __eq__(self, other):
 		try:
-			return self._fn, self._args, self._kwargs, self._priority == \
-				   other._fn, other._args, other._kwargs, other._priority
+			return (self.priority, self._sequence) == \
+				   (other.priority, other._sequence)
 		except AttributeError:
-			return NotImplemented
\ No newline at end of file
+			return NotImplemented
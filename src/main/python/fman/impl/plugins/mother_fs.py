@@ -1,3 +1,4 @@
+from fman.fs import FileSystem, Stat
 from fman.impl.util import Event, filenotfounderror
 from fman.url import splitscheme, basename, dirname
 from io import UnsupportedOperation
@@ -8,6 +9,7 @@ class MotherFileSystem:
 		super().__init__()
 		self.file_added = Event()
 		self.file_removed = Event()
+		self.columns_changed = Event()
 		self._children = {}
 		# Keep track of children being deleted so file_removed listeners can
 		# call remove_file_changed_callback(...):
@@ -17,9 +19,11 @@ class MotherFileSystem:
 	def add_child(self, scheme, child):
 		child._file_added.add_callback(self._on_file_added)
 		child._file_removed.add_callback(self._on_file_removed)
+		child._columns_changed.add_callback(self.columns_changed.trigger)
 		self._children[scheme] = child
 	def remove_child(self, scheme):
 		child = self._children.pop(scheme)
+		child._columns_changed.remove_callback(self.columns_changed.trigger)
 		child._file_removed.remove_callback(self._on_file_removed)
 		child._file_added.remove_callback(self._on_file_added)
 		self._children_being_deleted[scheme] = child
@@ -44,6 +48,9 @@ class MotherFileSystem:
 					  'Should have been one of %s.' % \
 					  (fn_descr, e.args[0], available_columns)
 			raise KeyError(message) from None
+	def get_max_concurrency(self, url):
+		child, path = self._split(url)
+		return child.get_max_concurrency(path)
 	def exists(self, url):
 		child, path = self._split(url)
 		return child.exists(path)
@@ -57,7 +64,62 @@ class MotherFileSystem:
 		return child.cache.query(path, 'iterdir', compute_value)
 	def query(self, url, fs_method_name):
 		child, path = self._split(url)
+		return self._query(child, path, fs_method_name)
+	def query_many(self, urls, fs_method_names):
+		"""
+		Return a dict that maps each of the given URLs that exists to a tuple
+		of the values of `fs_method_names`. A value is None if querying it
+		raised an OSError other than FileNotFoundError, or if the file system
+		does not implement it.
+		"""
+		result = {}
+		for child, paths in self._split_many(urls):
+			if _implements_stat_many(child):
+				self._load_stats(child, paths.values())
+			for url, path in paths.items():
+				values = []
+				try:
+					for fs_method_name in fs_method_names:
+						try:
+							value = self._query(
+								child, path, fs_method_name, optional=True
+							)
+						except FileNotFoundError:
+							raise
+						except OSError:
+							value = None
+						values.append(value)
+				except FileNotFoundError:
+					continue
+				result[url] = tuple(values)
+		return result
+	def _query(self, child, path, fs_method_name, optional=False):
+		if fs_method_name in Stat._fields and _implements_stat_many(child):
+			try:
+				stat = child.cache.get(path, _STAT_CACHE_KEY)
+			except KeyError:
+				pass
+			else:
+				return getattr(stat, fs_method_name)
+		if optional and not hasattr(child, fs_method_name):
+			return None
 		return getattr(child, fs_method_name)(path)
+	def _load_stats(self, child, paths):
+		missing = []
+		for path in paths:
+			try:
+				child.cache.get(path, _STAT_CACHE_KEY)
+			except KeyError:
+				missing.append(path)
+		if not missing:
+			return
+		try:
+			stats = child.stat_many(missing)
+		except OSError:
+			# Fall back to querying the files individually.
+			return
+		for path, stat in stats.items():
+			child.cache.put(path, _STAT_CACHE_KEY, stat)
 	def is_dir(self, existing_url):
 		return self.query(existing_url, 'is_dir')
 	def icon(self, url):
@@ -165,9 +227,34 @@ class MotherFileSystem:
 			except KeyError:
 				raise filenotfounderror(url)
 		child._remove_file_changed_callback(path, callback)
+	def dir_signature(self, url):
+		child, path = self._split(url)
+		return child.dir_signature(path)
+	def on_quit(self):
+		for child in list(self._children.values()):
+			try:
+				child.on_quit()
+			except OSError:
+				pass
+	def get_cache_stats(self):
+		"""
+		Return a dict that maps the scheme of each file system to the
+		CacheStats of its cache.
+		"""
+		return {
+			scheme: child.cache.get_stats()
+			for scheme, child in self._children.items()
+		}
 	def clear_cache(self, url):
 		child, path = self._split(url)
 		child.cache.clear(path)
+	def clear_listing(self, url):
+		"""
+		Forget the cached contents of the given directory, but not the values
+		of the files in it.
+		"""
+		child, path = self._split(url)
+		child.cache.discard(path, 'iterdir')
 	def notify_file_added(self, url):
 		child, path = self._split(url)
 		child.notify_file_added(path)
@@ -190,6 +277,19 @@ class MotherFileSystem:
 		except KeyError:
 			raise filenotfounderror(url)
 		return child, path
+	def _split_many(self, urls):
+		paths_per_child = {}
+		for url in urls:
+			try:
+				child, path = self._split(url)
+			except FileNotFoundError:
+				continue
+			try:
+				paths = paths_per_child[child]
+			except KeyError:
+				paths = paths_per_child[child] = {}
+			paths[url] = path
+		return paths_per_child.items()
 	def _remove(self, url):
 		child, path = self._split(url)
 		child.cache.clear(path)
@@ -213,6 +313,12 @@ class MotherFileSystem:
 		else:
 			parent_files.append(basename(url))
 
+# The key under which Stat records from FileSystem#stat_many(...) are cached:
+_STAT_CACHE_KEY = 'stat_many'
+
+def _implements_stat_many(child):
+	return type(child).stat_many is not FileSystem.stat_many
+
 class CachedIterator:
 	def __init__(self, source):
 		self._source = source
@@ -388,6 +388,13 @@ class ColumnWrapper(Wrapper):
 		with self._report_exceptions(exclude={FileNotFoundError}):
 			return self._wrapped.get_str(url)
 		return ''
+	def get_strs(self, urls):
+		if type(self._wrapped).get_strs is Column.get_strs:
+			# Let #get_str(...) report the errors of the individual files:
+			return Column.get_strs(self, urls)
+		with self._report_exceptions(exclude={FileNotFoundError}):
+			return self._wrapped.get_strs(urls)
+		return [''] * len(urls)
 	def get_sort_value(self, url, is_ascending):
 		# We always return a tuple (error occurred, sort value) to ensure
 		# comparisons can be performed even when errors occur and there is no
@@ -1,10 +1,13 @@
+from contextlib import contextmanager
 from getpass import getuser
-from os import listdir, strerror
+from os import listdir, strerror, makedirs, replace
 from os.path import join, basename, expanduser, dirname, realpath, relpath, \
 	pardir, splitdrive
+from tempfile import mkstemp
 
 import errno
 import os
+import pickle
 
 def listdir_absolute(dir_path):
 	return [join(dir_path, file_name) for file_name in listdir(dir_path)]
@@ -26,6 +29,46 @@ def parse_version(version_str):
 		version_str = version_str[:-len('-SNAPSHOT')]
 	return tuple(map(int, version_str.split('.')))
 
+@contextmanager
+def writing_atomically(file_path):
+	"""
+	Yield a temporary path to write to. It is moved to `file_path` when the
+	block completes, so a crash can't leave a partial file at `file_path`.
+	The path is unique, so concurrent writers of the same file don't interfere.
+	"""
+	fd, tmp_path = mkstemp(
+		prefix=basename(file_path) + '.', suffix='.tmp', dir=dirname(file_path)
+	)
+	os.close(fd)
+	try:
+		yield tmp_path
+		replace(tmp_path, file_path)
+	except BaseException:
+		try:
+			os.remove(tmp_path)
+		except OSError:
+			pass
+		raise
+
+def write_pickle(file_path, obj, format_version):
+	data = pickle.dumps((format_version, obj), pickle.HIGHEST_PROTOCOL)
+	makedirs(dirname(file_path), exist_ok=True)
+	with writing_atomically(file_path) as tmp_path:
+		with open(tmp_path, 'wb') as f:
+			f.write(data)
+
+def read_pickle(file_path, format_version, default):
+	"""
+	Read an object written by #write_pickle(...). Return `default` if the file
+	does not exist, can't be read, is corrupt or has a different format.
+	"""
+	try:
+		with open(file_path, 'rb') as f:
+			format_version_read, result = pickle.load(f)
+	except Exception:
+		return default
+	return result if format_version_read == format_version else default
+
 class MixinBase:
 
 	_FIELDS = () # To be set by subclasses
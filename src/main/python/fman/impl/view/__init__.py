@@ -37,6 +37,9 @@ class FileListView(
 		self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
 		self.setContextMenuPolicy(Qt.DefaultContextMenu)
 		self._urls_being_loaded = []
+	def focusInEvent(self, event):
+		super().focusInEvent(event)
+		self.model().focus()
 	def contextMenuEvent(self, event):
 		index = self.indexAt(event.pos())
 		updated_selection = False
@@ -170,6 +173,8 @@ class FileListView(
 		visible = self.get_visible_row_range()
 		return visible.start <= i < visible.stop
 	def paintEvent(self, event):
+		visible_rows = self.get_visible_row_range()
+		self.model().set_viewport(visible_rows.start, visible_rows.stop)
 		missing_rows, missing_urls = self._get_rows_to_load()
 		if missing_rows:
 			self._urls_being_loaded.extend(missing_urls)
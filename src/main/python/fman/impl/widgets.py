@@ -46,10 +46,11 @@ class DirectoryPaneWidget(QWidget):
 	location_changed = pyqtSignal(QWidget)
 	location_bar_clicked = pyqtSignal(QWidget)
 
-	def __init__(self, fs, null_location, parent, controller):
+	def __init__(self, fs, null_location, parent, controller, snapshots=None):
 		super().__init__(parent)
 		self._location_bar = LocationBar(self)
-		self._model = SortedFileSystemModel(self, fs, null_location)
+		self._model = \
+			SortedFileSystemModel(self, fs, null_location, snapshots)
 		self._model.file_renamed.connect(self._on_file_renamed)
 		self._model.files_dropped.connect(self._on_files_dropped)
 		self._file_view = FileListView(
@@ -209,6 +210,7 @@ class FilterBar(QFrame):
 		self.setLayout(layout)
 		self.setFocusPolicy(NoFocus)
 		self._input.setFocusPolicy(NoFocus)
+		self._filter_text = ''
 		self._filter_re = re.compile('', re.I)
 		self._model.add_filter(self._accepts)
 		file_view.verticalScrollBar().rangeChanged.connect(
@@ -237,11 +239,9 @@ class FilterBar(QFrame):
 		if curr.isValid() and has_required_prefix(curr):
 			# We're already at a row with the required prefix. Nothing to do.
 			return
-		for i in range(m.rowCount()):
-			idx = m.index(i, 0)
-			if has_required_prefix(idx):
-				self._file_view.setCurrentIndex(idx)
-				break
+		idx = m.find_prefix(query)
+		if idx.isValid():
+			self._file_view.setCurrentIndex(idx)
 	def close(self):
 		self.hide()
 		self._input.setText('')
@@ -259,7 +259,15 @@ class FilterBar(QFrame):
 	def _on_text_changed(self, text):
 		text_re = '.*'.join(map(re.escape, text.split('*')))
 		self._filter_re = re.compile(text_re, re.I)
-		self._model.sourceModel().update()
+		# Every match of the regex for `text` + suffix also contains a match of
+		# the regex for `text`. So when the user types more characters, the
+		# rows can only get fewer:
+		narrowed = text.startswith(self._filter_text)
+		self._filter_text = text
+		if narrowed:
+			self._model.sourceModel().update_narrowed()
+		else:
+			self._model.sourceModel().update_widened()
 	def _accepts(self, url):
 		return bool(self._filter_re.search(basename(url)))
 
@@ -271,7 +279,7 @@ class MainWindow(QMainWindow):
 
 	def __init__(
 		self, app, help_menu_actions, theme, progress_bar_palette, fs,
-		null_location
+		null_location, snapshots=None
 	):
 		super().__init__()
 		self._controller = None
@@ -280,6 +288,7 @@ class MainWindow(QMainWindow):
 		self._progress_bar_palette = progress_bar_palette
 		self._fs = fs
 		self._null_location = null_location
+		self._snapshots = snapshots
 		self._panes = []
 		self._splitter = Splitter(self)
 		self.setCentralWidget(self._splitter)
@@ -396,7 +405,8 @@ class MainWindow(QMainWindow):
 	@run_in_main_thread
 	def add_pane(self):
 		result = DirectoryPaneWidget(
-			self._fs, self._null_location, self._splitter, self._controller
+			self._fs, self._null_location, self._splitter, self._controller,
+			self._snapshots
 		)
 		self._panes.append(result)
 		self._splitter.addWidget(result)
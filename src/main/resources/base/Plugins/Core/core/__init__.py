@@ -1,10 +1,12 @@
 from core.commands import *
+from core.formatting import format_size, format_datetime
 from core.fs import *
+from core.util import filenotfounderror
 from datetime import datetime
 from fman.fs import Column
+from collections import OrderedDict
 from fman.url import basename
-from math import log
-from PyQt5.QtCore import QLocale, QDateTime
+from threading import Lock
 
 import fman.fs
 import re
@@ -17,72 +19,85 @@ class Name(Column):
 	def get_str(self, url):
 		return self._fs.query(url, 'name')
 	def get_sort_value(self, url, is_ascending):
-		try:
-			is_dir = self._fs.is_dir(url)
-		except FileNotFoundError:
-			raise
-		except OSError:
-			is_dir = False
-		major = is_dir ^ is_ascending
-		str_ = self.get_str(url).lower()
-		minor = ''
-		while str_:
-			match = re.search(r'\d+', str_)
-			if match:
-				minor += str_[:match.start()]
-				minor += '%06d' % int(match.group(0))
-				str_ = str_[match.end():]
-			else:
-				minor += str_
-				break
-		return major, minor
+		is_dir, name = _query(self._fs, url, ('is_dir', 'name'))
+		if name is None:
+			name = basename(url)
+		natural_key = _get_natural_key(url, name)
+		return _get_sort_key(is_dir, is_ascending, natural_key)
 
 # Define here so get_default_columns(...) can reference it as core.Size:
 class Size(Column):
+
+	_FIELDS = ('is_dir', 'size_bytes')
+
 	def __init__(self, fs=fman.fs):
 		super().__init__()
 		self._fs = fs
 	def get_str(self, url):
-		try:
-			is_dir = self._fs.is_dir(url)
-		except FileNotFoundError:
-			raise
-		except OSError:
-			return ''
+		return self._render(*_query(self._fs, url, self._FIELDS))
+	def get_strs(self, urls):
+		values = self._fs.query_many(urls, self._FIELDS)
+		return [self._render(*values.get(url, (None, None))) for url in urls]
+	def get_sort_value(self, url, is_ascending):
+		is_dir, size_bytes = _query(self._fs, url, self._FIELDS)
 		if is_dir:
-			return ''
-		try:
-			size_bytes = self._get_size(url)
-		except OSError:
-			return ''
-		if size_bytes is None:
-			return ''
-		units = ('%d B', '%d KB', '%.1f MB', '%.1f GB')
-		if size_bytes <= 0:
-			unit_index = 0
+			# Directories are always sorted by name, in ascending order:
+			minor = _get_natural_key(url, basename(url))
+			if not is_ascending:
+				minor = _invert(minor)
 		else:
-			unit_index = min(int(log(size_bytes, 1000)), len(units) - 1)
-		unit = units[unit_index]
-		base = 1024 ** unit_index
-		return unit % (size_bytes / base)
+			minor = max(size_bytes or 0, 0).to_bytes(8, 'big')
+		return _get_sort_key(is_dir, is_ascending, minor)
+	def _render(self, is_dir, size_bytes):
+		# The values are None if querying them raised an OSError:
+		if is_dir is None or is_dir or size_bytes is None:
+			return ''
+		return format_size(size_bytes)
+
+# Define here so get_default_columns(...) can reference it as core.FolderSize:
+class FolderSize(Size):
+	"""
+	Like Size, but also displays the total size of the files below directories,
+	for file systems that implement `folder_size(path)`. While a total is being
+	computed, or if the directory is too large to be walked entirely, the bytes
+	counted so far are shown, followed by "…".
+	"""
+
+	display_name = 'Folder size'
+
+	def get_str(self, url):
+		is_dir, size_bytes = _query(self._fs, url, self._FIELDS)
+		folder_size = self._get_folder_size(url) if is_dir else None
+		return self._render(is_dir, size_bytes, folder_size)
+	def get_strs(self, urls):
+		values = self._fs.query_many(urls, self._FIELDS)
+		dir_urls = [url for url in urls if values.get(url, (None,))[0]]
+		folder_sizes = self._fs.query_many(dir_urls, ('folder_size',))
+		return [
+			self._render(
+				*values.get(url, (None, None)),
+				folder_sizes.get(url, (None,))[0]
+			)
+			for url in urls
+		]
 	def get_sort_value(self, url, is_ascending):
-		try:
-			is_dir = self._fs.is_dir(url)
-		except FileNotFoundError:
-			raise
-		except OSError:
-			is_dir = False
+		is_dir, size_bytes = _query(self._fs, url, self._FIELDS)
 		if is_dir:
-			ord_ = ord if is_ascending else lambda c: -ord(c)
-			minor = tuple(ord_(c) for c in basename(url).lower())
-		else:
-			try:
-				minor = self._get_size(url)
-			except OSError:
-				minor = 0
-		return is_dir ^ is_ascending, minor
-	def _get_size(self, url):
-		return self._fs.query(url, 'size_bytes')
+			folder_size = self._get_folder_size(url)
+			if folder_size is None:
+				return super().get_sort_value(url, is_ascending)
+			size_bytes = folder_size[0]
+		minor = max(size_bytes or 0, 0).to_bytes(8, 'big')
+		return _get_sort_key(is_dir, is_ascending, minor)
+	def _get_folder_size(self, url):
+		values = self._fs.query_many([url], ('folder_size',))
+		return values.get(url, (None,))[0]
+	def _render(self, is_dir, size_bytes, folder_size=None):
+		if is_dir and folder_size is not None:
+			total_bytes, is_final = folder_size
+			result = format_size(total_bytes)
+			return result if is_final else result + '…'
+		return super()._render(is_dir, size_bytes)
 
 # Define here so get_default_columns(...) can reference it as core.Modified:
 class Modified(Column):
@@ -94,31 +109,102 @@ class Modified(Column):
 			mtime = self._get_mtime(url)
 		except OSError:
 			return ''
-		if mtime is None:
-			return ''
-		try:
-			timestamp = mtime.timestamp()
-		except OSError:
-			# This can occur in at least Python 3.6 on Windows. To reproduce:
-			#     datetime.min.timestamp()
-			# This raises `OSError: [Errno 22] Invalid argument`.
-			return ''
-		mtime_qt = QDateTime.fromMSecsSinceEpoch(int(timestamp * 1000))
-		time_format = QLocale().dateTimeFormat(QLocale.ShortFormat)
-		# Always show two-digit years, not four digits:
-		time_format = time_format.replace('yyyy', 'yy')
-		return mtime_qt.toString(time_format)
+		return self._render(mtime)
+	def get_strs(self, urls):
+		values = self._fs.query_many(urls, ('modified_datetime',))
+		return [self._render(values.get(url, (None,))[0]) for url in urls]
 	def get_sort_value(self, url, is_ascending):
-		try:
-			is_dir = self._fs.is_dir(url)
-		except FileNotFoundError:
-			raise
-		except OSError:
-			is_dir = False
-		try:
-			mtime = self._get_mtime(url)
-		except OSError:
-			mtime = None
-		return is_dir ^ is_ascending, mtime or datetime.min
+		is_dir, mtime = \
+			_query(self._fs, url, ('is_dir', 'modified_datetime'))
+		return bool(is_dir) ^ is_ascending, mtime or datetime.min
 	def _get_mtime(self, url):
-		return self._fs.query(url, 'modified_datetime')
\ No newline at end of file
+		return self._fs.query(url, 'modified_datetime')
+	def _render(self, mtime):
+		return '' if mtime is None else format_datetime(mtime)
+
+def _query(fs, url, fs_method_names):
+	# Use query_many(...) so file systems that implement
+	# FileSystem#stat_many(...) can answer from one (cached) record:
+	try:
+		return fs.query_many([url], fs_method_names)[url]
+	except KeyError:
+		raise filenotfounderror(url) from None
+
+def _get_sort_key(is_dir, is_ascending, minor):
+	"""
+	The sort values of Name and Size are bytes. They are compact and fast to
+	compare. The first byte puts directories before files.
+	"""
+	return (b'\x01' if bool(is_dir) ^ is_ascending else b'\x00') + minor
+
+def _get_natural_key(url, name):
+	"""
+	Sorts "file 2.txt" before "file 10.txt". Depends only on the name. So it is
+	computed once per file and shared by both sort orders and all columns.
+	"""
+	return _NATURAL_KEYS.get(url, name)
+
+def _compute_natural_key(name):
+	key = _DIGITS.sub(_pad_number, name.lower())
+	# UTF-8 preserves the order of code points. 'surrogatepass' handles file
+	# names that could not be decoded:
+	return key.encode('utf-8', 'surrogatepass')
+
+class _NaturalKeyCache:
+	"""
+	Caches natural keys per directory. Once there are more than `max_entries`
+	keys, those of the least recently used directories are evicted. The keys
+	of the most recently used directory are always kept, so sorting a large
+	directory does not evict its own keys.
+	"""
+	def __init__(self, max_entries=65536):
+		self._max_entries = max_entries
+		# Maps directory URLs to dicts name -> key:
+		self._dirs = OrderedDict()
+		self._num_entries = 0
+		self._last_dir_url = None
+		self._lock = Lock()
+	def get(self, url, name):
+		# Faster than dirname(url), and just as good for telling directories
+		# apart:
+		dir_url = url.rpartition('/')[0]
+		with self._lock:
+			keys = self._dirs.get(dir_url)
+			if keys is not None:
+				if dir_url != self._last_dir_url:
+					self._dirs.move_to_end(dir_url)
+					self._last_dir_url = dir_url
+				try:
+					return keys[name]
+				except KeyError:
+					pass
+		result = _compute_natural_key(name)
+		with self._lock:
+			keys = self._dirs.get(dir_url)
+			if keys is None:
+				keys = self._dirs[dir_url] = {}
+				self._last_dir_url = dir_url
+			if name not in keys:
+				keys[name] = result
+				self._num_entries += 1
+			while self._num_entries > self._max_entries and \
+				len(self._dirs) > 1:
+				_, evicted = self._dirs.popitem(last=False)
+				self._num_entries -= len(evicted)
+		return result
+
+_NATURAL_KEYS = _NaturalKeyCache()
+
+_DIGITS = re.compile(r'\d+')
+
+def _pad_number(match):
+	return '%06d' % int(match.group(0))
+
+def _invert(key):
+	"""
+	Return a key that sorts in the opposite order. The terminating \\xff
+	makes prefixes sort after longer keys. `key` must not contain \\x00.
+	"""
+	return key.translate(_INVERTED_BYTES) + b'\xff'
+
+_INVERTED_BYTES = bytes(range(255, -1, -1))
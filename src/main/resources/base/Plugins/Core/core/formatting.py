@@ -0,0 +1,59 @@
+"""
+Renders the values displayed by core's columns. Many files have equal values
+when rounded to the displayed precision. So the strings are memoized.
+"""
+
+from functools import lru_cache
+from PyQt5.QtCore import QLocale, QDateTime
+
+def format_size(size_bytes):
+	# Switch to the next unit at exactly 1000 ** n bytes. Compare integers for
+	# this. int(log(size_bytes, 1000)) can round down at these boundaries:
+	if size_bytes < 1000:
+		return _format_size_bucket(0, size_bytes)
+	if size_bytes < 1000 ** 2:
+		# '%d' truncates. So all sizes with the same quotient look the same:
+		return _format_size_bucket(1, size_bytes // 1024)
+	unit_index = 2 if size_bytes < 1000 ** 3 else 3
+	return _SIZE_UNITS[unit_index] % (size_bytes / 1024 ** unit_index)
+
+_SIZE_UNITS = ('%d B', '%d KB', '%.1f MB', '%.1f GB')
+
+@lru_cache(maxsize=2048)
+def _format_size_bucket(unit_index, bucket):
+	return _SIZE_UNITS[unit_index] % bucket
+
+def format_datetime(datetime_):
+	try:
+		timestamp = datetime_.timestamp()
+	except OSError:
+		# This can occur in at least Python 3.6 on Windows. To reproduce:
+		#     datetime.min.timestamp()
+		# This raises `OSError: [Errno 22] Invalid argument`.
+		return ''
+	time_format, resolution_ms = _get_time_format()
+	return _format_timestamp(
+		int(timestamp * 1000) // resolution_ms, resolution_ms, time_format
+	)
+
+@lru_cache(maxsize=1)
+def _get_time_format():
+	"""
+	Return the locale's date time format, and the number of milliseconds it
+	does not distinguish between.
+	"""
+	result = QLocale().dateTimeFormat(QLocale.ShortFormat)
+	# Always show two-digit years, not four digits:
+	result = result.replace('yyyy', 'yy')
+	if 'z' in result:
+		resolution_ms = 1
+	elif 's' in result:
+		resolution_ms = 1000
+	else:
+		resolution_ms = 60 * 1000
+	return result, resolution_ms
+
+@lru_cache(maxsize=4096)
+def _format_timestamp(bucket, resolution_ms, time_format):
+	mtime_qt = QDateTime.fromMSecsSinceEpoch(bucket * resolution_ms)
+	return mtime_qt.toString(time_format)
@@ -1,19 +1,24 @@
+from collections import namedtuple
+from core.fs.local.folder_sizes import FolderSizes
+from core.fs.local.mounts import is_network_mount
 from core.trash import move_to_trash
-from core.util import filenotfounderror
+from core.util import filenotfounderror, parent
 from datetime import datetime
 from errno import ENOENT
-from fman import PLATFORM, Task
-from fman.fs import FileSystem, cached
+from fman import PLATFORM, DATA_DIRECTORY, Task, load_json
+from fman.fs import FileSystem, RevalidateByParent
 from fman.impl.util.qt.thread import run_in_main_thread
 from fman.url import as_url, splitscheme, as_human_readable, join, basename, \
 	dirname
 from io import UnsupportedOperation
 from os import remove, rmdir
 from os.path import islink, samestat, isabs, splitdrive
+from os.path import join as join_os_path
 from pathlib import Path
 from PyQt5.QtCore import QFileSystemWatcher
 from shutil import copystat
-from stat import S_ISDIR, S_IWRITE
+from stat import S_IFDIR, S_IFREG, S_ISDIR, S_IWRITE
+from threading import Lock
 
 import errno
 import os
@@ -29,8 +34,32 @@ class LocalFileSystem(FileSystem):
 	def __init__(self):
 		super().__init__()
 		self._watcher = None
+		self._network_mount_policy = RevalidateByParent(self, interval=5)
+		# Created when first needed, so there is no overhead for users who
+		# don't display folder sizes:
+		self._folder_sizes = None
+		self._folder_sizes_lock = Lock()
+		# Loaded from Core Settings.json when first needed:
+		self._show_folder_sizes = None
 	def get_default_columns(self, path):
+		if self._show_folder_sizes is None:
+			# Like other settings, such as archive_handlers, this is only read
+			# once. This method is called for every directory that is opened:
+			settings = load_json('Core Settings.json', default={})
+			self._show_folder_sizes = settings.get('show_folder_sizes', False)
+		if self._show_folder_sizes:
+			return 'core.Name', 'core.FolderSize', 'core.Modified'
 		return 'core.Name', 'core.Size', 'core.Modified'
+	def get_cache_policy(self, path):
+		# We don't receive notifications for changes on network mounts made by
+		# other machines. So check for changes every once in a while:
+		if is_network_mount(self._url_to_os_path(path)):
+			return self._network_mount_policy
+		return super().get_cache_policy(path)
+	def get_max_concurrency(self, path):
+		# os.stat(...) releases the GIL. This lets us hide the latency of
+		# network drives by stat'ing several files at once:
+		return 8
 	def exists(self, path):
 		os_path = self._url_to_os_path(path)
 		return self._isabs(os_path) and Path(os_path).exists()
@@ -38,14 +67,61 @@ class LocalFileSystem(FileSystem):
 		os_path = self._url_to_os_path(path)
 		if not self._isabs(os_path):
 			raise filenotfounderror(path)
-		# Use os.listdir(...) instead of Path(...).iterdir() for performance:
-		return os.listdir(os_path)
+		# Use os.scandir(...) instead of Path(...).iterdir() for performance.
+		# It also tells us the type of each file without an extra system call
+		# (and on Windows, its size and mtime). Put this information into the
+		# cache so callers such as sorting don't have to stat(...) each file:
+		dir_path = path if path.endswith('/') else path + '/'
+		result = []
+		with os.scandir(os_path) as entries:
+			for entry in entries:
+				result.append(entry.name)
+				self._cache_dir_entry(dir_path + entry.name, entry)
+		return result
+	def _cache_dir_entry(self, path, entry):
+		try:
+			st_mode = S_IFDIR if entry.is_dir() else S_IFREG
+		except OSError:
+			return
+		st_size = st_mtime = None
+		if PLATFORM == 'Windows' and not entry.is_symlink():
+			# On Windows, DirEntry#stat() is free for non-symlinks. We don't
+			# cache it as the full stat however because its .st_dev is always
+			# 0, which would break #_prepare_move(...).
+			try:
+				stat = entry.stat()
+			except OSError:
+				pass
+			else:
+				st_size, st_mtime = stat.st_size, stat.st_mtime
+		# Don't replace a full stat that is already cached:
+		partial_stat = _PartialStat(st_mode, st_size, st_mtime)
+		self.cache.query(path, 'stat', lambda: partial_stat)
 	def is_dir(self, existing_path):
 		# Like Python's isdir(...) except raises FileNotFoundError if the file
 		# does not exist and OSError if there is another error.
-		return S_ISDIR(self.stat(existing_path).st_mode)
-	@cached
+		return S_ISDIR(self._get_stat(existing_path, 'st_mode'))
 	def stat(self, path):
+		return self._get_stat(path)
+	def size_bytes(self, path):
+		return self._get_stat(path, 'st_size')
+	def modified_datetime(self, path):
+		return datetime.fromtimestamp(self._get_stat(path, 'st_mtime'))
+	def _get_stat(self, path, field=None):
+		"""
+		Return the stat of the given file, or one of its fields. The stat is
+		the only value we cache per file. After #iterdir(...), it is a
+		_PartialStat. It is replaced by the full stat when a field is needed
+		that the _PartialStat doesn't have.
+		"""
+		result = self.cache.query(path, 'stat', lambda: self._stat(path))
+		if isinstance(result, _PartialStat):
+			if field is not None and getattr(result, field) is not None:
+				return getattr(result, field)
+			result = self._stat(path)
+			self.cache.put(path, 'stat', result)
+		return result if field is None else getattr(result, field)
+	def _stat(self, path):
 		os_path = self._url_to_os_path(path)
 		if not self._isabs(os_path):
 			raise filenotfounderror(path)
@@ -53,10 +129,36 @@ class LocalFileSystem(FileSystem):
 			return os.stat(os_path)
 		except FileNotFoundError:
 			return os.stat(os_path, follow_symlinks=False)
-	def size_bytes(self, path):
-		return self.stat(path).st_size
-	def modified_datetime(self, path):
-		return datetime.fromtimestamp(self.stat(path).st_mtime)
+	def folder_size(self, path):
+		"""
+		Return (total_bytes, is_final) for the files below directory `path`.
+		Used by the FolderSize column. See FolderSizes.
+		"""
+		os_path = self._url_to_os_path(path)
+		if not self._isabs(os_path):
+			raise filenotfounderror(path)
+		return self._get_folder_sizes().get(os_path)
+	def on_quit(self):
+		folder_sizes = self._folder_sizes
+		if folder_sizes is not None:
+			folder_sizes.flush()
+	def _get_folder_sizes(self):
+		with self._folder_sizes_lock:
+			if self._folder_sizes is None:
+				index_path = join_os_path(
+					DATA_DIRECTORY, 'Local', 'Cache', 'Folder Sizes.bin'
+				)
+				self._folder_sizes = \
+					FolderSizes(index_path, self._on_folder_size_changed)
+			return self._folder_sizes
+	def dir_signature(self, path):
+		os_path = self._url_to_os_path(path)
+		if not self._isabs(os_path):
+			raise filenotfounderror(path)
+		# Adding, removing or renaming a file updates the directory's mtime.
+		# The other fields catch the directory being replaced altogether:
+		stat = os.stat(os_path)
+		return stat.st_mtime_ns, stat.st_ctime_ns, stat.st_ino, stat.st_dev
 	def touch(self, path):
 		os_path = Path(self._url_to_os_path(path))
 		if not os_path.is_absolute():
@@ -293,9 +395,24 @@ class LocalFileSystem(FileSystem):
 				self._watcher.directoryChanged.connect(self._on_file_changed)
 				self._watcher.fileChanged.connect(self._on_file_changed)
 		return self._watcher
+	def notify_file_added(self, path):
+		self._invalidate_folder_sizes(self._url_to_os_path(parent(path)))
+		super().notify_file_added(path)
+	def notify_file_removed(self, path):
+		self._invalidate_folder_sizes(self._url_to_os_path(parent(path)))
+		super().notify_file_removed(path)
 	def _on_file_changed(self, file_path):
+		self._invalidate_folder_sizes(file_path)
 		path_forward_slashes = splitscheme(as_url(file_path))[1]
 		self.notify_file_changed(path_forward_slashes)
+	def _invalidate_folder_sizes(self, dir_path):
+		folder_sizes = self._folder_sizes
+		if folder_sizes is not None:
+			folder_sizes.invalidate(dir_path)
+	def _on_folder_size_changed(self, os_path):
+		# Don't use #notify_file_changed(...): It clears the cache, and when
+		# the directory is open in the other pane, reloads all of its files.
+		self.notify_columns_changed(splitscheme(as_url(os_path))[1])
 	def _check_transfer_precnds(self, src_url, dst_url):
 		src_scheme, src_path = splitscheme(src_url)
 		dst_scheme, dst_path = splitscheme(dst_url)
@@ -317,6 +434,9 @@ class LocalFileSystem(FileSystem):
 		# purposes, it is. So add some extra logic to handle this case:
 		return isabs(os_path) or splitdrive(os_path)[0]
 
+# The fields of a stat that #iterdir(...) gets for free. None if not known:
+_PartialStat = namedtuple('_PartialStat', ('st_mode', 'st_size', 'st_mtime'))
+
 class CopyFile(Task):
 	def __init__(self, fs, src_url, dst_url, size_bytes):
 		super().__init__('Copying ' + basename(src_url), size=size_bytes)
@@ -0,0 +1,361 @@
+from collections import OrderedDict
+from errno import ENOTDIR
+from fman.impl.util import write_pickle
+from os.path import dirname, join, sep
+from queue import Queue
+from stat import S_ISDIR
+from threading import Lock, Thread
+from time import time
+
+import logging
+import os
+import pickle
+
+_LOG = logging.getLogger(__name__)
+
+class FolderSizes:
+	"""
+	Computes the total size of the files below directories, like `du`. The
+	directories are walked by a pool of background threads. While a walk is in
+	progress, #get(...) returns the number of bytes counted so far, and
+	`on_change(os_path)` is called every now and then with the path of the
+	directory being walked. It is also called when the walk is complete.
+
+	The results are kept in an index that maps the (st_dev, st_ino) of each
+	directory to the size of the files directly inside it, its subdirectories
+	and its total size. It holds at most `max_records` directories, and forgets
+	the least recently used ones first. #flush() appends the records that
+	changed to the file at `index_path`. Only once the appended records
+	outnumber the index is the whole file rewritten. When fman is started
+	again, the totals of directories that were measured before are then
+	displayed immediately while they are being revalidated.
+
+	Within one session, a directory is walked only once. Afterwards, changes
+	must be reported via #invalidate(...). This only walks the directories
+	along the path to the changed one again, and reuses the totals of all
+	others.
+
+	A walk stops after `max_walk_dirs` directories, so opening a location such
+	as / does not walk the entire disk. #get(...) then keeps returning the
+	bytes counted until then, as a total that isn't final.
+	"""
+	def __init__(
+		self, index_path, on_change, num_threads=4, max_records=1000000,
+		max_walk_dirs=100000
+	):
+		self._index_path = index_path
+		self._on_change = on_change
+		self._num_threads = num_threads
+		self._max_records = max_records
+		self._max_walk_dirs = max_walk_dirs
+		# Maps (st_dev, st_ino) to (files_size, subdirs, total), where subdirs
+		# is a tuple of (name, (st_dev, st_ino)) pairs. Ordered from least to
+		# most recently used. Read when first needed:
+		self._records = None
+		# The records that changed since the last #flush():
+		self._changed = {}
+		# The number of records appended to the index file since it was last
+		# written in full. None if it needs to be written in full:
+		self._num_appended = None
+		# The keys of the records whose totals were computed in this session:
+		self._validated = set()
+		# Maps the paths that were passed to #get(...) to their keys:
+		self._requested = {}
+		# Maps keys to the _Walks that are computing their totals:
+		self._walks = {}
+		# Maps the keys of walks that stopped after max_walk_dirs to the
+		# number of bytes they counted:
+		self._truncated = {}
+		self._queue = Queue()
+		self._threads = []
+		self._flushed_at = time()
+		self._lock = Lock()
+		self._flush_lock = Lock()
+	def get(self, os_path):
+		"""
+		Return a tuple (total_bytes, is_final). Starts walking the directory in
+		the background if its total isn't known yet.
+		"""
+		st = os.lstat(os_path)
+		if not S_ISDIR(st.st_mode):
+			raise NotADirectoryError(ENOTDIR, os.strerror(ENOTDIR), os_path)
+		key = _get_key(st)
+		with self._lock:
+			records = self._get_records()
+			self._requested[os_path] = key
+			record = records.get(key)
+			if record is not None:
+				records.move_to_end(key)
+				if key in self._validated:
+					return record[2], True
+			walk = self._walks.get(key)
+			if walk is None:
+				if key in self._truncated:
+					return self._truncated[key], False
+				walk = self._start_walk(os_path, key)
+			if record is not None and record[2] is not None:
+				# The total from a previous session. It's likely still correct:
+				return record[2], False
+			return walk.num_bytes, False
+	def invalidate(self, dir_path):
+		"""
+		Notify us that files were added to, removed from or changed in the
+		given directory. Walks the affected directories again.
+		"""
+		with self._lock:
+			affected = [
+				(os_path, key) for os_path, key in self._requested.items()
+				if _is_in_or_below(dir_path, os_path)
+			]
+		if not affected:
+			return
+		top = min(os_path for os_path, _ in affected)
+		# Forget the totals of the directory and of its ancestors:
+		keys = set()
+		path = dir_path
+		while True:
+			try:
+				keys.add(_get_key(os.lstat(path)))
+			except OSError:
+				pass
+			parent = dirname(path)
+			if path == top or parent == path:
+				break
+			path = parent
+		with self._lock:
+			self._validated -= keys
+			for os_path, key in affected:
+				if key in self._truncated:
+					# Too large to be walked again and again:
+					continue
+				walk = self._walks.get(key)
+				if walk is None:
+					self._start_walk(os_path, key)
+				else:
+					walk.is_stale = True
+	def flush(self):
+		with self._flush_lock:
+			with self._lock:
+				if not self._changed:
+					return
+				changed, self._changed = self._changed, {}
+				self._flushed_at = time()
+				num_appended = self._num_appended
+				if num_appended is None or \
+					num_appended + len(changed) > len(self._records):
+					# Copy the records because the walks keep changing them:
+					records = OrderedDict(self._records)
+					self._num_appended = 0
+				else:
+					records = None
+					self._num_appended = num_appended + len(changed)
+			try:
+				if records is None:
+					data = pickle.dumps(changed, pickle.HIGHEST_PROTOCOL)
+					with open(self._index_path, 'ab') as f:
+						f.write(data)
+				else:
+					write_pickle(self._index_path, records, _FORMAT_VERSION)
+			except OSError:
+				with self._lock:
+					# We don't know what was written. Start over next time:
+					self._num_appended = None
+					changed.update(self._changed)
+					self._changed = changed
+				raise
+	def _get_records(self):
+		# Must be called with self._lock held.
+		if self._records is None:
+			self._records = self._read()
+			while len(self._records) > self._max_records:
+				self._records.popitem(last=False)
+		return self._records
+	def _read(self):
+		"""
+		Read the index written by #flush(): The records written in full,
+		followed by those appended since.
+		"""
+		try:
+			f = open(self._index_path, 'rb')
+		except OSError:
+			return OrderedDict()
+		with f:
+			try:
+				format_version, records = pickle.load(f)
+				if format_version != _FORMAT_VERSION:
+					return OrderedDict()
+			except Exception:
+				# The file can't be read or is corrupt. Start over:
+				return OrderedDict()
+			num_appended = 0
+			while True:
+				try:
+					changed = pickle.load(f)
+				except EOFError:
+					break
+				except Exception:
+					# For instance because fman was killed while appending.
+					# Keep what we have, but rewrite the file on #flush():
+					num_appended = None
+					break
+				for key, record in changed.items():
+					records[key] = record
+					records.move_to_end(key)
+				num_appended += len(changed)
+		self._num_appended = num_appended
+		return records
+	def _start_walk(self, os_path, key):
+		# Must be called with self._lock held.
+		result = self._walks[key] = _Walk(os_path, key)
+		self._queue.put(result)
+		if len(self._threads) < self._num_threads:
+			# Daemon threads, so fman can quit while large trees are walked:
+			thread = Thread(target=self._work, daemon=True)
+			self._threads.append(thread)
+			thread.start()
+		return result
+	def _work(self):
+		while True:
+			walk = self._queue.get()
+			is_complete = is_truncated = False
+			try:
+				is_truncated = self._compute(walk) is None
+				is_complete = True
+			except Exception:
+				# Don't let the error end this thread. It would not be replaced.
+				_LOG.exception('Could not compute the size of %s.', walk.os_path)
+			finally:
+				with self._lock:
+					del self._walks[walk.key]
+					if is_truncated:
+						self._truncated[walk.key] = walk.num_bytes
+					elif is_complete and walk.is_stale:
+						self._start_walk(walk.os_path, walk.key)
+					is_flush_due = time() - self._flushed_at > _FLUSH_INTERVAL
+			if not is_complete:
+				# Don't call on_change(...). It would make the caller #get(...)
+				# the total again, and thus start another walk that fails.
+				continue
+			self._on_change(walk.os_path)
+			if is_flush_due:
+				try:
+					self.flush()
+				except OSError:
+					pass
+	def _compute(self, walk):
+		# Return the total, or None if the walk stopped after max_walk_dirs.
+		# Use an explicit stack instead of recursion: Directory trees can be
+		# deeper than Python's recursion limit. Each frame is a list
+		# [os_path, key, files_size, subdirs, subdirs_iterator, total].
+		seen = {walk.key}
+		stack = [self._enter(walk.os_path, walk.key, walk)]
+		while True:
+			frame = stack[-1]
+			os_path, key, files_size, subdirs, subdirs_iter, _ = frame
+			for name, child_key in subdirs_iter:
+				if child_key in seen:
+					# For instance a bind mount of an ancestor directory. Don't
+					# walk it (again):
+					continue
+				seen.add(child_key)
+				with self._lock:
+					record = self._records.get(child_key)
+					if record is not None and child_key in self._validated:
+						child_total = record[2]
+					else:
+						child_total = None
+				if child_total is None:
+					if walk.num_dirs >= self._max_walk_dirs:
+						# The records of the directories walked so far are
+						# complete. So they are kept:
+						return None
+					stack.append(
+						self._enter(join(os_path, name), child_key, walk)
+					)
+					break
+				self._add_progress(walk, child_total)
+				frame[5] += child_total
+			else:
+				stack.pop()
+				total = frame[5]
+				with self._lock:
+					self._put_record(key, (files_size, subdirs, total))
+				if not stack:
+					return total
+				stack[-1][5] += total
+	def _put_record(self, key, record):
+		# Must be called with self._lock held.
+		records = self._records
+		records[key] = record
+		records.move_to_end(key)
+		self._validated.add(key)
+		self._changed[key] = record
+		while len(records) > self._max_records:
+			evicted, _ = records.popitem(last=False)
+			self._validated.discard(evicted)
+			self._changed.pop(evicted, None)
+	def _enter(self, os_path, key, walk):
+		walk.num_dirs += 1
+		files_size, subdirs = self._scan(os_path, key[0])
+		self._add_progress(walk, files_size)
+		return [os_path, key, files_size, subdirs, iter(subdirs), files_size]
+	def _scan(self, os_path, st_dev):
+		"""
+		Return the size of the files directly inside the given directory, and
+		its subdirectories on the same device (like `du -x`).
+		"""
+		files_size = 0
+		subdirs = []
+		try:
+			with os.scandir(os_path) as entries:
+				for entry in entries:
+					try:
+						if entry.is_dir(follow_symlinks=False):
+							# Not entry.stat(): Its st_ino is 0 on Windows.
+							child_st = os.lstat(entry.path)
+							if child_st.st_dev == st_dev:
+								child_key = _get_key(child_st)
+								subdirs.append((entry.name, child_key))
+						else:
+							stat = entry.stat(follow_symlinks=False)
+							files_size += stat.st_size
+					except OSError:
+						continue
+		except OSError:
+			# For instance because we don't have permission to list the
+			# directory. Count it as empty.
+			pass
+		return files_size, tuple(subdirs)
+	def _add_progress(self, walk, num_bytes):
+		walk.num_bytes += num_bytes
+		now = time()
+		if now - walk.notified_at >= _NOTIFY_INTERVAL:
+			walk.notified_at = now
+			self._on_change(walk.os_path)
+
+_FORMAT_VERSION = 2
+
+# In seconds:
+_NOTIFY_INTERVAL = .5
+_FLUSH_INTERVAL = 60
+
+def _get_key(st):
+	return st.st_dev, st.st_ino
+
+def _is_in_or_below(path, dir_path):
+	prefix = dir_path if dir_path.endswith(sep) else dir_path + sep
+	return path == dir_path or path.startswith(prefix)
+
+class _Walk:
+
+	__slots__ = (
+		'os_path', 'key', 'num_bytes', 'num_dirs', 'notified_at', 'is_stale'
+	)
+
+	def __init__(self, os_path, key):
+		self.os_path = os_path
+		self.key = key
+		self.num_bytes = 0
+		self.num_dirs = 0
+		self.notified_at = time()
+		self.is_stale = False
@@ -0,0 +1,101 @@
+from fman import PLATFORM
+from os.path import splitdrive
+
+import ctypes
+import ctypes.util
+import os
+
+def is_network_mount(os_path):
+	"""
+	Whether the given path lies on a network file system such as NFS or SMB.
+	The OS typically does not notify us of changes made on other machines.
+	"""
+	try:
+		if PLATFORM == 'Windows':
+			return _is_network_mount_windows(os_path)
+		if PLATFORM == 'Mac':
+			return _is_network_mount_mac(os_path)
+		return _is_network_mount_linux(os_path)
+	except (OSError, AttributeError):
+		# AttributeError: The C library does not have the function we need.
+		return False
+
+def _is_network_mount_windows(os_path):
+	drive = splitdrive(os_path)[0]
+	if drive.startswith('\\\\'):
+		# A UNC path such as \\server\share.
+		return True
+	if not drive:
+		return False
+	return ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == _DRIVE_REMOTE
+
+_DRIVE_REMOTE = 4
+
+def _is_network_mount_linux(os_path):
+	buffer = ctypes.create_string_buffer(_LINUX_STATFS_SIZE)
+	_check(_get_libc().statfs(os.fsencode(os_path), buffer), os_path)
+	# f_type is the first field of struct statfs:
+	f_type = ctypes.c_long.from_buffer(buffer).value & 0xffffffff
+	return f_type in _LINUX_NETWORK_FS_TYPES
+
+# Larger than sizeof(struct statfs) on all architectures:
+_LINUX_STATFS_SIZE = 256
+
+_LINUX_NETWORK_FS_TYPES = {
+	0x6969,     # NFS
+	0x517b,     # SMB
+	0xff534d42, # CIFS
+	0xfe534d42, # SMB2
+	0x73757245, # Coda
+	0x5346414f, # AFS
+	0x6b414653, # kAFS
+	0x564c,     # NCP
+	0x01021997, # 9P
+	0x00c36400  # Ceph
+}
+
+def _is_network_mount_mac(os_path):
+	libc = _get_libc()
+	try:
+		# On Intel Macs, the plain symbol uses an outdated struct layout:
+		statfs = getattr(libc, 'statfs$INODE64')
+	except AttributeError:
+		statfs = libc.statfs
+	result = _MacStatfs()
+	_check(statfs(os.fsencode(os_path), ctypes.byref(result)), os_path)
+	return not result.f_flags & _MAC_MNT_LOCAL
+
+_MAC_MNT_LOCAL = 0x1000
+
+class _MacStatfs(ctypes.Structure):
+	_fields_ = [
+		('f_bsize', ctypes.c_uint32),
+		('f_iosize', ctypes.c_int32),
+		('f_blocks', ctypes.c_uint64),
+		('f_bfree', ctypes.c_uint64),
+		('f_bavail', ctypes.c_uint64),
+		('f_files', ctypes.c_uint64),
+		('f_ffree', ctypes.c_uint64),
+		('f_fsid', ctypes.c_int32 * 2),
+		('f_owner', ctypes.c_uint32),
+		('f_type', ctypes.c_uint32),
+		('f_flags', ctypes.c_uint32),
+		('f_fssubtype', ctypes.c_uint32),
+		('f_fstypename', ctypes.c_char * 16),
+		('f_mntonname', ctypes.c_char * 1024),
+		('f_mntfromname', ctypes.c_char * 1024),
+		('f_reserved', ctypes.c_uint32 * 8)
+	]
+
+def _check(return_value, os_path):
+	if return_value != 0:
+		errno = ctypes.get_errno()
+		raise OSError(errno, os.strerror(errno), os_path)
+
+_LIBC = None
+
+def _get_libc():
+	global _LIBC
+	if _LIBC is None:
+		_LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+	return _LIBC
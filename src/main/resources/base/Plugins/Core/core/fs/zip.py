@@ -3,7 +3,7 @@ from core.os_ import is_arch, is_mac
 from core.util import filenotfounderror
 from datetime import datetime
 from fman import PLATFORM, load_json, Task
-from fman.fs import FileSystem
+from fman.fs import FileSystem, Stat
 from fman.url import as_url, splitscheme, as_human_readable, basename
 from io import UnsupportedOperation, FileIO, BufferedReader, TextIOWrapper
 from os.path import join, dirname
@@ -176,6 +176,47 @@ class _7ZipFileSystem(FileSystem):
 		return self._query_info_attr(path, 'size_bytes', None)
 	def modified_datetime(self, path):
 		return self._query_info_attr(path, 'mtime', None)
+	def stat_many(self, paths):
+		# Answer the queries for all files in the same directory with a single
+		# invocation of 7-Zip:
+		paths_per_parent = {}
+		for path in paths:
+			try:
+				path_in_zip = self._split(path)[1]
+			except FileNotFoundError:
+				continue
+			if path_in_zip:
+				parent = path.rsplit('/', 1)[0]
+				paths_per_parent.setdefault(parent, []).append(
+					(path, path_in_zip)
+				)
+		result = {}
+		for parent, children in paths_per_parent.items():
+			infos = {}
+			implicit_dirs = set()
+			try:
+				for info in self._iter_infos(parent):
+					infos[info.path] = info
+					parents = PurePosixPath(info.path).parents
+					implicit_dirs.update(map(str, parents))
+			except FileNotFoundError:
+				continue
+			for path, path_in_zip in children:
+				try:
+					info = infos[path_in_zip]
+				except KeyError:
+					if path_in_zip not in implicit_dirs:
+						continue
+					# Mirror the defaults of #_query_info_attr(...):
+					stat = Stat(True, None, None)
+				else:
+					stat = Stat(info.is_dir, info.size_bytes, info.mtime)
+				result[path] = stat
+		return result
+	def dir_signature(self, path):
+		# Any change to the archive changes its size or mtime:
+		stat = os.stat(self._split(path)[0])
+		return stat.st_size, stat.st_mtime_ns
 	def _query_info_attr(self, path, attr, folder_default):
 		def compute_value():
 			path_in_zip = self._split(path)[1]
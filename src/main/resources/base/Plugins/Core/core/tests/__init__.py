@@ -81,4 +81,25 @@ class StubFS(FileSystem):
 		self._backends[scheme].mkdir(path)
 	def query(self, url, fs_method_name):
 		scheme, path = splitscheme(url)
-		return getattr(self._backends[scheme], fs_method_name)(path)
\ No newline at end of file
+		return getattr(self._backends[scheme], fs_method_name)(path)
+	def query_many(self, urls, fs_method_names):
+		result = {}
+		for url in urls:
+			values = []
+			try:
+				for fs_method_name in fs_method_names:
+					scheme = splitscheme(url)[0]
+					if not hasattr(self._backends[scheme], fs_method_name):
+						# Like MotherFileSystem#query_many(...):
+						values.append(None)
+						continue
+					try:
+						values.append(self.query(url, fs_method_name))
+					except FileNotFoundError:
+						raise
+					except OSError:
+						values.append(None)
+			except FileNotFoundError:
+				continue
+			result[url] = tuple(values)
+		return result
\ No newline at end of file
@@ -1,12 +1,15 @@
-from core import Name, Size, Modified
+from core import Name, Size, FolderSize, Modified, _NaturalKeyCache
 from core.tests import StubFS
 from core.tests.fs import StubFileSystem
 from fman.url import as_url
 from unittest import TestCase
 
 class ColumnTest:
+
+	fs_class = StubFileSystem
+
 	def setUp(self):
-		self._fs = StubFileSystem({
+		self._fs = self.fs_class({
 			'a': {
 				'is_dir': False, 'size': 1, 'mtime': 1473339042.0
 			},
@@ -21,8 +24,10 @@ class ColumnTest:
 			},
 			'b_dir': {
 				'is_dir': True, 'size': 4, 'mtime': 1473339046.0
-			}
-
+			},
+			'a_dir_2': {'is_dir': True},
+			'dir 2': {'is_dir': True},
+			'dir 10': {'is_dir': True}
 		})
 		self._column = self.column_class(StubFS(self._fs))
 	def assert_is_less(self, left, right, is_ascending=True):
@@ -92,6 +97,71 @@ class SizeTest(ColumnTest, TestCase):
 		self.check_less_than_chain(
 			'b', 'a', 'b_dir', 'a_dir', is_ascending=False
 		)
+	def test_get_strs(self):
+		urls = [as_url(path, StubFileSystem.scheme) for path in ('a', 'a_dir')]
+		self.assertEqual(
+			[self._column.get_str(url) for url in urls],
+			self._column.get_strs(urls)
+		)
+	def test_directories_by_natural_name(self):
+		self.assert_is_less('dir 2', 'dir 10')
+		self.assert_is_less('dir 10', 'dir 2', is_ascending=False)
+	def test_directory_name_prefix_descending(self):
+		self.assert_is_less('a_dir_2', 'a_dir', is_ascending=False)
+
+class NaturalKeyCacheTest(TestCase):
+	def test_keeps_keys_of_large_directory(self):
+		cache = _NaturalKeyCache(max_entries=2)
+		for name in ('a', 'b', 'c'):
+			cache.get('stub://large/' + name, name)
+		self.assertEqual(3, len(cache._dirs['stub://large']))
+		cache.get('stub://other/a', 'a')
+		self.assertEqual(['stub://other'], list(cache._dirs))
+	def test_natural_order(self):
+		cache = _NaturalKeyCache()
+		key_2 = cache.get('stub://file 2.txt', 'file 2.txt')
+		key_10 = cache.get('stub://file 10.txt', 'File 10.txt')
+		self.assertLess(key_2, key_10)
+
+class StubFileSystemWithFolderSizes(StubFileSystem):
+	def __init__(self, items):
+		super().__init__(items)
+		self.folder_sizes = {}
+	def folder_size(self, path):
+		try:
+			return self.folder_sizes[path]
+		except KeyError:
+			raise NotADirectoryError(path) from None
+
+class FolderSizeTest(SizeTest):
+
+	column_class = FolderSize
+	fs_class = StubFileSystemWithFolderSizes
+
+	def test_directories_by_folder_size(self):
+		self._fs.folder_sizes['a_dir'] = (2, True)
+		self._fs.folder_sizes['b_dir'] = (1, True)
+		self.check_less_than_chain('b_dir', 'a_dir', 'b')
+		self.check_less_than_chain(
+			'b', 'b_dir', 'a_dir', is_ascending=False
+		)
+	def test_get_str_partial(self):
+		url = as_url('a_dir', StubFileSystem.scheme)
+		self._fs.folder_sizes['a_dir'] = (1, False)
+		self.assertEqual('1 B…', self._column.get_str(url))
+		self._fs.folder_sizes['a_dir'] = (2, True)
+		self.assertEqual('2 B', self._column.get_str(url))
+	def test_get_strs_folder_sizes(self):
+		self._fs.folder_sizes['a_dir'] = (1, False)
+		self._fs.folder_sizes['b_dir'] = (2, True)
+		urls = [
+			as_url(path, StubFileSystem.scheme)
+			for path in ('a', 'a_dir', 'b_dir', 'dir 2')
+		]
+		self.assertEqual(
+			[self._column.get_str(url) for url in urls],
+			self._column.get_strs(urls)
+		)
 
 class ModifiedTest(ColumnTest, TestCase):
 
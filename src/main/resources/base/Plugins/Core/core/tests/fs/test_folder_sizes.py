@@ -0,0 +1,161 @@
+from core.fs.local.folder_sizes import FolderSizes, _get_key
+from os.path import join
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Event
+from unittest import TestCase
+
+import os
+import sys
+
+class FolderSizesTest(TestCase):
+	def test_get(self):
+		self._write('a.txt', 1)
+		self._write('sub/b.txt', 2)
+		self._write('sub/subsub/c.txt', 3)
+		self.assertEqual((6, True), self._get_final(self._dir))
+		self.assertEqual((5, True), self._sizes.get(join(self._dir, 'sub')))
+	def test_get_empty(self):
+		self.assertEqual((0, True), self._get_final(self._dir))
+	def test_get_file(self):
+		self._write('a.txt', 1)
+		with self.assertRaises(NotADirectoryError):
+			self._sizes.get(join(self._dir, 'a.txt'))
+	def test_get_nonexistent(self):
+		with self.assertRaises(FileNotFoundError):
+			self._sizes.get(join(self._dir, 'nonexistent'))
+	def test_invalidate(self):
+		self._write('sub/a.txt', 1)
+		self._write('other/b.txt', 2)
+		self._get_final(self._dir)
+		self._write('sub/c.txt', 4)
+		self._sizes.invalidate(join(self._dir, 'sub'))
+		self.assertEqual((7, True), self._get_final(self._dir))
+	def test_invalidate_unrelated_directory(self):
+		self._write('a.txt', 1)
+		self._get_final(self._dir)
+		self._sizes.invalidate(self._tmp_dir)
+		self.assertEqual((1, True), self._sizes.get(self._dir))
+	def test_flush(self):
+		self._write('sub/a.txt', 1)
+		self._get_final(self._dir)
+		self._sizes.flush()
+		sizes = FolderSizes(self._index_path, lambda os_path: None)
+		# The total is displayed immediately, but revalidated:
+		self.assertEqual((1, False), sizes.get(self._dir))
+	def test_flush_appends_changes(self):
+		self._write('sub/a.txt', 1)
+		self._write('other/b.txt', 2)
+		self._get_final(self._dir)
+		self._sizes.flush()
+		size_before = os.path.getsize(self._index_path)
+		self._write('sub/c.txt', 4)
+		self._sizes.invalidate(join(self._dir, 'sub'))
+		self.assertEqual((7, True), self._get_final(self._dir))
+		self._sizes.flush()
+		self.assertGreater(os.path.getsize(self._index_path), size_before)
+		sizes = FolderSizes(*self._args)
+		self.assertEqual((7, False), sizes.get(self._dir))
+	def test_partially_appended_index(self):
+		self._write('a.txt', 1)
+		self._get_final(self._dir)
+		self._sizes.flush()
+		with open(self._index_path, 'ab') as f:
+			f.write(b'\x80partial')
+		sizes = FolderSizes(*self._args)
+		self.assertEqual((1, False), sizes.get(self._dir))
+	def test_max_records(self):
+		for name in ('a', 'b', 'c'):
+			self._write(name + '/file.txt', 1)
+		self._sizes = FolderSizes(*self._args, max_records=2)
+		for name in ('a', 'b', 'c'):
+			path = join(self._dir, name)
+			self.assertEqual((1, True), self._get_final(path))
+		self.assertEqual(2, len(self._sizes._records))
+		# The least recently used record was evicted. It is computed again:
+		self.assertEqual((1, True), self._get_final(join(self._dir, 'a')))
+	def test_max_walk_dirs(self):
+		self._write('a/b/c.txt', 1)
+		self._write('d.txt', 2)
+		self._sizes = FolderSizes(*self._args, max_walk_dirs=2)
+		self._sizes.get(self._dir)
+		self.assertTrue(self._changed.wait(5))
+		# The walk stopped before b, and is not started again:
+		self.assertEqual((2, False), self._sizes.get(self._dir))
+		self.assertEqual({}, self._sizes._walks)
+		# Its subdirectories can still be walked on their own:
+		self._changed.clear()
+		self.assertEqual((1, True), self._get_final(join(self._dir, 'a')))
+	def test_corrupt_index(self):
+		with open(self._index_path, 'wb') as f:
+			f.write(b'not a pickle')
+		self._write('a.txt', 1)
+		self.assertEqual((1, True), self._get_final(self._dir))
+	def test_cycle(self):
+		# Simulate a bind mount of the directory inside itself:
+		root_key = _get_key(os.lstat(self._dir))
+		def scan(os_path):
+			if os_path == self._dir:
+				return 1, (('a', (0, 1)),)
+			return 2, (('loop', root_key), ('a', (0, 1)))
+		self._sizes = FolderSizesWithStubScan(scan, *self._args)
+		self.assertEqual((3, True), self._get_final(self._dir))
+	def test_deep_tree(self):
+		depth = 2 * sys.getrecursionlimit()
+		def scan(os_path):
+			level = (len(os_path) - len(self._dir)) // 2
+			if level < depth:
+				return 1, (('d', (0, level + 1)),)
+			return 1, ()
+		self._sizes = FolderSizesWithStubScan(scan, *self._args)
+		self.assertEqual((depth + 1, True), self._get_final(self._dir))
+	def test_error_does_not_end_thread(self):
+		self._write('a/a.txt', 1)
+		self._write('b/b.txt', 2)
+		failing_dir = join(self._dir, 'a')
+		def scan(os_path):
+			if os_path == failing_dir:
+				raise RuntimeError()
+			return FolderSizes._scan(self._sizes, os_path, 0)
+		self._sizes = FolderSizesWithStubScan(scan, *self._args, num_threads=1)
+		with self.assertLogs(level='ERROR'):
+			self._sizes.get(failing_dir)
+			self.assertEqual((2, True), self._get_final(join(self._dir, 'b')))
+		# The failed walk is not in progress anymore, so is started again:
+		self._write('c/c.txt', 4)
+		with self.assertLogs(level='ERROR'):
+			self.assertEqual((0, False), self._sizes.get(failing_dir))
+			self.assertEqual((4, True), self._get_final(join(self._dir, 'c')))
+	def setUp(self):
+		super().setUp()
+		self._tmp_dir = mkdtemp()
+		self._dir = join(self._tmp_dir, 'dir')
+		Path(self._dir).mkdir()
+		self._index_path = join(self._tmp_dir, 'Folder Sizes.bin')
+		self._changed = Event()
+		self._args = self._index_path, self._on_change
+		self._sizes = FolderSizes(*self._args)
+	def tearDown(self):
+		rmtree(self._tmp_dir)
+		super().tearDown()
+	def _write(self, rel_path, num_bytes):
+		path = Path(self._dir, rel_path)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		path.write_bytes(b'x' * num_bytes)
+	def _on_change(self, os_path):
+		self._changed.set()
+	def _get_final(self, os_path, timeout=5):
+		result = self._sizes.get(os_path)
+		while not result[1]:
+			self.assertTrue(self._changed.wait(timeout))
+			self._changed.clear()
+			result = self._sizes.get(os_path)
+		return result
+
+class FolderSizesWithStubScan(FolderSizes):
+	def __init__(self, scan, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._stub_scan = scan
+	def _scan(self, os_path, st_dev):
+		return self._stub_scan(os_path)
@@ -18,6 +18,55 @@ class LocalFileSystemTest(TestCase):
 		path = root + 'nonexistent'
 		with self.assertRaises(FileNotFoundError):
 			next(iter(self._fs.iterdir(path)))
+	def test_iterdir_caches_is_dir(self):
+		with TemporaryDirectory() as tmp_dir:
+			Path(tmp_dir, 'dir').mkdir()
+			Path(tmp_dir, 'file').touch()
+			dir_path = _urlpath(tmp_dir)
+			self.assertEqual(
+				{'dir', 'file'}, set(self._fs.iterdir(dir_path))
+			)
+			# Show that is_dir(...) doesn't need to stat(...) the files:
+			os.rmdir(os.path.join(tmp_dir, 'dir'))
+			os.remove(os.path.join(tmp_dir, 'file'))
+			self.assertIs(True, self._fs.is_dir(dir_path + '/dir'))
+			self.assertIs(False, self._fs.is_dir(dir_path + '/file'))
+	def test_caches_one_entry_per_file(self):
+		with TemporaryDirectory() as tmp_dir:
+			Path(tmp_dir, 'file').write_bytes(b'1234')
+			path = _urlpath(tmp_dir) + '/file'
+			self.assertIs(False, self._fs.is_dir(path))
+			self.assertEqual(4, self._fs.size_bytes(path))
+			self._fs.modified_datetime(path)
+			self.assertEqual(4, self._fs.stat(path).st_size)
+			self.assertEqual(1, self._fs.cache.get_stats().num_entries)
+	def test_iterdir_keeps_full_stat(self):
+		with TemporaryDirectory() as tmp_dir:
+			Path(tmp_dir, 'file').write_bytes(b'1234')
+			dir_path = _urlpath(tmp_dir)
+			stat = self._fs.stat(dir_path + '/file')
+			list(self._fs.iterdir(dir_path))
+			self.assertIs(stat, self._fs.stat(dir_path + '/file'))
+	def test_dir_signature(self):
+		with TemporaryDirectory() as tmp_dir:
+			dir_path = _urlpath(tmp_dir)
+			signature = self._fs.dir_signature(dir_path)
+			self.assertEqual(signature, self._fs.dir_signature(dir_path))
+			# Make sure the mtime differs even on coarse-grained file systems:
+			mtime_ns = signature[0] - 10 ** 9
+			os.utime(tmp_dir, ns=(mtime_ns, mtime_ns))
+			signature = self._fs.dir_signature(dir_path)
+			Path(tmp_dir, 'file').touch()
+			self.assertNotEqual(signature, self._fs.dir_signature(dir_path))
+	def test_folder_sizes_not_created_until_needed(self):
+		with TemporaryDirectory() as tmp_dir:
+			self._fs.mkdir(_urlpath(tmp_dir) + '/dir')
+			self._fs.touch(_urlpath(tmp_dir) + '/dir/file')
+			self.assertIsNone(self._fs._folder_sizes)
+	def test_get_cache_policy_local_directory(self):
+		with TemporaryDirectory() as tmp_dir:
+			policy = self._fs.get_cache_policy(_urlpath(tmp_dir))
+			self.assertIsNone(policy.max_age)
 	def test_empty_path_does_not_exist(self):
 		self.assertFalse(self._fs.exists(''))
 	def test_relative_paths(self):
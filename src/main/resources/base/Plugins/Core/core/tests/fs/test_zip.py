@@ -298,6 +298,19 @@ class ZipFileSystemTest(TestCase):
 	def test_modified_datetime_nonexistent_path_in_zip(self):
 		with self.assertRaises(FileNotFoundError):
 			self._fs.modified_datetime(self._path('nonexistent'))
+	def test_stat_many(self):
+		dir_, file_, nonexistent = paths = [
+			self._path('ZipFileTest/Directory'),
+			self._path('ZipFileTest/file.txt'),
+			self._path('ZipFileTest/nonexistent')
+		]
+		result = self._fs.stat_many(paths)
+		self.assertEqual({dir_, file_}, set(result))
+		self.assertTrue(result[dir_].is_dir)
+		self.assertFalse(result[file_].is_dir)
+		self.assertEqual(
+			self._fs.size_bytes(file_), result[file_].size_bytes
+		)
 	def test_resolve_nonexistent_zip_raises_filenotfounderror(self):
 		with self.assertRaises(FileNotFoundError):
 			tmp_url = as_url(self._tmp_dir.name)
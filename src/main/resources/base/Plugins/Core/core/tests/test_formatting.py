@@ -0,0 +1,44 @@
+from core.formatting import format_size, format_datetime
+from datetime import datetime
+from PyQt5.QtCore import QDateTime, QLocale
+from unittest import TestCase
+
+class FormatSizeTest(TestCase):
+	def test_bytes(self):
+		self.assertEqual('0 B', format_size(0))
+		self.assertEqual('999 B', format_size(999))
+	def test_kilobytes(self):
+		self.assertEqual('0 KB', format_size(1000))
+		self.assertEqual('1 KB', format_size(1024))
+		self.assertEqual('1 KB', format_size(2047))
+		self.assertEqual('976 KB', format_size(999999))
+	def test_megabytes(self):
+		self.assertEqual('1.0 MB', format_size(1000 ** 2))
+		self.assertEqual('1.5 MB', format_size(3 * 1024 ** 2 // 2))
+	def test_gigabytes(self):
+		self.assertEqual('2.0 GB', format_size(2 * 1024 ** 3))
+		self.assertEqual('2048.0 GB', format_size(2 * 1024 ** 4))
+	def test_unit_boundaries(self):
+		self.assertEqual('999 B', format_size(1000 - 1))
+		self.assertEqual('0 KB', format_size(1000))
+		self.assertEqual('976 KB', format_size(1000 ** 2 - 1))
+		self.assertEqual('1.0 MB', format_size(1000 ** 2))
+		self.assertEqual('953.7 MB', format_size(1000 ** 3 - 1))
+		self.assertEqual('0.9 GB', format_size(1000 ** 3))
+		self.assertEqual('931.3 GB', format_size(1000 ** 4))
+	def test_negative(self):
+		self.assertEqual('-1 B', format_size(-1))
+
+class FormatDatetimeTest(TestCase):
+	def test_same_as_qt(self):
+		datetime_ = datetime(2016, 9, 8, 13, 37, 42)
+		time_format = QLocale().dateTimeFormat(QLocale.ShortFormat)
+		expected = QDateTime.fromMSecsSinceEpoch(
+			int(datetime_.timestamp() * 1000)
+		).toString(time_format.replace('yyyy', 'yy'))
+		self.assertEqual(expected, format_datetime(datetime_))
+	def test_same_second(self):
+		self.assertEqual(
+			format_datetime(datetime(2016, 9, 8, 13, 37, 42, 1000)),
+			format_datetime(datetime(2016, 9, 8, 13, 37, 42, 999000))
+		)
@@ -22,6 +22,8 @@ class StubFileSystem(FileSystem):
 		except KeyError:
 			raise FileNotFoundError(path) from None
 		return list(items.get('files', []))
+	def dir_signature(self, path):
+		return self._items[normalize(path)].get('signature')
 	@cached # Mirror a typical implementation
 	def is_dir(self, existing_path):
 		path_resolved = normalize(existing_path)
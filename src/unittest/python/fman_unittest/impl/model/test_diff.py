@@ -1,5 +1,6 @@
 from fman.impl.model.diff import DiffEntry, ComputeDiff
 from itertools import chain, combinations
+from random import Random
 from unittest import TestCase
 
 class ComputeDiffTest(TestCase):
@@ -60,6 +61,16 @@ class ComputeDiffTest(TestCase):
 		before = [(0, 0), (1, 1), (2, 2), (3, 3)]
 		after = [(3, 3), (1, 4), (0, 5), (2, 6)]
 		self._check_diff(before, after)
+	def test_move_one_row_far(self):
+		rows = [(str(i), i) for i in range(100)]
+		new_rows = rows[1:50] + rows[:1] + rows[50:]
+		self._check_diff(rows, new_rows, [(0, 1, 49, [])])
+	def test_shuffle(self):
+		rows = [(str(i), i) for i in range(200)]
+		for seed in range(5):
+			new_rows = list(rows)
+			Random(seed).shuffle(new_rows)
+			self._check_diff(rows, new_rows)
 	def setUp(self):
 		super().setUp()
 		self._a = ('a', 1)
@@ -0,0 +1,23 @@
+from fman.impl.model.fenwick import FenwickTree
+from unittest import TestCase
+
+class FenwickTreeTest(TestCase):
+	def test_prefix_sum(self):
+		self.assertEqual([0, 3, 3, 7, 12], [
+			self._tree.prefix_sum(end) for end in range(5)
+		])
+	def test_add(self):
+		self._tree.add(1, 2)
+		self.assertEqual(3, self._tree.prefix_sum(1))
+		self.assertEqual(5, self._tree.prefix_sum(2))
+		self.assertEqual(14, self._tree.prefix_sum(4))
+	def test_search(self):
+		self.assertEqual((0, 2), self._tree.search(2))
+		self.assertEqual((2, 0), self._tree.search(3))
+		self.assertEqual((3, 4), self._tree.search(11))
+		self.assertEqual((4, 1), self._tree.search(13))
+	def setUp(self):
+		super().setUp()
+		self._tree = FenwickTree(4)
+		for i, value in enumerate((3, 0, 4, 5)):
+			self._tree.add(i, value)
@@ -0,0 +1,79 @@
+from fman.impl.model.file_watcher import FileWatcher
+from threading import Event
+from time import sleep, time
+from unittest import TestCase
+
+class FileWatcherTest(TestCase):
+	def test_reloads_once_for_many_changes(self):
+		for _ in range(10):
+			self._watcher._on_file_changed('stub://dir')
+		self.assertTrue(self._model.reloaded.wait(1))
+		self.assertEqual(1, self._model.num_reloads)
+	def test_reloads_again_after_delay(self):
+		self._watcher._on_file_changed('stub://dir')
+		self.assertTrue(self._model.reloaded.wait(1))
+		self._model.reloaded.clear()
+		self._watcher._on_file_changed('stub://dir')
+		self.assertTrue(self._model.reloaded.wait(1))
+		self.assertEqual(2, self._model.num_reloads)
+	def test_waits_until_changes_pause(self):
+		end = time() + .1
+		while time() < end:
+			self._watcher._on_file_changed('stub://dir')
+			sleep(.005)
+		self.assertTrue(self._model.reloaded.wait(1))
+		self.assertEqual(1, self._model.num_reloads)
+		self.assertGreaterEqual(self._model.reloaded_at, end)
+	def test_reloads_while_changes_keep_coming(self):
+		watcher = FileWatcher(
+			StubFS(), self._model, reload_delay=.01, max_reload_delay=.05
+		)
+		end = time() + .3
+		while time() < end:
+			watcher._on_file_changed('stub://dir')
+			sleep(.005)
+		watcher.shutdown()
+		self.assertGreaterEqual(self._model.num_reloads, 2)
+		self.assertLessEqual(self._model.num_reloads, 6)
+	def test_delay_grows_while_changes_keep_coming(self):
+		for expected_delay in (.01, .02, .04):
+			self._watcher._on_file_changed('stub://dir')
+			self.assertEqual(expected_delay, self._watcher._reload_delay)
+			self.assertTrue(self._model.reloaded.wait(1))
+			self._model.reloaded.clear()
+		sleep(.05)
+		self._watcher._on_file_changed('stub://dir')
+		self.assertEqual(.01, self._watcher._reload_delay)
+	def test_shutdown_cancels_reload(self):
+		self._watcher._on_file_changed('stub://dir')
+		self._watcher.shutdown()
+		self.assertFalse(self._model.reloaded.wait(.05))
+	def test_columns_changed(self):
+		self._watcher._on_columns_changed('stub://dir/a')
+		self._watcher._on_columns_changed('stub://other/b')
+		self.assertEqual(['stub://dir/a'], self._model.reloaded_columns)
+		self.assertEqual(0, self._model.num_reloads)
+	def setUp(self):
+		super().setUp()
+		self._model = StubModel('stub://dir')
+		self._watcher = FileWatcher(StubFS(), self._model, reload_delay=.01)
+
+class StubModel:
+	def __init__(self, location):
+		self._location = location
+		self.num_reloads = 0
+		self.reloaded = Event()
+		self.reloaded_at = None
+		self.reloaded_columns = []
+	def get_location(self):
+		return self._location
+	def reload_changed(self):
+		self.num_reloads += 1
+		self.reloaded_at = time()
+		self.reloaded.set()
+	def reload_columns(self, url):
+		self.reloaded_columns.append(url)
+
+class StubFS:
+	def remove_file_changed_callback(self, url, callback):
+		raise ValueError()
@@ -1,11 +1,17 @@
 from fman.fs import Column
 from fman.impl.model import Model, Cell
 from fman.impl.model.model import File, _NOT_LOADED
+from fman.impl.model.sorted_table import SortFilterTableModel
+from fman.impl.plugins.builtin import NullColumn
+from fman.impl.plugins.mother_fs import MotherFileSystem
+from fman.impl.util import filenotfounderror
 from fman.impl.util.qt.thread import Executor
 from fman.url import splitscheme
 from fman_unittest.impl.model import StubFileSystem
-from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtCore import QObject, pyqtSignal, QPersistentModelIndex, Qt
 from random import shuffle, random
+from threading import Lock
+from time import sleep
 from unittest import TestCase
 
 import random
@@ -50,6 +56,16 @@ class ModelRecordFilesTest(TestCase):
 		self._expect_data([('a',), ('b',), ('c',)])
 		self._model._record_files([], ['s://c', 's://b'])
 		self._expect_data([('a',)])
+	def test_add_filter_is_synchronous(self):
+		self._model._record_files([
+			f('s://a', [c('a', 0)]),
+			f('s://b', [c('b', 1)])
+		])
+		add_filter = Model.add_filter.__wrapped__
+		add_filter(self._model, lambda url: url != 's://a')
+		# The rows must be filtered when the transaction ends. Not in a later
+		# one:
+		self._expect_data([('b',)])
 	def test_complex(self):
 		e = f('s://e', [c('e', 4)])
 		self._model._record_files([
@@ -106,6 +122,45 @@ class ModelRecordFilesTest(TestCase):
 		]
 		self._model._record_files(new_files, disappeared=['s://1'])
 		self._expect_data([('3',), ('0',), ('2',)])
+	def test_num_rows_pending(self):
+		self._model._record_files([
+			f('s://a', [c('a', 0)]),
+			f('s://b', [c('b', 1)], True),
+			f('s://c', [c('c', 2)])
+		])
+		self.assertEqual(2, self._model.get_num_rows_pending())
+		self._model._record_files([f('s://a', [c('A', 0)], True)], ['s://c'])
+		self.assertEqual(0, self._model.get_num_rows_pending())
+	def test_sort_updates_persistent_indexes(self):
+		self._model._record_files([
+			f('s://%d' % i, [c(str(i), i, i)], True) for i in range(3)
+		])
+		index = QPersistentModelIndex(self._model.index(0, 0))
+		SortFilterTableModel.sort(self._model, 0, Qt.DescendingOrder)
+		self._expect_data([('2',), ('1',), ('0',)])
+		self.assertEqual(2, index.row())
+	def test_update_narrowed(self):
+		self._model._record_files([
+			f('s://%d' % i, [c(str(i), i)], True) for i in range(10)
+		])
+		self._model._filters.append(lambda url: url[-1] in '0145689')
+		self._model._filters.append(lambda url: url[-1] != '9')
+		SortFilterTableModel.update_narrowed(self._model)
+		self._expect_data([(str(i),) for i in (0, 1, 4, 5, 6, 8)])
+	def test_pop_pending_urls_near_viewport_first(self):
+		self._model._record_files([
+			f('s://%d' % i, [c(str(i), i)]) for i in range(10)
+		])
+		self._model.set_viewport(5, 7)
+		self.assertEqual(
+			['s://5', 's://6', 's://7', 's://4'],
+			self._model._pop_pending_urls(4)
+		)
+		self._model.set_viewport(0, 1)
+		self.assertEqual(
+			['s://0', 's://1', 's://2'], self._model._pop_pending_urls(3)
+		)
+		self.assertEqual(3, self._model.get_num_rows_pending())
 	def test_random(self):
 		for num in list(range(6)) + [100]:
 			self._test_random(num)
@@ -155,6 +210,125 @@ class ModelRecordFilesTest(TestCase):
 		]
 		self.assertEqual(expected, actual, message)
 
+class ModelStreamingInitTest(TestCase):
+	def test_streams_rows(self):
+		self._model.rowsInserted.connect(self._on_rows_inserted)
+		self._model.transaction_ended.add_callback(self._on_transaction_ended)
+		init = Model._init.__wrapped__
+		init(self._model, self._callback, 0, 0)
+		self.assertGreater(len(self._num_rows_inserted), 1)
+		self.assertEqual(10, sum(self._num_rows_inserted))
+		self.assertEqual(['callback', 'transaction_ended'], self._events)
+		self.assertEqual(10, self._model.rowCount())
+	def test_location_disappears_while_streaming(self):
+		self._fs.delete_after = 5
+		disappeared = []
+		self._model.location_disappeared.connect(disappeared.append)
+		self._model.transaction_ended.add_callback(self._on_transaction_ended)
+		init = Model._init.__wrapped__
+		init(self._model, self._callback, 0, 0)
+		self.assertEqual(['s://'], disappeared)
+		self.assertEqual(['transaction_ended'], self._events)
+		self.assertFalse(self._model._is_streaming)
+	def test_location_disappeared_since_snapshot(self):
+		self._fs.delete_after = 0
+		self._model._read_snapshot = lambda: {'s://0': f('s://0', [c('0')])}
+		disappeared = []
+		self._model.location_disappeared.connect(disappeared.append)
+		self._model.transaction_ended.add_callback(self._on_transaction_ended)
+		init = Model._init.__wrapped__
+		init(self._model, self._callback, 0, 0)
+		self.assertEqual(['s://'], disappeared)
+		self.assertEqual(['transaction_ended'], self._events)
+		self.assertFalse(self._model._is_streaming)
+	def setUp(self):
+		super().setUp()
+		self._app = StubApp()
+		self._executor_before = Executor._INSTANCE # Typically None
+		Executor._INSTANCE = Executor(self._app)
+		fs = MotherFileSystem(None)
+		self._fs = SlowIterdirFileSystem(10)
+		fs.add_child('s://', self._fs)
+		self._model = Model(fs, 's://', [Column()])
+		self._model._init_file = lambda url: f(url, [c(url)])
+		self._num_rows_inserted = []
+		self._events = []
+	def tearDown(self):
+		self._model.shutdown()
+		self._app.aboutToQuit.emit()
+		Executor._INSTANCE = self._executor_before
+		super().tearDown()
+	def _on_rows_inserted(self, parent, first, last):
+		self._num_rows_inserted.append(last - first + 1)
+	def _on_transaction_ended(self):
+		self._events.append('transaction_ended')
+	def _callback(self):
+		self._events.append('callback')
+
+class SlowIterdirFileSystem(StubFileSystem):
+
+	scheme = 's://'
+
+	def __init__(self, num_files):
+		super().__init__({str(i): {} for i in range(num_files)})
+		self._num_files = num_files
+		# Raise FileNotFoundError after listing this many files:
+		self.delete_after = None
+	def iterdir(self, path):
+		if self.delete_after == 0:
+			raise filenotfounderror(self.scheme + path)
+		return self._iterdir_slowly(path)
+	def _iterdir_slowly(self, path):
+		for i in range(self._num_files):
+			if i == self.delete_after:
+				raise filenotfounderror(self.scheme + path)
+			sleep(.001)
+			yield str(i)
+
+class ModelLoadConcurrentlyTest(TestCase):
+	def test_preserves_order(self):
+		urls = ['s://%d' % i for i in range(20)]
+		result = list(self._model._load_concurrently(urls))
+		self.assertEqual(urls, [url for url, _ in result])
+		self.assertEqual(
+			[url for url in urls if url != 's://13'],
+			[file_.url for _, file_ in result if file_ is not None]
+		)
+	def test_respects_max_concurrency(self):
+		query_many = self._fs.query_many
+		self._fs.query_many = lambda *args: self._slowly(query_many, *args)
+		list(self._model._load_concurrently(['s://%d' % i for i in range(12)]))
+		self.assertEqual(3, self._max_num_threads)
+	def test_evaluates_columns_serially(self):
+		load_file = self._model._load_file
+		self._model._load_file = lambda *args: self._slowly(load_file, *args)
+		list(self._model._load_concurrently(['s://%d' % i for i in range(12)]))
+		self.assertEqual(1, self._max_num_threads)
+	def setUp(self):
+		super().setUp()
+		self._fs = MotherFileSystem(None)
+		self._fs.add_child(
+			's://', StubFileSystem({str(i): {} for i in range(20)})
+		)
+		self._model = Model(self._fs, 'null://', [NullColumn()])
+		self._model._max_concurrency = 3
+		self._model._load_file = self._load_file
+		self._num_threads = self._max_num_threads = 0
+		self._num_threads_lock = Lock()
+	def _load_file(self, url, stat=None, strs=None):
+		if url == 's://13':
+			raise FileNotFoundError(url)
+		return f(url, [c(url)], True)
+	def _slowly(self, f, *args):
+		with self._num_threads_lock:
+			self._num_threads += 1
+			self._max_num_threads = \
+				max(self._max_num_threads, self._num_threads)
+		sleep(.01)
+		with self._num_threads_lock:
+			self._num_threads -= 1
+		return f(*args)
+
 def f(url, cells, is_loaded=False, is_dir=False):
 	return File(url, None, is_dir, cells, is_loaded)
 
@@ -0,0 +1,29 @@
+from fman.impl.model.prefix_index import PrefixIndex
+from unittest import TestCase
+
+class PrefixIndexTest(TestCase):
+	def test_find(self):
+		self._index.add([('Foo', 1), ('foobar', 2), ('bar', 3), ('fo', 4)])
+		self.assertEqual({1, 2}, set(self._index.find('foo')))
+		self.assertEqual({1, 2, 4}, set(self._index.find('F')))
+		self.assertEqual([], self._index.find('x'))
+		self.assertEqual(4, len(self._index.find('')))
+		self.assertEqual(2, self._index.count('FOO'))
+		self.assertEqual(0, self._index.count('x'))
+		self.assertEqual(4, self._index.count(''))
+	def test_same_string(self):
+		self._index.add([('a', 1), ('A', 2)])
+		self._index.remove([('a', 1)])
+		self.assertEqual([2], self._index.find('a'))
+	def test_many(self):
+		items = [(str(i), i) for i in range(1000)]
+		self._index.add(items[::2])
+		self._index.add(items[1::2])
+		expected = {1} | set(range(10, 20)) | set(range(100, 200))
+		self.assertEqual(expected, set(self._index.find('1')))
+		self._index.remove(items[100:])
+		self.assertEqual(100, len(self._index))
+		self.assertEqual([5, 50, 51], self._index.find('5')[:3])
+	def setUp(self):
+		super().setUp()
+		self._index = PrefixIndex()
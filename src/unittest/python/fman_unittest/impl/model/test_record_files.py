@@ -10,6 +10,11 @@ class Lvl1SortValuesTest(TestCase):
 		s = Lvl1SortValues(None, None, [0])
 		self.assertEqual(1, s._get_original_index(0))
 		self.assertEqual(2, s._get_original_index(1))
+	def test_several_removed(self):
+		s = Lvl1SortValues(None, None, [5, 1, 2])
+		self.assertEqual(
+			[0, 3, 4, 6, 7], [s._get_original_index(i) for i in range(5)]
+		)
 
 class GetMovesForTransformingTest(TestCase):
 	def test_permutations(self):
@@ -27,6 +32,11 @@ class GetMovesForTransformingTest(TestCase):
 			'***F*****D***E***H*B*AC****G**',
 			'*A****B***C**DE*****F*G******H'
 		)
+	def test_all_letters(self):
+		letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+		self._test(
+			'**'.join(letters) + '***', '*'.join(reversed(letters)) + '*' * 28
+		)
 	def _test(self, curr, goal):
 		moves = get_moves_for_transforming(self._parse(curr), self._parse(goal))
 		result = self._apply(moves, curr)
@@ -0,0 +1,51 @@
+from fman.impl.model.snapshots import SnapshotStore
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+class SnapshotStoreTest(TestCase):
+	def test_get_nonexistent(self):
+		self.assertIsNone(self._store.get('s://a', ['Name']))
+	def test_put_get(self):
+		self._store.put('s://a', ['Name'], [('1', False, ['1'])])
+		self.assertEqual(
+			[('1', False, ['1'])], self._store.get('s://a', ['Name'])
+		)
+	def test_different_columns(self):
+		self._store.put('s://a', ['Name'], [('1', False, ['1'])])
+		self.assertIsNone(self._store.get('s://a', ['Name', 'Size']))
+	def test_evicts_least_recently_used(self):
+		# Enough space for two of the snapshots below, but not for three:
+		store = SnapshotStore(self._path, max_bytes=250)
+		rows = [('1', False, ['x' * 50])]
+		store.put('s://a', ['Name'], rows)
+		store.put('s://b', ['Name'], rows)
+		store.get('s://a', ['Name'])
+		store.put('s://c', ['Name'], rows)
+		self.assertIsNotNone(store.get('s://a', ['Name']))
+		self.assertIsNone(store.get('s://b', ['Name']))
+		self.assertIsNotNone(store.get('s://c', ['Name']))
+	def test_unpicklable(self):
+		self._store.put('s://a', ['Name'], [('1', False, [lambda: None])])
+		self.assertIsNone(self._store.get('s://a', ['Name']))
+	def test_flush(self):
+		self._store.put('s://a', ['Name'], [('1', True, ['1'])])
+		self._store.flush()
+		store = SnapshotStore(self._path)
+		self.assertEqual([('1', True, ['1'])], store.get('s://a', ['Name']))
+	def test_corrupt_file(self):
+		with open(self._path, 'wb') as f:
+			f.write(b'not a pickle')
+		store = SnapshotStore(self._path)
+		self.assertIsNone(store.get('s://a', ['Name']))
+		store.put('s://a', ['Name'], [])
+		self.assertEqual([], store.get('s://a', ['Name']))
+	def setUp(self):
+		super().setUp()
+		self._tmp_dir = mkdtemp()
+		self._path = join(self._tmp_dir, 'Snapshots.bin')
+		self._store = SnapshotStore(self._path)
+	def tearDown(self):
+		rmtree(self._tmp_dir)
+		super().tearDown()
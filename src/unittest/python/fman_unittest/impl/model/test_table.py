@@ -1,5 +1,6 @@
 from collections import namedtuple
-from fman.impl.model.table import _get_move_destination, TableModel
+from fman.impl.model.table import _get_move_destination, TableModel, Rows, \
+	Cell, _MIN_BLOCK_SIZE
 from unittest import TestCase
 
 class GetMoveDestinationTest(TestCase):
@@ -84,12 +85,91 @@ class TableModelTest(TestCase):
 		self._expect_rows([b])
 		self._model.remove_rows(0, 1)
 		self._expect_rows([])
+	def test_find_prefix(self):
+		rows = [Row(key) for key in ('b', 'Ab', 'ac', 'a')]
+		self._model.insert_rows(rows)
+		self.assertEqual(1, self._model.find_prefix('a'))
+		self.assertEqual(2, self._model.find_prefix('AC'))
+		self.assertEqual(-1, self._model.find_prefix('c'))
+		self._model.remove_rows(0, 2)
+		self.assertEqual(0, self._model.find_prefix('a'))
+		self._model.update_rows([Row('c')], 0)
+		self.assertEqual(1, self._model.find_prefix('a'))
+		self.assertEqual(0, self._model.find_prefix('c'))
+	def test_find_prefix_accept(self):
+		rows = [Row(key) for key in ('b', 'Ab', 'ac', 'a')]
+		self._model.insert_rows(rows)
+		accepted = []
+		def accept(rownum):
+			accepted.append(rownum)
+			return rownum != 1
+		self.assertEqual(2, self._model.find_prefix('a', accept))
+		self.assertEqual([1, 2], accepted)
+		self.assertEqual(-1, self._model.find_prefix('b', lambda _: False))
+	def test_find_prefix_many_matches(self):
+		rows = [Row('b%d' % i) for i in range(1000)]
+		rows[500] = Row('a')
+		rows.append(Row('a0'))
+		self._model.insert_rows(rows)
+		self.assertEqual(0, self._model.find_prefix('b'))
+		self.assertEqual(2, self._model.find_prefix('b', lambda i: i > 1))
+		self.assertEqual(500, self._model.find_prefix('a'))
+		self.assertEqual(1000, self._model.find_prefix('a', lambda i: i > 500))
 	def setUp(self):
 		super().setUp()
 		self._model = StubTableModel(['Column 1'])
 	def _expect_rows(self, rows):
 		self.assertEqual(rows, self._model.get_rows())
 
+class RowsTest(TestCase):
+	def test_many_rows(self):
+		rows = [Row(i) for i in range(2000)]
+		self._rows.insert(rows[:1000], 0)
+		self._rows.insert(rows[1500:], 1000)
+		self._rows.insert(rows[1000:1500], 1000)
+		self._expect(rows)
+		self._rows.move(100, 1200, 800)
+		rows = rows[:100] + rows[1200:1900] + rows[100:1200] + rows[1900:]
+		self._expect(rows)
+		self._rows.remove(50, 1950)
+		self._expect(rows[:50] + rows[1950:])
+	def test_remove_merges_small_blocks(self):
+		rows = [Row(i) for i in range(5000)]
+		self._rows.insert(rows, 0)
+		# Leave only a few rows in each block:
+		for i in range(4990, 0, -10):
+			self._rows.remove(i - 8, i)
+			del rows[i - 8:i]
+		self._expect(rows)
+		num_blocks = len(self._rows._blocks)
+		self.assertLessEqual(num_blocks, len(rows) // _MIN_BLOCK_SIZE + 1)
+	def test_remove_many_blocks(self):
+		rows = [Row(i) for i in range(5000)]
+		self._rows.insert(rows, 0)
+		self._rows.remove(1, 4999)
+		self._expect([rows[0], rows[-1]])
+	def test_find_first(self):
+		rows = [Row(i) for i in range(2000)]
+		self._rows.insert(rows, 0)
+		self._rows.move(1500, 2000, 0)
+		keys = [1600, 1999, 3, 1200]
+		self.assertEqual(100, self._rows.find_first(keys))
+		self.assertEqual(499, self._rows.find_first(keys, lambda i: i > 100))
+		self.assertEqual(-1, self._rows.find_first([]))
+	def test_update_past_end(self):
+		a, b, c = Row('a'), Row('b'), Row('c')
+		self._rows.update([a, b], 0)
+		self._rows.update([c], 2)
+		self._expect([a, b, c])
+	def setUp(self):
+		super().setUp()
+		self._rows = Rows()
+	def _expect(self, rows):
+		self.assertEqual(rows, list(self._rows))
+		self.assertEqual(rows, [self._rows[i] for i in range(len(rows))])
+		for i, row in enumerate(rows):
+			self.assertEqual(i, self._rows.find(row.key))
+
 class StubSignal:
 	def emit(self, *args):
 		pass
@@ -117,4 +197,7 @@ class StubTableModel(TableModel):
 
 class Row(namedtuple('Row', ('key', 'value'))):
 	def __new__(cls, key, value=None):
-		return super(Row, cls).__new__(cls, key, value)
\ No newline at end of file
+		return super(Row, cls).__new__(cls, key, value)
+	@property
+	def cells(self):
+		return [Cell(str(self.key), None, None)]
\ No newline at end of file
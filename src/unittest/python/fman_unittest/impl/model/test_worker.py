@@ -0,0 +1,142 @@
+from fman.impl.model.worker import Worker, Scheduler
+from threading import Event
+from unittest import TestCase
+
+class WorkerTest(TestCase):
+	def test_fifo_within_priority(self):
+		for i in range(5):
+			self._worker.submit(2, self._log.append, i)
+		self._worker.submit(1, self._log.append, 'first')
+		self._run_queued()
+		self.assertEqual(['first', 0, 1, 2, 3, 4], self._log)
+	def test_kwargs(self):
+		self._worker.submit(1, lambda obj: self._log.append(obj), obj='x')
+		self._run_queued()
+		self.assertEqual(['x'], self._log)
+	def test_submit_once(self):
+		self.assertTrue(self._worker.submit_once('a', 1, self._log.append, 1))
+		self.assertFalse(self._worker.submit_once('a', 1, self._log.append, 2))
+		self._run_queued()
+		self.assertEqual([1], self._log)
+		self.assertEqual(1, self._worker.get_stats().num_coalesced)
+	def test_submit_once_while_running(self):
+		started = Event()
+		def task():
+			started.set()
+			self._can_continue.wait()
+			self._log.append(1)
+		self._worker.submit_once('a', 1, task)
+		self._worker.start()
+		started.wait()
+		# The first task is running, so it no longer counts as queued:
+		self.assertTrue(self._worker.submit_once('a', 1, self._log.append, 2))
+		self._can_continue.set()
+		self._worker.submit_and_wait(1, lambda: None)
+		self.assertEqual([1, 2], self._log)
+	def test_cancel_pending(self):
+		self._worker.submit(1, self._log.append, 1)
+		self._worker.submit_once('a', 1, self._log.append, 2)
+		self._worker.cancel_pending()
+		self._worker.submit_once('a', 1, self._log.append, 3)
+		self._run_queued()
+		self.assertEqual([3], self._log)
+		# Two tasks ran: The one above and the one submitted by #_run_queued():
+		self.assertEqual((0, 2, 0, 2), self._worker.get_stats())
+	def test_shutdown_from_task(self):
+		self._worker.start()
+		self._worker.submit_and_wait(1, self._worker.shutdown)
+		self.assertFalse(self._worker.submit_once('a', 1, self._log.append, 1))
+	def test_shutdown_releases_waiting_threads(self):
+		self._worker.submit(1, self._log.append, 1)
+		self._worker.shutdown()
+		self._worker.start()
+		# Must not block:
+		self._worker.submit_and_wait(1, self._log.append, 2)
+		self.assertEqual([], self._log)
+	def test_tasks_of_one_worker_do_not_overlap(self):
+		scheduler = Scheduler(4)
+		worker = Worker(scheduler)
+		running = []
+		def task(i):
+			running.append(i)
+			self._log.append(len(running))
+			running.remove(i)
+		for i in range(20):
+			worker.submit(1, task, i)
+		worker.start()
+		worker.submit_and_wait(2, lambda: None)
+		self.assertEqual([1] * 20, self._log)
+		self.assertLessEqual(scheduler.get_num_threads(), 4)
+	def test_stalled_task_does_not_block_other_workers(self):
+		scheduler = Scheduler(1, stall_timeout=.05)
+		stalled, other = Worker(scheduler), Worker(scheduler)
+		started = Event()
+		def stall():
+			started.set()
+			self._can_continue.wait()
+		stalled.submit(1, stall)
+		stalled.start()
+		started.wait()
+		other.start()
+		# Must not block until the stalled task finishes:
+		other.submit_and_wait(1, self._log.append, 1)
+		self.assertEqual([1], self._log)
+		self._can_continue.set()
+		stalled.shutdown()
+		other.shutdown()
+	def setUp(self):
+		super().setUp()
+		self._scheduler = Scheduler(1)
+		self._worker = Worker(self._scheduler)
+		self._log = []
+		self._can_continue = Event()
+	def tearDown(self):
+		self._can_continue.set()
+		self._worker.shutdown()
+		super().tearDown()
+	def _run_queued(self):
+		self._worker.start()
+		self._worker.submit_and_wait(1000, lambda: None)
+
+class SchedulerTest(TestCase):
+	def test_round_robin(self):
+		workers = [Worker(self._scheduler) for _ in range(2)]
+		for worker in workers:
+			for i in range(3):
+				worker.submit(1, self._log.append, (worker, i))
+		self._run(workers)
+		expected = [(worker, i) for i in range(3) for worker in workers]
+		self.assertEqual(expected, self._log)
+	def test_priority_across_workers(self):
+		workers = [Worker(self._scheduler) for _ in range(2)]
+		workers[0].submit(2, self._log.append, 'slow')
+		workers[1].submit(1, self._log.append, 'urgent')
+		self._run(workers)
+		self.assertEqual(['urgent', 'slow'], self._log)
+	def test_focused_group_goes_first(self):
+		workers = [Worker(self._scheduler, group) for group in ('a', 'b')]
+		self._scheduler.focus('b')
+		for worker in workers:
+			worker.submit(1, self._log.append, worker.group)
+		self._run(workers)
+		self.assertEqual(['b', 'a'], self._log)
+	def setUp(self):
+		super().setUp()
+		self._scheduler = Scheduler(1)
+		self._log = []
+		# Block the Scheduler's only thread until all tasks are queued:
+		self._can_continue = Event()
+		blocked = Event()
+		def block():
+			blocked.set()
+			self._can_continue.wait()
+		self._blocker = Worker(self._scheduler)
+		self._blocker.submit(1, block)
+		self._blocker.start()
+		blocked.wait()
+	def _run(self, workers):
+		for worker in workers:
+			worker.start()
+		self._can_continue.set()
+		for worker in workers:
+			worker.submit_and_wait(1000, lambda: None)
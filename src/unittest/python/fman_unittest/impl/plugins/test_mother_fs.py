@@ -1,6 +1,6 @@
 from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
-from fman.fs import FileSystem, cached
+from fman.fs import FileSystem, Stat, cached
 from fman.impl.plugins.mother_fs import MotherFileSystem, CachedIterator
 from fman_unittest.impl.model import StubFileSystem
 from threading import Thread, Lock, Event
@@ -141,6 +141,62 @@ class MotherFileSystemTest(TestCase):
 		self.assertTrue(mother_fs.is_dir('stub://dir'))
 		mother_fs.move('stub://a/b', 'stub://a/../b')
 		self.assertTrue(mother_fs.exists('stub://b'))
+	def test_get_max_concurrency(self):
+		mother_fs = self._create_mother_fs(StubFileSystem({}))
+		self.assertEqual(1, mother_fs.get_max_concurrency('stub://'))
+	def test_query_many(self):
+		mother_fs = self._create_mother_fs(StubFileSystem({
+			'a': {'is_dir': True},
+			'b': {'size': 3}
+		}))
+		self.assertEqual(
+			{'stub://a': (True, 'a'), 'stub://b': (False, 'b')},
+			mother_fs.query_many(
+				['stub://a', 'stub://b', 'stub://c'], ('is_dir', 'name')
+			)
+		)
+	def test_query_many_not_implemented(self):
+		mother_fs = self._create_mother_fs(FileSystemRaisingError())
+		self.assertEqual(
+			{'fsre://a': (True, None)},
+			mother_fs.query_many(['fsre://a'], ('is_dir', 'size_bytes'))
+		)
+	def test_query_many_stat_many(self):
+		fs = FileSystemWithStatMany()
+		mother_fs = self._create_mother_fs(fs)
+		urls = ['fswsm://a', 'fswsm://b']
+		self.assertEqual(
+			{'fswsm://a': (False, 1), 'fswsm://b': (False, 2)},
+			mother_fs.query_many(urls, ('is_dir', 'size_bytes'))
+		)
+		self.assertEqual(1, mother_fs.query('fswsm://a', 'size_bytes'))
+		self.assertEqual([urls], fs.stat_many_calls)
+		self.assertEqual(0, fs.num_individual_calls)
+	def test_get_cache_stats(self):
+		mother_fs = self._create_mother_fs(StubFileSystem({'a': {}}))
+		mother_fs.is_dir('stub://a')
+		mother_fs.is_dir('stub://a')
+		stats = mother_fs.get_cache_stats()['stub://']
+		self.assertEqual((1, 1, 1, 0), stats)
+	def test_file_changed_callback_pins_cache(self):
+		fs = StubFileSystem({'a': {}})
+		fs.cache.set_max_entries(0)
+		mother_fs = self._create_mother_fs(fs)
+		callback = lambda url: None
+		mother_fs.add_file_changed_callback('stub://a', callback)
+		mother_fs.is_dir('stub://a')
+		self.assertEqual(1, fs.cache.get_stats().num_entries)
+		mother_fs.remove_file_changed_callback('stub://a', callback)
+		self.assertEqual(0, fs.cache.get_stats().num_entries)
+	def test_on_quit(self):
+		fs = FileSystemFailingOnQuit()
+		mother_fs = self._create_mother_fs(fs)
+		other_fs = FileSystemFailingOnQuit()
+		other_fs.scheme = 'other://'
+		mother_fs.add_child(other_fs.scheme, other_fs)
+		mother_fs.on_quit()
+		self.assertEqual(1, fs.num_on_quit_calls)
+		self.assertEqual(1, other_fs.num_on_quit_calls)
 	def _create_mother_fs(self, fs):
 		result = MotherFileSystem(None)
 		result.add_child(fs.scheme, fs)
@@ -162,6 +218,17 @@ class FileSystemCountingIsdirCalls(FileSystem):
 		sleep(.1)
 		return True
 
+class FileSystemFailingOnQuit(FileSystem):
+
+	scheme = 'fsfoq://'
+
+	def __init__(self):
+		super().__init__()
+		self.num_on_quit_calls = 0
+	def on_quit(self):
+		self.num_on_quit_calls += 1
+		raise OSError()
+
 class FileSystemRaisingError(FileSystem):
 
 	scheme = 'fsre://'
@@ -171,6 +238,27 @@ class FileSystemRaisingError(FileSystem):
 	def iterdir(self, path):
 		raise PermissionError(path)
 
+class FileSystemWithStatMany(FileSystem):
+
+	scheme = 'fswsm://'
+
+	def __init__(self):
+		super().__init__()
+		self.stat_many_calls = []
+		self.num_individual_calls = 0
+	def stat_many(self, paths):
+		self.stat_many_calls.append([self.scheme + path for path in paths])
+		return {
+			path: Stat(False, len(self.stat_many_calls) + i, None)
+			for i, path in enumerate(paths)
+		}
+	def is_dir(self, existing_path):
+		self.num_individual_calls += 1
+		return False
+	def size_bytes(self, path):
+		self.num_individual_calls += 1
+		return 0
+
 class CachedIteratorTest(TestCase):
 	def test_simple(self):
 		# For the sake of illustration, see what happens normally:
@@ -32,6 +32,30 @@ class CacheTest(TestCase):
 		self.cache.clear('')
 		with self.assertRaises(KeyError):
 			self.cache.get(path, attr)
+	def test_clear_removes_descendants(self):
+		self.cache.put('a/b/c.txt', 'size_bytes', 1)
+		self.cache.put('ab', 'size_bytes', 2)
+		self.cache.clear('a')
+		with self.assertRaises(KeyError):
+			self.cache.get('a/b/c.txt', 'size_bytes')
+		self.assertEqual(2, self.cache.get('ab', 'size_bytes'))
+		self.assertEqual(1, self.cache.get_stats().num_entries)
+	def test_discard(self):
+		self.cache.put('a', 'iterdir', ['b'])
+		self.cache.put('a', 'is_dir', True)
+		self.cache.put('a/b', 'size_bytes', 1)
+		self.cache.discard('a', 'iterdir')
+		with self.assertRaises(KeyError):
+			self.cache.get('a', 'iterdir')
+		self.assertTrue(self.cache.get('a', 'is_dir'))
+		self.assertEqual(1, self.cache.get('a/b', 'size_bytes'))
+		self.assertEqual(2, self.cache.get_stats().num_entries)
+	def test_query_raises(self):
+		def raise_error():
+			raise OSError()
+		with self.assertRaises(OSError):
+			self.cache.query('a', 'is_dir', raise_error)
+		self.assertIs(True, self.cache.query('a', 'is_dir', lambda: True))
 	def test_query_locks(self):
 		calls = []
 		def compute_value():
@@ -46,6 +70,101 @@ class CacheTest(TestCase):
 		thread_1.join()
 		thread_2.join()
 		self.assertEqual(1, len(calls))
+	def test_evicts_least_recently_used_directory(self):
+		self.cache.set_max_entries(3)
+		self.cache.put('a/1', 'size_bytes', 1)
+		self.cache.put('b/1', 'size_bytes', 1)
+		self.cache.put('a/2', 'size_bytes', 2)
+		self.cache.put('c/1', 'size_bytes', 1)
+		self.assertEqual(2, self.cache.get('a/2', 'size_bytes'))
+		self.assertEqual(1, self.cache.get('c/1', 'size_bytes'))
+		with self.assertRaises(KeyError):
+			self.cache.get('b/1', 'size_bytes')
+		self.assertEqual((3, 2, 1, 1), self.cache.get_stats())
+	def test_evicts_subdirectories_first(self):
+		self.cache.set_max_entries(2)
+		self.cache.put('a/b/1', 'size_bytes', 1)
+		self.cache.put('a/1', 'size_bytes', 1)
+		self.cache.put('c/1', 'size_bytes', 1)
+		self.assertEqual(1, self.cache.get('a/1', 'size_bytes'))
+		with self.assertRaises(KeyError):
+			self.cache.get('a/b/1', 'size_bytes')
+	def test_does_not_evict_pinned(self):
+		self.cache.pin('a')
+		self.cache.set_max_entries(1)
+		self.cache.put('a', 'is_dir', True)
+		self.cache.put('a/1', 'size_bytes', 1)
+		self.cache.put('b/1', 'size_bytes', 1)
+		self.assertTrue(self.cache.get('a', 'is_dir'))
+		self.assertEqual(1, self.cache.get('a/1', 'size_bytes'))
+		self.cache.unpin('a')
+		with self.assertRaises(KeyError):
+			self.cache.get('a/1', 'size_bytes')
+	def test_clear_updates_num_entries(self):
+		self.cache.put('a/1', 'size_bytes', 1)
+		self.cache.put('a/2', 'size_bytes', 2)
+		self.cache.clear('a')
+		self.assertEqual(0, self.cache.get_stats().num_entries)
+	def test_revalidates_expired_values(self):
+		policy = _Policy(max_age=-1, version=1)
+		cache = Cache(get_policy=lambda path: policy)
+		cache.put('a', 'iterdir', ['1'])
+		cache.put('a/1', 'size_bytes', 1)
+		self.assertEqual(1, cache.get('a/1', 'size_bytes'))
+		policy.version = 2
+		with self.assertRaises(KeyError):
+			cache.get('a/1', 'size_bytes')
+		with self.assertRaises(KeyError):
+			cache.get('a', 'iterdir')
+		self.assertEqual(['2'], cache.query('a', 'iterdir', lambda: ['2']))
+		self.assertEqual(['2'], cache.get('a', 'iterdir'))
+	def test_expiry_keeps_listings_of_subdirectories(self):
+		policies = {
+			'a': _Policy(max_age=-1, version=None),
+			'a/b': _Policy(max_age=None, version=None)
+		}
+		cache = Cache(get_policy=policies.__getitem__)
+		cache.put('a/b', 'is_dir', True)
+		cache.put('a/b', 'iterdir', ['1'])
+		with self.assertRaises(KeyError):
+			cache.get('a/b', 'is_dir')
+		self.assertEqual(['1'], cache.get('a/b', 'iterdir'))
+	def test_does_not_revalidate_before_max_age(self):
+		policy = _Policy(max_age=3600, version=1)
+		cache = Cache(get_policy=lambda path: policy)
+		cache.put('a/1', 'size_bytes', 1)
+		policy.version = 2
+		self.assertEqual(1, cache.get('a/1', 'size_bytes'))
+	def test_keeps_policy_after_clear(self):
+		requested = []
+		def get_policy(path):
+			requested.append(path)
+			return _Policy(max_age=None, version=None)
+		cache = Cache(get_policy=get_policy)
+		cache.put('a/1', 'size_bytes', 1)
+		cache.clear('a')
+		cache.put('a/1', 'size_bytes', 1)
+		self.assertEqual(['a'], requested)
+	def test_clear_forgets_recently_used(self):
+		self.cache.put('a/b/1', 'size_bytes', 1)
+		self.cache.put('c/1', 'size_bytes', 1)
+		self.cache.clear('a')
+		self.assertEqual(['c', None], list(self.cache._recently_used))
+	def test_put_after_clear_can_be_evicted(self):
+		cache = Cache(max_entries=1)
+		cache.put('a/1', 'size_bytes', 1)
+		cache.clear('a')
+		cache.put('a/1', 'size_bytes', 1)
+		cache.put('b/1', 'size_bytes', 2)
+		with self.assertRaises(KeyError):
+			cache.get('a/1', 'size_bytes')
 	def setUp(self):
 		super().setUp()
-		self.cache = Cache()
\ No newline at end of file
+		self.cache = Cache()
+
+class _Policy:
+	def __init__(self, max_age, version):
+		self.max_age = max_age
+		self.version = version
+	def get_version(self, dir_path):
+		return self.version
\ No newline at end of file
@@ -0,0 +1,35 @@
+from fman.impl.util import writing_atomically
+from os import listdir
+from os.path import join
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+class WritingAtomicallyTest(TestCase):
+	def test_write(self):
+		with TemporaryDirectory() as tmp_dir:
+			path = join(tmp_dir, 'file')
+			with writing_atomically(path) as tmp_path:
+				Path(tmp_path).write_text('contents')
+			self.assertEqual('contents', Path(path).read_text())
+			self.assertEqual(['file'], listdir(tmp_dir))
+	def test_concurrent_writers(self):
+		with TemporaryDirectory() as tmp_dir:
+			path = join(tmp_dir, 'file')
+			with writing_atomically(path) as tmp_path_1:
+				with writing_atomically(path) as tmp_path_2:
+					self.assertNotEqual(tmp_path_1, tmp_path_2)
+					Path(tmp_path_2).write_text('2')
+				Path(tmp_path_1).write_text('1')
+			self.assertEqual('1', Path(path).read_text())
+			self.assertEqual(['file'], listdir(tmp_dir))
+	def test_error_removes_temporary_file(self):
+		with TemporaryDirectory() as tmp_dir:
+			path = join(tmp_dir, 'file')
+			Path(path).write_text('before')
+			with self.assertRaises(ValueError):
+				with writing_atomically(path) as tmp_path:
+					Path(tmp_path).write_text('partial')
+					raise ValueError()
+			self.assertEqual('before', Path(path).read_text())
+			self.assertEqual(['file'], listdir(tmp_dir))